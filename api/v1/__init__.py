@@ -1,8 +1,12 @@
 from fastapi import APIRouter
 
+from .files import files_router
 from .image import image_router
+from .monitoring import monitoring_router
 from .users import users_router
 
 v1_router = APIRouter()
 v1_router.include_router(users_router, prefix="/users")
 v1_router.include_router(image_router, prefix="/image")
+v1_router.include_router(files_router, prefix="/files")
+v1_router.include_router(monitoring_router, prefix="/monitoring")
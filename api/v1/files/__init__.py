@@ -0,0 +1,8 @@
+from fastapi import APIRouter
+
+from .files import router
+
+files_router: APIRouter = APIRouter()
+files_router.include_router(router, tags=["Files"])
+
+__all__ = ["files_router"]
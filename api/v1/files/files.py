@@ -0,0 +1,53 @@
+from typing import Optional
+
+from fastapi import APIRouter
+from fastapi.responses import FileResponse
+
+from core.exceptions import (ForbiddenException, NotFoundException,
+                             UnauthorizedException)
+from core.utils.storage import LocalStorage, get_storage
+
+router: APIRouter = APIRouter()
+
+
+@router.get("/{file_name:path}")
+async def get_file(
+    file_name: str, expires: Optional[int] = None, signature: Optional[str] = None
+):
+    """
+    Serve an object from the local storage backend.
+
+    The file is handed to the server as a path, so it is sent without being read
+    into Python (with sendfile where the server supports it). Presigned URLs are
+    checked for a valid signature; unsigned URLs are only served while
+    LOCAL_STORAGE_PUBLIC is enabled.
+
+    Args:
+        file_name (str): The object name.
+        expires (Optional[int]): The expiry time of a presigned URL.
+        signature (Optional[str]): The signature of a presigned URL.
+
+    Returns:
+        FileResponse: The file.
+
+    Raises:
+        NotFoundException: If local storage is not in use or the file does not exist.
+        UnauthorizedException: If the URL is unsigned and LOCAL_STORAGE_PUBLIC is off.
+        ForbiddenException: If the signature is invalid or expired.
+    """
+    storage = get_storage()
+    if not isinstance(storage, LocalStorage):
+        raise NotFoundException("File not found")
+
+    if expires is not None or signature is not None:
+        if expires is None or signature is None or not storage.verify(
+            file_name, expires, signature
+        ):
+            raise ForbiddenException("Invalid or expired signature")
+    elif not storage.public:
+        raise UnauthorizedException("A signed URL is required")
+
+    path = storage.local_path(file_name)
+    if path is None:
+        raise NotFoundException("File not found")
+    return FileResponse(path)
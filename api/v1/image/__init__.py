@@ -1,8 +1,9 @@
 from fastapi import APIRouter
 
-from .image import router
+from .image import public_router, router
 
 image_router: APIRouter = APIRouter()
 image_router.include_router(router, tags=["Image"])
+image_router.include_router(public_router, tags=["Image"])
 
 __all__ = ["image_router"]
@@ -1,17 +1,67 @@
-from fastapi import APIRouter, Depends, File, UploadFile
+from typing import Any, Dict, List, Optional
+
+from fastapi import (APIRouter, BackgroundTasks, Depends, File, Query, Request,
+                     Response, UploadFile)
 
 from app.crud.image import ImageCRUD
-from app.schemas.requests.image import ImageTransformation
-from core.exceptions import BadRequestException
+from app.crud.transform_job import TransformJobCRUD
+from app.schemas.requests.image import (BatchTransformation, FilterImage,
+                                        ImageTransformation, ResizeImage)
+from app.schemas.responses.image import ResponseImage
+from core.config import config
+from core.exceptions import (BadRequestException, NotFoundException,
+                             UnauthorizedException)
 from core.factory import Factory
 from core.fastapi.dependencies import AuthenticationRequired, get_current_user
-from core.utils.aws_utils import AWSService
-from core.utils.images import apply_image_transformations, create_file_name
+from core.utils.batch import batch_jobs, run_batch
+from core.utils.derivative_cache import derivative_cache
+from core.utils.images import (create_file_name, negotiate_format,
+                               negotiate_opaque_format)
+from core.utils.jobs import describe_job
+from core.utils.metrics import time_stage
+from core.utils.render_urls import (sign_render_query, signed_cache_control,
+                                    verify_render_signature)
+from core.utils.storage import get_storage
+from core.utils.transform import (content_type_for, delete_derivatives,
+                                  explain_stored_image, locate_derivative,
+                                  render_derivative, settle_opaque_format,
+                                  store_derivative, transform_stored_image)
+from core.utils.variants import (describe_variants, generate_variants,
+                                 planned_variants)
 
 router: APIRouter = APIRouter(dependencies=[Depends(AuthenticationRequired)])
+# Routes that check credentials themselves, e.g. to accept signed URLs
+public_router: APIRouter = APIRouter()
+
+
+def negotiate_transformations(
+    transformations: Dict[str, Any], request: Request
+) -> Dict[str, Any]:
+    """
+    Replace the `auto` format with the smallest format the client accepts.
 
+    If the client accepts neither AVIF nor WebP, the format is left unset and
+    "opaque_format" names JPEG if the client accepts it; whether the source is
+    opaque is only known per image, see `settle_opaque_format`.
 
-@router.get("/")
+    Args:
+        transformations (dict): The transformations to apply.
+        request (Request): The request, whose Accept header is used.
+
+    Returns:
+        dict: The transformations with a concrete format (None keeps the original).
+    """
+    format_image = transformations.get("format")
+    if format_image is None or format_image.lower() != "auto":
+        return transformations
+    accept = request.headers.get("accept")
+    format_image = negotiate_format(accept)
+    if format_image is not None:
+        return {**transformations, "format": format_image}
+    return {**transformations, "format": None, "opaque_format": negotiate_opaque_format(accept)}
+
+
+@router.get("/", response_model=List[ResponseImage])
 async def get_images(
     skip: int = 0,
     limit: int = 20,
@@ -19,7 +69,19 @@ async def get_images(
     current_user=Depends(get_current_user),
 ):
     user_id: str = current_user.id
-    return await image_crud.get_all_by("user_id", user_id, skip=skip, limit=limit)
+    images = await image_crud.get_all_by("user_id", user_id, skip=skip, limit=limit)
+    return [
+        ResponseImage(
+            id=image.id,
+            name=image.name,
+            user_id=image.user_id,
+            size=image.size,
+            content_hash=image.content_hash,
+            created_at=image.created_at,
+            variants=await describe_variants(image.variants),
+        )
+        for image in images
+    ]
 
 
 @router.get("/{image_id}")
@@ -32,12 +94,196 @@ async def get_image(
     if image.user_id != current_user.id:
         raise BadRequestException("Unauthorized")
     file_name = image.name
-    url = await AWSService().generate_presigned_url(file_name)
+    url = await get_storage().generate_presigned_url(file_name)
     return url
 
 
+def render_transformations(
+    w: Optional[int],
+    h: Optional[int],
+    fmt: Optional[str],
+    filter_type: Optional[str],
+    rotate: Optional[int],
+    max_bytes: Optional[int],
+    target_quality: Optional[float],
+) -> Dict[str, Any]:
+    """
+    Build the transformations of a render from its query parameters.
+
+    Args:
+        w (Optional[int]): The target width.
+        h (Optional[int]): The target height.
+        fmt (Optional[str]): The output format.
+        filter_type (Optional[str]): "grayscale" or "sepia".
+        rotate (Optional[int]): The rotation in degrees.
+        max_bytes (Optional[int]): The byte budget of the result.
+        target_quality (Optional[float]): The minimum SSIM of the result.
+
+    Returns:
+        dict: The transformations.
+
+    Raises:
+        BadRequestException: If the filter is unknown.
+    """
+    if filter_type is not None and filter_type not in ("grayscale", "sepia"):
+        raise BadRequestException(f"Unknown filter type: {filter_type}")
+
+    return ImageTransformation(
+        resize=ResizeImage(width=w, height=h) if w or h else None,
+        rotate=rotate,
+        format=fmt,
+        max_bytes=max_bytes,
+        target_quality=target_quality,
+        filter=FilterImage(**{filter_type: True}) if filter_type else None,
+    ).model_dump()
+
+
+@router.get("/{image_id}/render-url")
+async def get_render_url(
+    image_id: str,
+    request: Request,
+    w: Optional[int] = Query(None, gt=0, description="Target width"),
+    h: Optional[int] = Query(None, gt=0, description="Target height"),
+    fmt: Optional[str] = Query(None, description="Output format"),
+    filter_type: Optional[str] = Query(
+        None, alias="filter", description="grayscale or sepia"
+    ),
+    rotate: Optional[int] = Query(None, description="Rotation in degrees"),
+    max_bytes: Optional[int] = Query(None, gt=0, description="Byte budget"),
+    target_quality: Optional[float] = Query(
+        None, gt=0, le=1, description="Minimum SSIM"
+    ),
+    expires_in: int = Query(
+        config.PRESIGN_EXPIRATION, gt=0, le=7 * 24 * 3600, description="Validity in seconds"
+    ),
+    image_crud: ImageCRUD = Depends(Factory.get_image_crud),
+    current_user=Depends(get_current_user),
+):
+    """
+    Create a signed render URL that works without an Authorization header, e.g. in
+    an `<img>` tag or behind a CDN.
+
+    Returns:
+        dict: The signed "url" and its "expires" timestamp.
+    """
+    saved_image = await image_crud.get_by_id(image_id)
+    if saved_image is None or saved_image.user_id != current_user.id:
+        raise BadRequestException("Unauthorized")
+
+    # Validates the parameters before they are signed
+    render_transformations(w, h, fmt, filter_type, rotate, max_bytes, target_quality)
+    params = {
+        "w": w,
+        "h": h,
+        "fmt": fmt,
+        "filter": filter_type,
+        "rotate": rotate,
+        "max_bytes": max_bytes,
+        "target_quality": target_quality,
+    }
+    signed = sign_render_query(image_id, params, expires_in)
+    url = request.url_for("render_image", image_id=image_id)
+    return {"url": f"{url}?{signed['query']}", "expires": signed["expires"]}
+
+
+@public_router.get("/{image_id}/render")
+async def render_image(
+    image_id: str,
+    request: Request,
+    background_tasks: BackgroundTasks,
+    w: Optional[int] = Query(None, gt=0, description="Target width"),
+    h: Optional[int] = Query(None, gt=0, description="Target height"),
+    fmt: Optional[str] = Query(None, description="Output format"),
+    filter_type: Optional[str] = Query(
+        None, alias="filter", description="grayscale or sepia"
+    ),
+    rotate: Optional[int] = Query(None, description="Rotation in degrees"),
+    max_bytes: Optional[int] = Query(None, gt=0, description="Byte budget"),
+    target_quality: Optional[float] = Query(
+        None, gt=0, le=1, description="Minimum SSIM"
+    ),
+    expires: Optional[int] = Query(None, description="Expiry of a signed URL"),
+    signature: Optional[str] = Query(None, description="Signature of a signed URL"),
+    image_crud: ImageCRUD = Depends(Factory.get_image_crud),
+):
+    """
+    Render a transformed image on the fly and return its bytes.
+
+    The owner can call it with a bearer token. Signed URLs from `/render-url` need
+    no token, so they work in `<img>` tags; their responses are publicly cacheable
+    until the URL expires, while token-authenticated ones use RENDER_CACHE_CONTROL.
+
+    The response carries a strong ETag derived from the source and the transformation,
+    so repeated requests with `If-None-Match` are answered with 304 Not Modified
+    without downloading or transforming anything. With `fmt=auto` the format is picked
+    from the Accept header: AVIF, then WebP, then JPEG unless the source has
+    transparency, else the original format.
+
+    Raises:
+        UnauthorizedException: If the URL is unsigned and no user is authenticated.
+        BadRequestException: If the signature is invalid or expired, or the user
+            does not own the image.
+    """
+    params = {
+        "w": w,
+        "h": h,
+        "fmt": fmt,
+        "filter": filter_type,
+        "rotate": rotate,
+        "max_bytes": max_bytes,
+        "target_quality": target_quality,
+    }
+    signed = expires is not None or signature is not None
+    if signed:
+        if not verify_render_signature(image_id, params, expires, signature):
+            raise BadRequestException("Invalid or expired signature")
+        cache_control = signed_cache_control(expires)
+    else:
+        if not request.user.id:
+            raise UnauthorizedException("Authentication credentials not provided.")
+        cache_control = config.RENDER_CACHE_CONTROL
+
+    with time_stage("db_lookup"):
+        saved_image = await image_crud.get_by_id(image_id)
+    if saved_image is None:
+        raise NotFoundException("Image not found")
+    if not signed and saved_image.user_id != request.user.id:
+        raise BadRequestException("Unauthorized")
+
+    transformations = render_transformations(
+        w, h, fmt, filter_type, rotate, max_bytes, target_quality
+    )
+    transformations = negotiate_transformations(transformations, request)
+    transformations = await settle_opaque_format(saved_image.name, transformations)
+
+    format_image, key, source_etag = await locate_derivative(
+        saved_image.name, transformations
+    )
+    etag = '"{}"'.format(key.rsplit("/", 1)[-1].split(".", 1)[0])
+    headers = {"ETag": etag, "Cache-Control": cache_control}
+    if fmt is not None and fmt.lower() == "auto":
+        headers["Vary"] = "Accept"
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        candidates = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        if "*" in candidates or etag in candidates:
+            return Response(status_code=304, headers=headers)
+
+    image_bytes, cached = await render_derivative(
+        saved_image.name, key, transformations, source_etag
+    )
+    content_type = content_type_for(format_image)
+    if not cached and derivative_cache.enabled:
+        # Only worth storing when the derivative cache will look for it again
+        background_tasks.add_task(store_derivative, key, image_bytes, content_type)
+
+    return Response(content=image_bytes, media_type=content_type, headers=headers)
+
+
 @router.post("/upload-image")
 async def upload_image(
+    background_tasks: BackgroundTasks,
     image: UploadFile = File(
         ...,
     ),
@@ -48,22 +294,29 @@ async def upload_image(
 
     file_name = create_file_name(image.filename)
 
-    file_content = await image.read()
-
-    # url = upload_image_to_s3(file_content, file_name, image.content_type)
-    url = await AWSService().upload_image_to_s3(
-        file_content, file_name, image.content_type
+    # The upload is streamed from the spooled request file, never read whole
+    uploaded = await get_storage().upload_stream(
+        image.file, file_name, image.content_type
     )
     data = {
         "name": file_name,
         "user_id": user_id,
+        "size": uploaded["size"],
+        "content_hash": uploaded["content_hash"],
     }
     new_image = await image_crud.create(data)
+
+    # Responsive variants are rendered after the response has been sent
+    background_tasks.add_task(generate_variants, new_image.id, new_image.name, user_id)
+
     return {
         "id": new_image.id,
         "name": new_image.name,
         "user_id": new_image.user_id,
-        "url": url,
+        "url": uploaded["url"],
+        "size": new_image.size,
+        "content_hash": new_image.content_hash,
+        "variants": await planned_variants(new_image.name),
     }
 
 
@@ -71,60 +324,165 @@ async def upload_image(
 async def transform_image(
     image_id: str,
     image_transformation: ImageTransformation,
+    request: Request,
+    response: Response,
+    run_async: bool = Query(False, alias="async"),
     image_crud: ImageCRUD = Depends(Factory.get_image_crud),
+    job_crud: TransformJobCRUD = Depends(Factory.get_transform_job_crud),
     current_user=Depends(get_current_user),
 ):
     """
     Transform an image by applying resizing, cropping, rotating, watermarking, filtering, and/or format change.
-    If no format is specified, the original format is preserved.
+    If no format is specified, the original format is preserved; `auto` picks the
+    smallest format the client accepts according to its Accept header.
+
+    With `?async=true` the transformation is queued for a job worker instead, and the
+    job ID is returned right away; poll `GET /jobs/{job_id}` for the result.
 
     Args:
         image_id (str): ID of the image to transform.
         image_transformation (ImageTransformation): The transformations to apply.
+        request (Request): The request, used to negotiate the `auto` format.
+        response (Response): The response, whose status is set to 202 for queued jobs.
+        run_async (bool): Whether to queue the transformation as a job.
         image_crud (ImageCRUD): Dependency for interacting with the image database.
+        job_crud (TransformJobCRUD): Dependency for interacting with the job queue.
         current_user: The authenticated user making the request.
 
     Returns:
-        dict: A dictionary containing a success message and the URL of the transformed image.
+        dict: A dictionary containing a success message and the URL of the transformed image,
+            or the queued job.
 
     Raises:
         BadRequestException: If the user is unauthorized or a transformation fails.
     """
-    transformations = image_transformation.model_dump()
-    saved_image = await image_crud.get_by_id(image_id)
+    transformations = negotiate_transformations(image_transformation.model_dump(), request)
+    with time_stage("db_lookup"):
+        saved_image = await image_crud.get_by_id(image_id)
 
     if saved_image.user_id != current_user.id:
         raise BadRequestException("Unauthorized")
 
-    # Retrieve image bytes from AWS S3
-    image_bytes = await AWSService().get_image(saved_image.name)
+    if run_async:
+        job = await job_crud.enqueue(
+            saved_image.id, current_user.id, transformations, config.JOB_MAX_ATTEMPTS
+        )
+        response.status_code = 202
+        return {"message": "Transformation queued", "job_id": job.id, "status": job.status}
+
+    url = await transform_stored_image(saved_image.name, transformations)
+    return {"message": "Image successfully transformed", "url": url}
+
+
+@router.get("/jobs/{job_id}")
+async def get_transform_job(
+    job_id: str,
+    job_crud: TransformJobCRUD = Depends(Factory.get_transform_job_crud),
+    current_user=Depends(get_current_user),
+):
+    """
+    Return the status of a queued transformation.
+
+    Args:
+        job_id (str): The job ID.
+        job_crud (TransformJobCRUD): Dependency for interacting with the job queue.
+        current_user: The authenticated user making the request.
+
+    Returns:
+        dict: The job's status, attempts and, once completed, the URL of the result.
 
-    # Determine the original format
-    original_format = saved_image.name.rsplit(".", 1)[-1].lower()
+    Raises:
+        NotFoundException: If the job does not exist or belongs to another user.
+    """
+    job = await job_crud.get_by_id(job_id)
+    if job is None or job.user_id != current_user.id:
+        raise NotFoundException("Transform job not found")
+    return describe_job(job)
 
-    # Apply all transformations using the helper function
-    try:
-        image_bytes = apply_image_transformations(
-            image_bytes, transformations, original_format
+
+@router.post("/explain-transformation")
+async def explain_transformation(
+    image_id: str,
+    image_transformation: ImageTransformation,
+    request: Request,
+    image_crud: ImageCRUD = Depends(Factory.get_image_crud),
+    current_user=Depends(get_current_user),
+):
+    """
+    Show the execution plan chosen for a transformation, for debugging.
+
+    The requested operations are rewritten into a cheaper equivalent plan, e.g. by
+    dropping no-op steps, fusing a resize and a crop or moving a grayscale conversion.
+    Nothing is transformed or uploaded.
+    """
+    saved_image = await image_crud.get_by_id(image_id)
+    if saved_image.user_id != current_user.id:
+        raise BadRequestException("Unauthorized")
+
+    transformations = negotiate_transformations(image_transformation.model_dump(), request)
+    return await explain_stored_image(saved_image.name, transformations)
+
+
+@router.post("/transform-batch")
+async def transform_batch(
+    batch: BatchTransformation,
+    request: Request,
+    image_crud: ImageCRUD = Depends(Factory.get_image_crud),
+    current_user=Depends(get_current_user),
+):
+    """
+    Apply one transformation to many images.
+
+    The images are loaded in a single query and transformed concurrently. Batches of up
+    to BATCH_SYNC_LIMIT images are answered with per-image results; larger batches run
+    in the background and a job ID is returned instead. At most BATCH_MAX_IMAGES
+    images are accepted per batch.
+
+    Args:
+        batch (BatchTransformation): The image IDs and the transformation to apply.
+        request (Request): The request, used to negotiate the `auto` format.
+        image_crud (ImageCRUD): Dependency for interacting with the image database.
+        current_user: The authenticated user making the request.
+
+    Returns:
+        dict: Per-image results with either a "url" or an "error", or a "job_id".
+
+    Raises:
+        BadRequestException: If the batch holds more than BATCH_MAX_IMAGES images.
+    """
+    if len(batch.image_ids) > config.BATCH_MAX_IMAGES:
+        raise BadRequestException(
+            f"A batch may hold at most {config.BATCH_MAX_IMAGES} images"
         )
-    except ValueError as e:
-        raise BadRequestException(str(e))
-
-    # Determine content type and file name for the transformed image
-    format_image = transformations.get("format", original_format).lower()
-    content_type = f"image/{format_image}"
-    new_file_name = (
-        saved_image.name.rsplit(".", 1)[0] + f".{format_image}"
-        if format_image != original_format
-        else saved_image.name
-    )
+    transformations = negotiate_transformations(batch.transformation.model_dump(), request)
+    image_ids = list(dict.fromkeys(batch.image_ids))
+    saved_images = {
+        image.id: image for image in await image_crud.get_all_in("id", image_ids)
+    }
 
-    # Upload the transformed image back to S3
-    url = await AWSService().upload_image_to_s3(
-        image_bytes, new_file_name, content_type=content_type
-    )
+    items = []
+    for image_id in image_ids:
+        saved_image = saved_images.get(image_id)
+        if saved_image is None:
+            items.append({"image_id": image_id, "error": "Image not found"})
+        elif saved_image.user_id != current_user.id:
+            items.append({"image_id": image_id, "error": "Unauthorized"})
+        else:
+            items.append({"image_id": image_id, "name": saved_image.name})
 
-    return {"message": "Image successfully transformed", "url": url}
+    if len(items) > config.BATCH_SYNC_LIMIT:
+        job_id = batch_jobs.submit(current_user.id, items, transformations)
+        return {"job_id": job_id, "status": "running", "total": len(items)}
+
+    return {"results": await run_batch(items, transformations)}
+
+
+@router.get("/batch/{job_id}")
+async def get_batch(job_id: str, current_user=Depends(get_current_user)):
+    job = batch_jobs.get(job_id)
+    if job is None or job["user_id"] != current_user.id:
+        raise NotFoundException("Batch job not found")
+    return {key: value for key, value in job.items() if key != "user_id"}
 
 
 @router.delete("/delete-image/{image_id}")
@@ -137,6 +495,10 @@ async def delete_image(
     if image.user_id != current_user.id:
         raise BadRequestException("Unauthorized to delete this image")
 
-    await AWSService().delete_object(image.name)
+    storage = get_storage()
+    for variant in image.variants:
+        await storage.delete_object(variant.key)
+    await delete_derivatives(image.name)
+    await storage.delete_object(image.name)
 
     await image_crud.delete(image_id)
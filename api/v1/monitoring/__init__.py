@@ -0,0 +1,8 @@
+from fastapi import APIRouter
+
+from .monitoring import router
+
+monitoring_router: APIRouter = APIRouter()
+monitoring_router.include_router(router, tags=["Monitoring"])
+
+__all__ = ["monitoring_router"]
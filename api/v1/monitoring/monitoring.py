@@ -0,0 +1,197 @@
+import asyncio
+import hmac
+import os
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Header, Query
+from fastapi.responses import PlainTextResponse, Response
+
+from app.schemas.requests.monitoring import RequestProfileRule
+from core.config import config
+from core.exceptions import (BadRequestException, NotFoundException,
+                             UnauthorizedException)
+from core.fastapi.dependencies import AuthenticationRequired, get_admin_user
+from core.utils.derivative_cache import derivative_cache
+from core.utils.executor import image_executor, variant_executor
+from core.utils.metrics import registry
+from core.utils.profiling import request_profiler, sampling_profiler
+from core.utils.source_cache import source_cache
+
+router: APIRouter = APIRouter()
+
+
+@router.get("/cache", dependencies=[Depends(AuthenticationRequired)])
+async def get_cache_stats():
+    """
+    Report the hit rates of the node-local caches.
+
+    Returns:
+        dict: Statistics of the source cache and the derivative cache.
+    """
+    return {
+        "sources": source_cache.stats(),
+        "derivatives": derivative_cache.stats(),
+    }
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics(authorization: Optional[str] = Header(None)):
+    """
+    Expose the metrics of this process in the Prometheus text format.
+
+    Scrapers do not hold user tokens, so the endpoint is open unless METRICS_TOKEN
+    is set, in which case it must be sent as a bearer token.
+
+    Returns:
+        PlainTextResponse: The exposition.
+
+    Raises:
+        UnauthorizedException: If METRICS_TOKEN is set and does not match.
+    """
+    if config.METRICS_TOKEN:
+        expected = f"Bearer {config.METRICS_TOKEN}"
+        if authorization is None or not hmac.compare_digest(authorization, expected):
+            raise UnauthorizedException("Invalid metrics token")
+    return PlainTextResponse(
+        registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
+
+
+@router.get(
+    "/profile/cpu",
+    response_class=PlainTextResponse,
+    dependencies=[Depends(AuthenticationRequired), Depends(get_admin_user)],
+)
+async def profile_cpu(
+    seconds: float = Query(10, gt=0),
+    interval_ms: float = Query(5, ge=1, le=1000),
+    idle: bool = Query(False),
+):
+    """
+    Sample the stacks of this worker process and its image pool processes for a
+    while.
+
+    The profile covers the worker that serves this request; with several server
+    processes, repeat the call until the busy one answers (see the X-Worker-PID
+    header). Threads of pool processes show up as `image-<pid>/...` and
+    `variant-<pid>/...`.
+
+    Args:
+        seconds (float): How long to sample for, up to PROFILE_MAX_SECONDS.
+        interval_ms (float): The time between samples.
+        idle (bool): Whether to include threads that are only waiting.
+
+    Returns:
+        PlainTextResponse: The profile in the collapsed-stack format, ready for
+            flamegraph.pl, speedscope or inferno.
+
+    Raises:
+        BadRequestException: If `seconds` exceeds PROFILE_MAX_SECONDS.
+        ServiceUnavailableException: If a profile is already running.
+    """
+    if seconds > config.PROFILE_MAX_SECONDS:
+        raise BadRequestException(
+            f"Profiles are limited to {config.PROFILE_MAX_SECONDS:g} seconds"
+        )
+    pool_pids = image_executor.worker_pids() + variant_executor.worker_pids()
+    stacks = await asyncio.to_thread(
+        sampling_profiler.profile, seconds, interval_ms / 1000, idle, pool_pids
+    )
+    return PlainTextResponse(stacks, headers={"X-Worker-PID": str(os.getpid())})
+
+
+@router.post(
+    "/profile/requests",
+    dependencies=[Depends(AuthenticationRequired), Depends(get_admin_user)],
+)
+async def start_request_profiling(rule: RequestProfileRule):
+    """
+    Capture cProfile output for the next requests matching a route and/or header.
+
+    Replaces the current rule, if any. Captures are kept per worker process.
+
+    Args:
+        rule (RequestProfileRule): What to match, how many requests to capture,
+            and for how long.
+
+    Returns:
+        dict: The active rule.
+    """
+    return request_profiler.arm(
+        rule.route, rule.header, rule.header_value, rule.limit, rule.ttl_seconds
+    )
+
+
+@router.get(
+    "/profile/requests",
+    dependencies=[Depends(AuthenticationRequired), Depends(get_admin_user)],
+)
+async def list_request_profiles():
+    """
+    List the captured request profiles of this worker, oldest first.
+
+    Returns:
+        dict: The active rule and a summary of every capture.
+    """
+    return {
+        "rule": request_profiler.state(),
+        "captures": [capture.summary() for capture in request_profiler.captures],
+    }
+
+
+@router.delete(
+    "/profile/requests",
+    dependencies=[Depends(AuthenticationRequired), Depends(get_admin_user)],
+)
+async def stop_request_profiling(clear: bool = Query(False)):
+    """
+    Stop capturing requests.
+
+    Args:
+        clear (bool): Whether to also drop the captured profiles.
+
+    Returns:
+        dict: The (now inactive) rule.
+    """
+    request_profiler.disarm()
+    if clear:
+        request_profiler.captures.clear()
+    return request_profiler.state()
+
+
+@router.get(
+    "/profile/requests/{capture_id}",
+    dependencies=[Depends(AuthenticationRequired), Depends(get_admin_user)],
+)
+async def get_request_profile(
+    capture_id: str,
+    format: str = Query("text", pattern="^(text|pstats)$"),
+    sort: str = Query("cumulative"),
+    limit: int = Query(50, ge=1, le=1000),
+):
+    """
+    Return a captured request profile.
+
+    Args:
+        capture_id (str): The ID of the capture.
+        format (str): "text" for a pstats report, or "pstats" for the raw stats
+            to open with snakeviz or `python -m pstats`.
+        sort (str): The sort key of the report, e.g. "cumulative" or "tottime".
+        limit (int): The number of functions in the report.
+
+    Returns:
+        Response: The report or the stats file.
+
+    Raises:
+        NotFoundException: If there is no such capture on this worker.
+    """
+    capture = request_profiler.get(capture_id)
+    if capture is None:
+        raise NotFoundException("Profile not found")
+    if format == "pstats":
+        return Response(
+            capture.dump(),
+            media_type="application/octet-stream",
+            headers={"Content-Disposition": f'attachment; filename="{capture_id}.pstats"'},
+        )
+    return PlainTextResponse(capture.text(sort, limit))
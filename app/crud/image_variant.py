@@ -0,0 +1,9 @@
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.image_variant import ImageVariant
+from core.crud import BaseCRUD
+
+
+class ImageVariantCRUD(BaseCRUD[ImageVariant]):
+    def __init__(self, db_session: AsyncSession) -> None:
+        super().__init__(model=ImageVariant, db_session=db_session)
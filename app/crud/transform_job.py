@@ -0,0 +1,191 @@
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Optional
+
+from sqlalchemy import and_, or_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.sql.expression import select, update
+
+from app.models.transform_job import (JOB_COMPLETED, JOB_FAILED,
+                                      JOB_KIND_TRANSFORM, JOB_QUEUED,
+                                      JOB_RUNNING, TransformJob)
+from core.crud import BaseCRUD
+from core.utils.tracing import traced
+
+
+def utcnow() -> datetime:
+    """
+    Return the current UTC time as a naive datetime, as stored in the job table.
+
+    Returns:
+        datetime: The current UTC time.
+    """
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+class TransformJobCRUD(BaseCRUD[TransformJob]):
+    def __init__(self, db_session: AsyncSession) -> None:
+        super().__init__(model=TransformJob, db_session=db_session)
+
+    async def enqueue(
+        self,
+        image_id: str,
+        user_id: str,
+        transformations: Dict[str, Any],
+        max_attempts: int,
+        kind: str = JOB_KIND_TRANSFORM,
+        delay: float = 0.0,
+        error: Optional[str] = None,
+    ) -> TransformJob:
+        """
+        Queue a transformation to be picked up by a worker.
+
+        Args:
+            image_id (str): The ID of the image to transform.
+            user_id (str): The owner of the job.
+            transformations (dict): The transformations to apply.
+            max_attempts (int): How many times the job may be tried.
+            kind (str): JOB_KIND_TRANSFORM, or JOB_KIND_VARIANTS to render the
+                image's variants.
+            delay (float): Seconds before the job becomes due.
+            error (Optional[str]): The error of a failed run that the job retries.
+
+        Returns:
+            TransformJob: The queued job.
+        """
+        return await self.create(
+            {
+                "image_id": image_id,
+                "user_id": user_id,
+                "kind": kind,
+                "transformations": transformations,
+                "status": JOB_QUEUED,
+                "max_attempts": max_attempts,
+                "available_at": utcnow() + timedelta(seconds=delay),
+                "error": error,
+            }
+        )
+
+    @traced("db.transform_job.claim_next", "db")
+    async def claim_next(self, worker_id: str, lease_seconds: float) -> TransformJob | None:
+        """
+        Lease the next due job for a worker.
+
+        Queued jobs whose retry time has come, and running jobs whose lease has
+        expired (their worker died), are eligible. The row is locked with
+        `FOR UPDATE SKIP LOCKED`, so concurrent workers never claim the same job and
+        never wait on each other.
+
+        Args:
+            worker_id (str): Identifies the claiming worker.
+            lease_seconds (float): How long the job stays leased to the worker.
+
+        Returns:
+            TransformJob | None: The claimed job, or None if no job is due.
+        """
+        now = utcnow()
+        query = (
+            select(self.model)
+            .where(
+                or_(
+                    and_(self.model.status == JOB_QUEUED, self.model.available_at <= now),
+                    and_(self.model.status == JOB_RUNNING, self.model.locked_until <= now),
+                )
+            )
+            .order_by(self.model.available_at)
+            .limit(1)
+            .with_for_update(skip_locked=True)
+        )
+        job = (await self.session.scalars(query)).first()
+        if job is None:
+            await self.session.rollback()
+            return None
+
+        # The update only applies if nobody claimed the job since it was read, which
+        # keeps claiming safe on databases without row locks.
+        result = await self.session.execute(
+            update(self.model)
+            .where(
+                self.model.id == job.id,
+                self.model.status == job.status,
+                self.model.attempts == job.attempts,
+            )
+            .values(
+                status=JOB_RUNNING,
+                attempts=job.attempts + 1,
+                locked_by=worker_id,
+                locked_until=now + timedelta(seconds=lease_seconds),
+            )
+            .execution_options(synchronize_session=False)
+        )
+        await self.session.commit()
+        if result.rowcount != 1:
+            return None
+        await self.session.refresh(job)
+        return job
+
+    @traced("db.transform_job.get_leased", "db")
+    async def _get_leased(self, job_id: str, worker_id: str) -> TransformJob | None:
+        job = await self.get_by_id(job_id)
+        if job is None or job.status != JOB_RUNNING or job.locked_by != worker_id:
+            return None
+        return job
+
+    @traced("db.transform_job.complete", "db")
+    async def complete(
+        self, job_id: str, worker_id: str, result_url: Optional[str]
+    ) -> bool:
+        """
+        Mark a leased job as completed.
+
+        Args:
+            job_id (str): The job ID.
+            worker_id (str): The worker holding the lease.
+            result_url (Optional[str]): The URL of the transformed image; None for
+                variant jobs.
+
+        Returns:
+            bool: False if the worker no longer holds the lease.
+        """
+        job = await self._get_leased(job_id, worker_id)
+        if job is None:
+            return False
+
+        job.status = JOB_COMPLETED
+        job.result_url = result_url
+        job.error = None
+        job.locked_by = None
+        job.locked_until = None
+        await self.session.commit()
+        return True
+
+    @traced("db.transform_job.fail", "db")
+    async def fail(
+        self, job_id: str, worker_id: str, error: str, retry_delay: float | None
+    ) -> bool:
+        """
+        Record a failed attempt of a leased job.
+
+        Args:
+            job_id (str): The job ID.
+            worker_id (str): The worker holding the lease.
+            error (str): The error message.
+            retry_delay (float | None): Seconds until the next attempt, or None to fail
+                the job for good.
+
+        Returns:
+            bool: False if the worker no longer holds the lease.
+        """
+        job = await self._get_leased(job_id, worker_id)
+        if job is None:
+            return False
+
+        job.error = error
+        job.locked_by = None
+        job.locked_until = None
+        if retry_delay is None:
+            job.status = JOB_FAILED
+        else:
+            job.status = JOB_QUEUED
+            job.available_at = utcnow() + timedelta(seconds=retry_delay)
+        await self.session.commit()
+        return True
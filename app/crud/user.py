@@ -7,6 +7,7 @@ from app.schemas.extras import Token
 from core.crud import BaseCRUD
 from core.exceptions import BadRequestException, NotFoundException
 from core.utils import JWTTokenHandler, PasswordHandler
+from core.utils.tracing import span
 
 
 class UserCRUD(BaseCRUD[User]):
@@ -35,7 +36,8 @@ class UserCRUD(BaseCRUD[User]):
             raise BadRequestException("User already exists!")
         try:
             # Hashing password
-            user_data["password"] = PasswordHandler.hash_password(user_data["password"])
+            with span("password.hash", "auth"):
+                user_data["password"] = PasswordHandler.hash_password(user_data["password"])
 
             new_user = await super().create(user_data)
             if not new_user:
@@ -49,7 +51,9 @@ class UserCRUD(BaseCRUD[User]):
         if not user:
             raise BadRequestException("User not found!")
 
-        if not PasswordHandler.verify_password(user.password, user_data["password"]):
+        with span("password.verify", "auth"):
+            valid = PasswordHandler.verify_password(user.password, user_data["password"])
+        if not valid:
             raise BadRequestException("Invalid Password!")
 
         payload = {
@@ -1,6 +1,8 @@
 from core.database import Base
 
 from .image import Image
+from .image_variant import ImageVariant
+from .transform_job import TransformJob
 from .user import User
 
-__all__ = ["Base", "User", "Image"]
+__all__ = ["Base", "User", "Image", "ImageVariant", "TransformJob"]
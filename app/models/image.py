@@ -1,8 +1,9 @@
 import uuid
+from typing import List, Optional
 
-from sqlalchemy import ForeignKey, String
+from sqlalchemy import BigInteger, ForeignKey, String
 from sqlalchemy.dialects.mysql import CHAR
-from sqlalchemy.orm import Mapped, mapped_column
+from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from core.database import Base
 from core.database.mixins import TimestampMixin
@@ -16,6 +17,11 @@ class Image(Base, TimestampMixin):
     user_id: Mapped[str] = mapped_column(
         CHAR(46), ForeignKey("users.id"), nullable=False
     )
+    size: Mapped[Optional[int]] = mapped_column(BigInteger, nullable=True)
+    content_hash: Mapped[Optional[str]] = mapped_column(CHAR(64), nullable=True)
+    variants: Mapped[List["ImageVariant"]] = relationship(  # noqa: F821
+        lazy="selectin", cascade="all, delete-orphan", passive_deletes=True
+    )
 
     def __repr__(self):
         return f"ID: {self.id}, Name: {self.name}, User ID: {self.user_id}"
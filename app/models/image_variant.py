@@ -0,0 +1,28 @@
+import uuid
+
+from sqlalchemy import ForeignKey, Integer, String
+from sqlalchemy.dialects.mysql import CHAR
+from sqlalchemy.orm import Mapped, mapped_column
+
+from core.database import Base
+from core.database.mixins import TimestampMixin
+
+
+class ImageVariant(Base, TimestampMixin):
+    __tablename__ = "image_variant"
+
+    id: Mapped[str] = mapped_column(CHAR(36), primary_key=True, default=uuid.uuid4)
+    image_id: Mapped[str] = mapped_column(
+        CHAR(36), ForeignKey("image.id", ondelete="CASCADE"), nullable=False, index=True
+    )
+    name: Mapped[str] = mapped_column(String(20), nullable=False)
+    format: Mapped[str] = mapped_column(String(10), nullable=False)
+    width: Mapped[int] = mapped_column(Integer, nullable=False)
+    height: Mapped[int] = mapped_column(Integer, nullable=False)
+    key: Mapped[str] = mapped_column(String(255), nullable=False)
+
+    def __repr__(self):
+        return f"ID: {self.id}, Image ID: {self.image_id}, Name: {self.name}, Format: {self.format}"
+
+    def __str__(self):
+        return self.__repr__()
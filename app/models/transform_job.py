@@ -0,0 +1,55 @@
+import uuid
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from sqlalchemy import JSON, DateTime, ForeignKey, Index, Integer, String, Text
+from sqlalchemy.dialects.mysql import CHAR
+from sqlalchemy.orm import Mapped, mapped_column
+
+from core.database import Base
+from core.database.mixins import TimestampMixin
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_COMPLETED = "completed"
+JOB_FAILED = "failed"
+
+# What a job does: apply its transformations, or (re)render the upload variants
+JOB_KIND_TRANSFORM = "transform"
+JOB_KIND_VARIANTS = "variants"
+
+
+class TransformJob(Base, TimestampMixin):
+    __tablename__ = "transform_job"
+    __table_args__ = (
+        Index("ix_transform_job_status_available_at", "status", "available_at"),
+    )
+
+    id: Mapped[str] = mapped_column(CHAR(36), primary_key=True, default=uuid.uuid4)
+    image_id: Mapped[str] = mapped_column(
+        CHAR(36), ForeignKey("image.id", ondelete="CASCADE"), nullable=False, index=True
+    )
+    user_id: Mapped[str] = mapped_column(
+        CHAR(36), ForeignKey("users.id"), nullable=False
+    )
+    kind: Mapped[str] = mapped_column(
+        String(20),
+        default=JOB_KIND_TRANSFORM,
+        server_default=JOB_KIND_TRANSFORM,
+        nullable=False,
+    )
+    transformations: Mapped[Dict[str, Any]] = mapped_column(JSON, nullable=False)
+    status: Mapped[str] = mapped_column(String(20), default=JOB_QUEUED, nullable=False)
+    attempts: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    max_attempts: Mapped[int] = mapped_column(Integer, nullable=False)
+    available_at: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+    locked_by: Mapped[Optional[str]] = mapped_column(String(64), nullable=True)
+    locked_until: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+    result_url: Mapped[Optional[str]] = mapped_column(String(255), nullable=True)
+    error: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+
+    def __repr__(self):
+        return f"ID: {self.id}, Image ID: {self.image_id}, Status: {self.status}"
+
+    def __str__(self):
+        return self.__repr__()
@@ -1,23 +1,28 @@
-from typing import Optional
+from typing import List, Optional
 
 from pydantic import BaseModel, Field
 
 
 class ResizeImage(BaseModel):
-    width: Optional[int] = Field(None)
-    height: Optional[int] = Field(None)
+    width: Optional[int] = Field(None, gt=0)
+    height: Optional[int] = Field(None, gt=0)
 
 
 class CropImage(BaseModel):
-    x: Optional[int] = Field(None)
-    y: Optional[int] = Field(None)
-    width: Optional[int] = Field(None)
-    height: Optional[int] = Field(None)
+    x: Optional[int] = Field(None, ge=0)
+    y: Optional[int] = Field(None, ge=0)
+    width: Optional[int] = Field(None, gt=0)
+    height: Optional[int] = Field(None, gt=0)
 
 
 class FilterImage(BaseModel):
     grayscale: Optional[bool] = Field(None)
     sepia: Optional[bool] = Field(None)
+    brightness: Optional[float] = Field(None, ge=0)
+    contrast: Optional[float] = Field(None, ge=0)
+    saturation: Optional[float] = Field(None, ge=0)
+    hue_rotate: Optional[float] = Field(None)
+    channel_mix: Optional[List[List[float]]] = Field(None)
 
 
 class ImageTransformation(BaseModel):
@@ -25,5 +30,12 @@ class ImageTransformation(BaseModel):
     crop: Optional[CropImage] = Field(None)
     rotate: Optional[int] = Field(None)
     format: Optional[str] = Field(None)
+    max_bytes: Optional[int] = Field(None, gt=0)
+    target_quality: Optional[float] = Field(None, gt=0, le=1)
     watermark: Optional[str] = Field(None)
     filter: Optional[FilterImage] = Field(None)
+
+
+class BatchTransformation(BaseModel):
+    image_ids: List[str] = Field(..., min_length=1)
+    transformation: ImageTransformation
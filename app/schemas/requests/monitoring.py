@@ -0,0 +1,15 @@
+from typing import Optional
+
+from pydantic import BaseModel, Field
+
+
+class RequestProfileRule(BaseModel):
+    route: Optional[str] = Field(
+        None,
+        description="Route template to match",
+        examples=["/v1/image/{image_id}/render"],
+    )
+    header: Optional[str] = Field(None, description="Header the request must carry")
+    header_value: Optional[str] = Field(None, description="Value the header must have")
+    limit: int = Field(1, ge=1, le=100, description="Number of requests to capture")
+    ttl_seconds: float = Field(300, gt=0, le=3600, description="How long to keep capturing")
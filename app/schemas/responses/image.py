@@ -0,0 +1,26 @@
+from datetime import datetime
+from typing import List, Optional
+
+from pydantic import UUID4, BaseModel, Field
+
+
+class ResponseImageVariant(BaseModel):
+    name: str = Field(..., description="The variant preset", examples=["thumb"])
+    format: str = Field(..., description="The variant format", examples=["webp"])
+    width: Optional[int] = Field(None, description="The variant width")
+    height: Optional[int] = Field(None, description="The variant height")
+    url: str = Field(..., description="The variant URL")
+
+
+class ResponseImage(BaseModel):
+    id: str | UUID4 = Field(..., description="The image id")
+    name: str = Field(..., description="The image file name")
+    user_id: str | UUID4 = Field(..., description="The owner's user id")
+    size: Optional[int] = Field(None, description="The size of the original in bytes")
+    content_hash: Optional[str] = Field(
+        None, description="The SHA-256 hash of the original"
+    )
+    created_at: Optional[datetime] = Field(None, description="The upload time")
+    variants: List[ResponseImageVariant] = Field(
+        default_factory=list, description="The generated responsive variants"
+    )
@@ -0,0 +1,389 @@
+"""
+Benchmark core.utils.images on a deterministic synthetic corpus and track regressions.
+
+Every combination of operations is run through `apply_image_transformations` on every
+corpus image, in a fresh process per case so that peak RSS is attributable. Wall
+time, CPU time, peak RSS and output size are written as JSON; `compare` flags cases
+that got worse than a stored baseline.
+
+Usage:
+    python -m benchmarks.images run --output current.json
+    python -m benchmarks.images run --sizes 0.3mp,2mp --kinds jpeg --cases resize
+    python -m benchmarks.images compare baseline.json current.json --threshold 0.1
+"""
+
+import argparse
+import itertools
+import json
+import os
+import platform
+import re
+import resource
+import statistics
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from multiprocessing import get_context
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import PIL
+from PIL import Image
+
+# Source sizes from 0.3 to 50 megapixels, all 4:3 or 3:2 like camera output.
+SIZES: Dict[str, Tuple[int, int]] = {
+    "0.3mp": (640, 480),
+    "2mp": (1600, 1200),
+    "12mp": (4000, 3000),
+    "24mp": (6000, 4000),
+    "50mp": (8660, 5774),
+}
+
+# Source kinds: the file format and the Pillow mode of the pixels.
+KINDS: Dict[str, Tuple[str, str]] = {
+    "jpeg": ("jpg", "RGB"),
+    "png": ("png", "RGB"),
+    "rgba": ("png", "RGBA"),
+}
+
+OPERATIONS = ("resize", "crop", "rotate", "watermark", "filter")
+
+DEFAULT_CORPUS_DIR = "/tmp/image-processing/benchmark-corpus"
+
+# Metrics compared against the baseline; larger is worse for all of them.
+COMPARED_METRICS = ("wall_ms", "cpu_ms", "peak_rss_mb", "output_bytes")
+
+# Timing metrics must also grow by this many milliseconds to count, so jitter on
+# cases that take a few milliseconds is not reported as a regression.
+TIME_METRICS = ("wall_ms", "cpu_ms")
+DEFAULT_MIN_DELTA_MS = 5.0
+
+
+def make_pixels(width: int, height: int, mode: str) -> Image:
+    """
+    Build a deterministic image with gradients and noise, so it compresses like a
+    photo rather than like a flat colour.
+
+    Args:
+        width (int): The width of the image.
+        height (int): The height of the image.
+        mode (str): "RGB" or "RGBA".
+
+    Returns:
+        Image: The generated image.
+    """
+    rng = np.random.default_rng(width * height)
+    x = np.linspace(0, 255, width, dtype=np.float32)
+    y = np.linspace(0, 255, height, dtype=np.float32)[:, None]
+    noise = rng.integers(0, 32, (height, width), dtype=np.uint8)
+    bands = [(x + noise) % 256, (y + noise) % 256, ((x + y) / 2 + noise) % 256]
+    if mode == "RGBA":
+        bands.append(np.broadcast_to(255 - y / 2, (height, width)))
+    return Image.fromarray(np.stack(bands, axis=-1).astype(np.uint8), mode)
+
+
+def build_corpus(directory: str, sizes: List[str], kinds: List[str]) -> List[Dict[str, Any]]:
+    """
+    Write the corpus images that do not exist yet and describe all of them.
+
+    Args:
+        directory (str): The corpus directory; files are reused across runs.
+        sizes (List[str]): Names from SIZES.
+        kinds (List[str]): Names from KINDS.
+
+    Returns:
+        List[dict]: Per image its "name", "path", "format", "mode", "width",
+            "height" and "bytes".
+    """
+    os.makedirs(directory, exist_ok=True)
+    corpus = []
+    for size_name, kind in itertools.product(sizes, kinds):
+        width, height = SIZES[size_name]
+        format_image, mode = KINDS[kind]
+        name = f"{kind}-{size_name}"
+        path = os.path.join(directory, f"{name}.{format_image}")
+        if not os.path.exists(path):
+            image = make_pixels(width, height, mode)
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, "wb") as f:
+                if format_image == "jpg":
+                    image.save(f, format="JPEG", quality=90)
+                else:
+                    image.save(f, format="PNG", compress_level=1)
+            os.replace(tmp_path, path)
+        corpus.append(
+            {
+                "name": name,
+                "path": path,
+                "format": format_image,
+                "mode": mode,
+                "width": width,
+                "height": height,
+                "bytes": os.path.getsize(path),
+            }
+        )
+    return corpus
+
+
+def operation_spec(operation: str, width: int, height: int) -> Dict[str, Any]:
+    """
+    Return the transformation entry of one operation, scaled to the source size.
+
+    Args:
+        operation (str): A name from OPERATIONS.
+        width (int): The source width.
+        height (int): The source height.
+
+    Returns:
+        dict: The entry to merge into a transformation dictionary.
+    """
+    if operation == "resize":
+        return {"resize": {"width": width // 2, "height": height // 2}}
+    if operation == "crop":
+        # Crops run after a resize, so the box must fit the halved image as well
+        return {
+            "crop": {"x": width // 16, "y": height // 16, "width": width // 4, "height": height // 4}
+        }
+    if operation == "rotate":
+        return {"rotate": 30}
+    if operation == "watermark":
+        return {"watermark": "benchmark"}
+    return {"filter": {"sepia": True, "contrast": 1.2}}
+
+
+def build_cases(pattern: Optional[str]) -> List[Tuple[str, ...]]:
+    """
+    List every non-empty combination of operations, plus a plain re-encode.
+
+    Args:
+        pattern (Optional[str]): A regular expression the case name must match.
+
+    Returns:
+        List[Tuple[str, ...]]: The operations of each case.
+    """
+    cases: List[Tuple[str, ...]] = [()]
+    for count in range(1, len(OPERATIONS) + 1):
+        cases.extend(itertools.combinations(OPERATIONS, count))
+    if pattern is not None:
+        cases = [case for case in cases if re.search(pattern, case_name(case))]
+    return cases
+
+
+def case_name(operations: Tuple[str, ...]) -> str:
+    return "+".join(operations) or "reencode"
+
+
+def run_case(
+    source: Dict[str, Any], operations: Tuple[str, ...], repeat: int
+) -> Dict[str, Any]:
+    """
+    Time one case; runs in a fresh worker process.
+
+    Args:
+        source (dict): The corpus entry.
+        operations (Tuple[str, ...]): The operations to apply.
+        repeat (int): How many times to run the case.
+
+    Returns:
+        dict: The measurements of the case.
+    """
+    from core.utils.images import apply_image_transformations
+
+    transformations: Dict[str, Any] = {}
+    for operation in operations:
+        transformations.update(operation_spec(operation, source["width"], source["height"]))
+
+    walls, cpus = [], []
+    output_bytes = 0
+    baseline_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    for _ in range(repeat):
+        wall_start, cpu_start = time.perf_counter(), time.process_time()
+        output = apply_image_transformations(source["path"], transformations, source["format"])
+        walls.append((time.perf_counter() - wall_start) * 1000)
+        cpus.append((time.process_time() - cpu_start) * 1000)
+        output_bytes = len(output)
+    # ru_maxrss is in KiB on Linux
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    return {
+        "id": f"{source['name']}/{case_name(operations)}",
+        "source": source["name"],
+        "case": case_name(operations),
+        "wall_ms": statistics.median(walls),
+        "wall_ms_min": min(walls),
+        "cpu_ms": statistics.median(cpus),
+        "peak_rss_mb": peak_rss / 1024,
+        "peak_rss_delta_mb": (peak_rss - baseline_rss) / 1024,
+        "output_bytes": output_bytes,
+    }
+
+
+def environment() -> Dict[str, Any]:
+    """
+    Describe the machine and versions, so results from different setups are not
+    mistaken for regressions.
+    """
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "commit": commit,
+        "python": platform.python_version(),
+        "pillow": PIL.__version__,
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def run(args: argparse.Namespace) -> int:
+    sizes = args.sizes.split(",")
+    kinds = args.kinds.split(",")
+    for name in sizes:
+        if name not in SIZES:
+            raise SystemExit(f"Unknown size {name}; choose from {', '.join(SIZES)}")
+    for name in kinds:
+        if name not in KINDS:
+            raise SystemExit(f"Unknown kind {name}; choose from {', '.join(KINDS)}")
+
+    corpus = build_corpus(args.corpus_dir, sizes, kinds)
+    cases = build_cases(args.cases)
+    results = []
+    # A new process per case keeps peak RSS from leaking between cases
+    with ProcessPoolExecutor(
+        max_workers=1, mp_context=get_context("spawn"), max_tasks_per_child=1
+    ) as executor:
+        for source in corpus:
+            for operations in cases:
+                result = executor.submit(run_case, source, operations, args.repeat).result()
+                results.append(result)
+                print(
+                    f"{result['id']:<48} wall {result['wall_ms']:9.1f} ms  "
+                    f"cpu {result['cpu_ms']:9.1f} ms  rss {result['peak_rss_mb']:7.1f} MB  "
+                    f"{result['output_bytes']:>10} B",
+                    flush=True,
+                )
+
+    report = {"environment": environment(), "corpus": corpus, "results": results}
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"wrote {len(results)} results to {args.output}")
+
+    if args.baseline is not None:
+        return compare_files(args.baseline, args.output, args.threshold, args.min_delta_ms)
+    return 0
+
+
+def compare_results(
+    baseline: List[Dict[str, Any]],
+    current: List[Dict[str, Any]],
+    threshold: float,
+    min_delta_ms: float = DEFAULT_MIN_DELTA_MS,
+) -> List[Dict[str, Any]]:
+    """
+    Find cases whose metrics got worse than the baseline by more than a threshold.
+
+    Args:
+        baseline (List[dict]): The baseline results.
+        current (List[dict]): The current results.
+        threshold (float): The tolerated relative increase, e.g. 0.1 for 10%.
+        min_delta_ms (float): The smallest absolute increase of a timing metric
+            that counts.
+
+    Returns:
+        List[dict]: One entry per regressed metric with "id", "metric", "baseline",
+            "current" and "change".
+    """
+    previous = {result["id"]: result for result in baseline}
+    regressions = []
+    for result in current:
+        before = previous.get(result["id"])
+        if before is None:
+            continue
+        for metric in COMPARED_METRICS:
+            if not before[metric]:
+                continue
+            change = result[metric] / before[metric] - 1
+            if metric in TIME_METRICS and result[metric] - before[metric] < min_delta_ms:
+                continue
+            if change > threshold:
+                regressions.append(
+                    {
+                        "id": result["id"],
+                        "metric": metric,
+                        "baseline": before[metric],
+                        "current": result[metric],
+                        "change": change,
+                    }
+                )
+    return regressions
+
+
+def compare_files(
+    baseline_path: str,
+    current_path: str,
+    threshold: float,
+    min_delta_ms: float = DEFAULT_MIN_DELTA_MS,
+) -> int:
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    with open(current_path) as f:
+        current = json.load(f)
+
+    regressions = compare_results(
+        baseline["results"], current["results"], threshold, min_delta_ms
+    )
+    for regression in regressions:
+        print(
+            f"REGRESSION {regression['id']:<48} {regression['metric']:<12} "
+            f"{regression['baseline']:12.1f} -> {regression['current']:12.1f} "
+            f"(+{regression['change']:.0%})"
+        )
+
+    matched = {result["id"] for result in baseline["results"]} & {
+        result["id"] for result in current["results"]
+    }
+    print(
+        f"compared {len(matched)} cases at a {threshold:.0%} threshold: "
+        f"{len(regressions)} regressions"
+    )
+    if baseline["environment"].get("platform") != current["environment"].get("platform"):
+        print("warning: the baseline was recorded on a different platform")
+    return 1 if regressions else 0
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = subparsers.add_parser("run", help="Run the benchmark suite")
+    run_parser.add_argument("--sizes", type=str, default=",".join(SIZES))
+    run_parser.add_argument("--kinds", type=str, default=",".join(KINDS))
+    run_parser.add_argument("--cases", type=str, default=None, help="Case name regex")
+    run_parser.add_argument("--repeat", type=int, default=3)
+    run_parser.add_argument("--corpus-dir", type=str, default=DEFAULT_CORPUS_DIR)
+    run_parser.add_argument("--output", type=str, default="benchmark-images.json")
+    run_parser.add_argument("--baseline", type=str, default=None, help="Compare afterwards")
+    run_parser.add_argument("--threshold", type=float, default=0.1)
+    run_parser.add_argument("--min-delta-ms", type=float, default=DEFAULT_MIN_DELTA_MS)
+
+    compare_parser = subparsers.add_parser("compare", help="Compare two result files")
+    compare_parser.add_argument("baseline", type=str)
+    compare_parser.add_argument("current", type=str)
+    compare_parser.add_argument("--threshold", type=float, default=0.1)
+    compare_parser.add_argument("--min-delta-ms", type=float, default=DEFAULT_MIN_DELTA_MS)
+
+    args = parser.parse_args()
+    if args.command == "run":
+        sys.exit(run(args))
+    sys.exit(compare_files(args.baseline, args.current, args.threshold, args.min_delta_ms))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,461 @@
+"""
+Load-test the API end to end with local stand-ins for MySQL and S3.
+
+The app from `core.server.create_app` is served by uvicorn in a child process, with
+SQLite (aiosqlite) as the database and either a moto S3 server (in a process of its
+own) or the local storage backend. The load generator does not share a GIL with
+either, so the latencies are the server's. Virtual users register, log in and then run a weighted mix of
+upload/transform/render/list/get/delete requests; throughput and p50/p95/p99
+latency are reported per endpoint. With --url an already running server is
+load-tested instead.
+
+Usage:
+    python -m benchmarks.load --users 16 --iterations 25
+    python -m benchmarks.load --storage local --mix upload=1,transform=4,list=4
+    python -m benchmarks.load --url http://127.0.0.1:8000 --output load.json
+"""
+
+import argparse
+import asyncio
+import io
+import json
+import math
+import os
+import random
+import signal
+import socket
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+import numpy as np
+from PIL import Image
+
+# Settings the app refuses to start without; harmless placeholders offline.
+REQUIRED_SETTINGS = {
+    "MYSQL_USER": "load",
+    "MYSQL_PASSWORD": "load",
+    "MYSQL_ROOT_PASSWORD": "load",
+    "MYSQL_DATABASE": "load",
+    "JWT_SECRET_KEY": "load-test-secret",
+    "JWT_ALGORITHM": "HS256",
+    "URL_SIGNING_KEY": "load-test-signing-key",
+    "AWS_ACCESS_KEY": "testing",
+    "AWS_SECRET_KEY": "testing",
+    "AWS_REGION": "us-east-1",
+    "AWS_S3_BUCKET_NAME": "load-test",
+}
+
+DEFAULT_MIX = "upload=1,transform=3,render=2,list=3,get=2,delete=1"
+
+ACTIONS = ("upload", "transform", "render", "list", "get", "delete")
+
+
+def parse_mix(value: str) -> Dict[str, int]:
+    """
+    Parse a traffic mix such as "upload=1,transform=3".
+
+    Args:
+        value (str): Comma-separated action=weight pairs.
+
+    Returns:
+        Dict[str, int]: The weight of each action.
+
+    Raises:
+        ValueError: If an action is unknown or a weight is not a positive integer.
+    """
+    mix = {}
+    for entry in value.split(","):
+        action, _, weight = entry.partition("=")
+        action = action.strip()
+        if action not in ACTIONS:
+            raise ValueError(f"Unknown action {action}; choose from {', '.join(ACTIONS)}")
+        if not weight.strip().isdigit() or int(weight) <= 0:
+            raise ValueError(f"Invalid weight for {action}: {weight!r}")
+        mix[action] = int(weight)
+    return mix
+
+
+def make_upload(width: int, height: int, seed: int) -> bytes:
+    """
+    Build a small photo-like JPEG to upload.
+
+    Args:
+        width (int): The width of the image.
+        height (int): The height of the image.
+        seed (int): The seed of the noise.
+
+    Returns:
+        bytes: The JPEG encoded image.
+    """
+    rng = np.random.default_rng(seed)
+    x = np.linspace(0, 255, width, dtype=np.float32)
+    y = np.linspace(0, 255, height, dtype=np.float32)[:, None]
+    noise = rng.integers(0, 32, (height, width), dtype=np.uint8)
+    pixels = np.stack(
+        [(x + noise) % 256, (y + noise) % 256, ((x + y) / 2 + noise) % 256], axis=-1
+    ).astype(np.uint8)
+    img_byte_arr = io.BytesIO()
+    Image.fromarray(pixels).save(img_byte_arr, format="JPEG", quality=90)
+    return img_byte_arr.getvalue()
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    """
+    Return a nearest-rank percentile.
+
+    Args:
+        values (List[float]): The sorted values.
+        fraction (float): The percentile as a fraction, e.g. 0.95.
+
+    Returns:
+        float: The percentile.
+    """
+    index = max(0, min(len(values) - 1, math.ceil(fraction * len(values)) - 1))
+    return values[index]
+
+
+class Recorder:
+    """
+    Collects the latency and outcome of every request, per endpoint.
+    """
+
+    def __init__(self) -> None:
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+
+    async def request(
+        self, client: httpx.AsyncClient, endpoint: str, method: str, url: str, **kwargs: Any
+    ) -> Optional[httpx.Response]:
+        """
+        Send a request and record it under an endpoint name.
+
+        Returns:
+            Optional[httpx.Response]: The response, or None if the request failed or
+                returned an error status.
+        """
+        start = time.perf_counter()
+        try:
+            response = await client.request(method, url, **kwargs)
+        except httpx.HTTPError:
+            response = None
+        self.latencies[endpoint].append((time.perf_counter() - start) * 1000)
+        if response is None or response.status_code >= 400:
+            self.errors[endpoint] += 1
+            return None
+        return response
+
+    def report(self, elapsed: float) -> Dict[str, Dict[str, float]]:
+        """
+        Summarize the recorded requests.
+
+        Args:
+            elapsed (float): The duration of the run in seconds.
+
+        Returns:
+            Dict[str, dict]: Per endpoint the request and error counts, throughput and
+                latency percentiles in milliseconds.
+        """
+        summary = {}
+        for endpoint, latencies in sorted(self.latencies.items()):
+            ordered = sorted(latencies)
+            summary[endpoint] = {
+                "requests": len(ordered),
+                "errors": self.errors[endpoint],
+                "throughput": len(ordered) / elapsed,
+                "mean_ms": statistics.fmean(ordered),
+                "p50_ms": percentile(ordered, 0.50),
+                "p95_ms": percentile(ordered, 0.95),
+                "p99_ms": percentile(ordered, 0.99),
+                "max_ms": ordered[-1],
+            }
+        return summary
+
+
+async def virtual_user(
+    client: httpx.AsyncClient,
+    recorder: Recorder,
+    user_index: int,
+    iterations: int,
+    mix: Dict[str, int],
+    upload: bytes,
+    seed: int,
+) -> None:
+    """
+    Register, log in and run `iterations` actions drawn from the mix.
+    """
+    rng = random.Random(seed + user_index)
+    email = f"load-{seed}-{user_index}-{uuid.uuid4().hex[:8]}@example.com"
+    credentials = {"email": email, "password": "load-test-password"}
+    if await recorder.request(
+        client, "register", "POST", "/v1/users/",
+        json={**credentials, "username": email.split("@")[0]},
+    ) is None:
+        return
+    response = await recorder.request(client, "login", "POST", "/v1/users/login", json=credentials)
+    if response is None:
+        return
+    headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+    images: List[str] = []
+    actions, weights = zip(*mix.items())
+    for _ in range(iterations):
+        action = rng.choices(actions, weights)[0]
+        if action != "upload" and action != "list" and not images:
+            action = "upload"
+
+        if action == "upload":
+            response = await recorder.request(
+                client, "upload", "POST", "/v1/image/upload-image",
+                files={"image": (f"load-{user_index}.jpg", upload, "image/jpeg")},
+                headers=headers,
+            )
+            if response is not None:
+                images.append(response.json()["id"])
+        elif action == "transform":
+            transformation = {
+                "resize": {"width": rng.choice((160, 320, 640)), "height": None},
+                "filter": {"grayscale": rng.random() < 0.5},
+            }
+            await recorder.request(
+                client, "transform", "POST", "/v1/image/transform-image",
+                params={"image_id": rng.choice(images)}, json=transformation, headers=headers,
+            )
+        elif action == "render":
+            await recorder.request(
+                client, "render", "GET", f"/v1/image/{rng.choice(images)}/render",
+                params={"w": rng.choice((120, 240, 480)), "fmt": "auto"},
+                headers={**headers, "Accept": "image/webp,*/*"},
+            )
+        elif action == "list":
+            await recorder.request(client, "list", "GET", "/v1/image/", headers=headers)
+        elif action == "get":
+            await recorder.request(
+                client, "get", "GET", f"/v1/image/{rng.choice(images)}", headers=headers
+            )
+        elif action == "delete":
+            image_id = images.pop(rng.randrange(len(images)))
+            await recorder.request(
+                client, "delete", "DELETE", f"/v1/image/delete-image/{image_id}", headers=headers
+            )
+
+
+async def drive(args: argparse.Namespace, base_url: str) -> Tuple[Dict[str, Any], float]:
+    recorder = Recorder()
+    upload = make_upload(args.image_width, args.image_height, args.seed)
+    limits = httpx.Limits(max_connections=args.users, max_keepalive_connections=args.users)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=args.timeout) as client:
+        start = time.perf_counter()
+        await asyncio.gather(
+            *(
+                virtual_user(client, recorder, index, args.iterations, args.mix, upload, args.seed)
+                for index in range(args.users)
+            )
+        )
+        elapsed = time.perf_counter() - start
+    return recorder.report(elapsed), elapsed
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_port(process: subprocess.Popen, port: int, timeout: float = 60.0) -> None:
+    """
+    Wait until a child process accepts connections on a port.
+
+    Raises:
+        SystemExit: If the process exits or does not listen in time.
+    """
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise SystemExit(f"{process.args[2]} exited with status {process.returncode}")
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.05)
+    raise SystemExit(f"{process.args[2]} did not start listening on port {port}")
+
+
+def stop_process(process: subprocess.Popen) -> None:
+    """
+    Stop a child process started in its own session, and whatever it started
+    (e.g. the image worker pools).
+    """
+    process.terminate()
+    try:
+        process.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+    try:
+        os.killpg(process.pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+
+
+def configure_environment(args: argparse.Namespace, workdir: str) -> Optional[subprocess.Popen]:
+    """
+    Point the app at SQLite and the chosen S3 stand-in. The server process inherits
+    the environment, since settings are read when `core` is imported.
+
+    Returns:
+        The moto server process to stop afterwards, if one was started.
+    """
+    for name, value in REQUIRED_SETTINGS.items():
+        os.environ.setdefault(name, value)
+    os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{os.path.join(workdir, 'load.db')}"
+    os.environ["SOURCE_CACHE_DIR"] = os.path.join(workdir, "sources")
+    os.environ["DERIVATIVE_CACHE_DIR"] = os.path.join(workdir, "derivatives")
+    os.environ["STORAGE_BACKEND"] = "local" if args.storage == "local" else "s3"
+    os.environ["LOCAL_STORAGE_DIR"] = os.path.join(workdir, "storage")
+
+    if args.storage != "moto":
+        return None
+    port = free_port()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "moto.server", "-p", str(port)],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        start_new_session=True,
+    )
+    wait_for_port(process, port)
+    os.environ["AWS_ENDPOINT_URL"] = f"http://127.0.0.1:{port}"
+    return process
+
+
+def start_server(port: int) -> subprocess.Popen:
+    """
+    Start `serve` in a child process and wait until it accepts connections.
+
+    Returns:
+        The server process.
+    """
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    process = subprocess.Popen(
+        [sys.executable, "-m", "benchmarks.load", "--serve", str(port)],
+        cwd=root,
+        start_new_session=True,
+    )
+    try:
+        wait_for_port(process, port)
+    except BaseException:
+        stop_process(process)
+        raise
+    return process
+
+
+def serve(port: int) -> None:
+    """
+    Create the tables and serve the app with uvicorn until terminated. Runs in the
+    server process started by `start_server`.
+    """
+    import uvicorn
+
+    import app.models  # noqa: F401
+    from core.config import config
+    from core.database.session import Base, engine
+    from core.server import create_app
+    from core.utils.aws_utils import get_s3_client
+
+    # aiosqlite hands the models' uuid4 primary keys to sqlite3 as they are
+    sqlite3.register_adapter(uuid.UUID, str)
+
+    async def create_tables() -> None:
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        # The engine's connections belong to this loop; the server gets fresh ones
+        await engine.dispose()
+
+    asyncio.run(create_tables())
+    if config.STORAGE_BACKEND == "s3":
+        get_s3_client().create_bucket(Bucket=config.AWS_S3_BUCKET_NAME)
+
+    uvicorn.run(create_app(), host="127.0.0.1", port=port, log_level="warning")
+
+
+def print_report(report: Dict[str, Dict[str, float]], elapsed: float) -> None:
+    print(
+        f"{'endpoint':<10} {'requests':>8} {'errors':>6} {'req/s':>8} "
+        f"{'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8}"
+    )
+    for endpoint, row in report.items():
+        print(
+            f"{endpoint:<10} {row['requests']:>8} {row['errors']:>6} {row['throughput']:>8.1f} "
+            f"{row['p50_ms']:>8.1f} {row['p95_ms']:>8.1f} {row['p99_ms']:>8.1f} "
+            f"{row['max_ms']:>8.1f}"
+        )
+    total = sum(row["requests"] for row in report.values())
+    errors = sum(row["errors"] for row in report.values())
+    print(f"total: {total} requests, {errors} errors in {elapsed:.1f} s ({total / elapsed:.1f} req/s)")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--users", type=int, default=8, help="Concurrent virtual users")
+    parser.add_argument("--iterations", type=int, default=20, help="Actions per user")
+    parser.add_argument("--mix", type=str, default=DEFAULT_MIX, help="action=weight,...")
+    parser.add_argument("--storage", choices=("moto", "local"), default="moto")
+    parser.add_argument("--url", type=str, default=None, help="Test a running server")
+    parser.add_argument("--image-width", type=int, default=1600)
+    parser.add_argument("--image-height", type=int, default=1200)
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", type=str, default=None, help="Write the report as JSON")
+    parser.add_argument("--serve", type=int, default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.serve is not None:
+        serve(args.serve)
+        return
+    try:
+        args.mix = parse_mix(args.mix)
+    except ValueError as e:
+        parser.error(str(e))
+
+    server = moto_server = None
+    with tempfile.TemporaryDirectory(prefix="image-processing-load-") as workdir:
+        base_url = args.url
+        try:
+            if base_url is None:
+                moto_server = configure_environment(args, workdir)
+                port = free_port()
+                server = start_server(port)
+                base_url = f"http://127.0.0.1:{port}"
+            report, elapsed = asyncio.run(drive(args, base_url))
+        finally:
+            if server is not None:
+                stop_process(server)
+            if moto_server is not None:
+                stop_process(moto_server)
+
+    print_report(report, elapsed)
+    if args.output is not None:
+        with open(args.output, "w") as f:
+            json.dump(
+                {
+                    "users": args.users,
+                    "iterations": args.iterations,
+                    "mix": args.mix,
+                    "storage": "external" if args.url else args.storage,
+                    "elapsed": elapsed,
+                    "endpoints": report,
+                },
+                f,
+                indent=2,
+            )
+    sys.exit(1 if any(row["errors"] for row in report.values()) else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+Compare the chained per-step transformations with the single-decode pipeline.
+
+Usage:
+    python -m benchmarks.pipeline --width 4000 --height 3000 --repeat 5
+"""
+
+import argparse
+import io
+import statistics
+import time
+from typing import Any, Callable, Dict, List
+
+import numpy as np
+from PIL import Image
+
+from core.utils.images import (add_watermark, apply_filter,
+                               apply_image_transformations, crop_image,
+                               decode_image, resize_image, rotate_image)
+
+TRANSFORMATIONS: Dict[str, Any] = {
+    "resize": {"width": 1600, "height": 1200},
+    "crop": {"x": 100, "y": 100, "width": 1200, "height": 900},
+    "rotate": 30,
+    "watermark": "benchmark",
+    "filter": {"grayscale": False, "sepia": True},
+    "format": "jpeg",
+}
+
+
+def make_source(width: int, height: int) -> bytes:
+    """
+    Build a deterministic JPEG source image with gradients and noise.
+
+    Args:
+        width (int): The width of the image.
+        height (int): The height of the image.
+
+    Returns:
+        bytes: The JPEG encoded image.
+    """
+    rng = np.random.default_rng(0)
+    x = np.linspace(0, 255, width, dtype=np.float32)
+    y = np.linspace(0, 255, height, dtype=np.float32)[:, None]
+    noise = rng.integers(0, 32, (height, width), dtype=np.uint8)
+    pixels = np.stack(
+        [(x + noise) % 256, (y + noise) % 256, ((x + y) / 2 + noise) % 256], axis=-1
+    ).astype(np.uint8)
+    img_byte_arr = io.BytesIO()
+    Image.fromarray(pixels).save(img_byte_arr, format="JPEG", quality=90)
+    return img_byte_arr.getvalue()
+
+
+def chained_transformations(
+    image_bytes: bytes, transformations: Dict[str, Any], original_format: str
+) -> bytes:
+    """
+    Reproduce the previous implementation: decode and re-encode around every step.
+    """
+    resize = transformations["resize"]
+    crop = transformations["crop"]
+    image_bytes = resize_image(image_bytes, resize["width"], resize["height"])
+    image_bytes = crop_image(image_bytes, crop["x"], crop["y"], crop["width"], crop["height"])
+    image_bytes = rotate_image(image_bytes, transformations["rotate"])
+    image_bytes = add_watermark(image_bytes, transformations["watermark"])
+    image_bytes = apply_filter(image_bytes, "sepia")
+    img = decode_image(image_bytes)
+    img_byte_arr = io.BytesIO()
+    img.save(img_byte_arr, format=transformations["format"].upper())
+    return img_byte_arr.getvalue()
+
+
+def measure(func: Callable[[], bytes], repeat: int) -> List[float]:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--width", type=int, default=4000)
+    parser.add_argument("--height", type=int, default=3000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    source = make_source(args.width, args.height)
+    results = {
+        "chained": measure(
+            lambda: chained_transformations(source, TRANSFORMATIONS, "jpeg"), args.repeat
+        ),
+        "pipeline": measure(
+            lambda: apply_image_transformations(source, TRANSFORMATIONS, "jpeg"), args.repeat
+        ),
+    }
+
+    print(f"source: {args.width}x{args.height} JPEG, {len(source)} bytes")
+    for name, timings in results.items():
+        print(
+            f"{name:>9}: median {statistics.median(timings):8.1f} ms, "
+            f"min {min(timings):8.1f} ms"
+        )
+    speedup = statistics.median(results["chained"]) / statistics.median(results["pipeline"])
+    print(f"speedup: {speedup:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
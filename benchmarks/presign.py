@@ -0,0 +1,75 @@
+"""
+Compare presigned URL generation with boto3, the local signer and the URL cache.
+
+Usage:
+    python -m benchmarks.presign --count 20000 --keys 500
+"""
+
+import argparse
+import time
+from typing import Callable
+
+import boto3
+from botocore.config import Config as BotoConfig
+
+from core.config import config
+from core.utils.presign import PresignedURLCache, PresignedURLSigner
+
+EXPIRATION = 3600
+
+
+def measure(sign: Callable[[str], str], keys: int, count: int) -> float:
+    """
+    Sign URLs for `count` requests spread over `keys` objects.
+
+    Returns:
+        float: Signatures per second.
+    """
+    names = [f"benchmark/{index}.jpg" for index in range(keys)]
+    start = time.perf_counter()
+    for index in range(count):
+        sign(names[index % keys])
+    return count / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark presigned URLs.")
+    parser.add_argument("--count", type=int, default=20_000, help="URLs to sign")
+    parser.add_argument("--keys", type=int, default=500, help="Distinct objects")
+    args = parser.parse_args()
+
+    client = boto3.client(
+        "s3",
+        aws_access_key_id=config.AWS_ACCESS_KEY,
+        aws_secret_access_key=config.AWS_SECRET_KEY,
+        region_name=config.AWS_REGION,
+        config=BotoConfig(signature_version="s3v4"),
+    )
+    signer = PresignedURLSigner(
+        config.AWS_ACCESS_KEY,
+        config.AWS_SECRET_KEY,
+        config.AWS_REGION,
+        config.AWS_S3_BUCKET_NAME,
+    )
+    cache = PresignedURLCache(signer, ttl=config.PRESIGN_CACHE_TTL, max_entries=args.keys)
+
+    results = {
+        "boto3": measure(
+            lambda name: client.generate_presigned_url(
+                "get_object",
+                Params={"Bucket": config.AWS_S3_BUCKET_NAME, "Key": name},
+                ExpiresIn=EXPIRATION,
+            ),
+            args.keys,
+            args.count,
+        ),
+        "local signer": measure(lambda name: signer.sign(name, EXPIRATION), args.keys, args.count),
+        "cached": measure(lambda name: cache.get(name, EXPIRATION), args.keys, args.count),
+    }
+    baseline = results["boto3"]
+    for name, rate in results.items():
+        print(f"{name:<13} {rate:12.0f} signatures/s ({rate / baseline:6.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
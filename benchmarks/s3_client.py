@@ -0,0 +1,118 @@
+"""
+Compare a fresh blocking S3 client per call with the shared, pooled client.
+
+Runs against any S3-compatible endpoint; without --endpoint a local moto server is
+started as a fake S3.
+
+Usage:
+    python -m benchmarks.s3_client --requests 200 --concurrency 32
+"""
+
+import argparse
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable
+
+import boto3
+
+from core.config import config
+from core.utils import aws_utils
+from core.utils.aws_utils import AWSService
+
+KEY = "benchmark/object.bin"
+
+
+def per_call_client():
+    """
+    Build a client the way every request used to: credentials, endpoint and pool anew.
+    """
+    return boto3.client(
+        "s3",
+        aws_access_key_id=config.AWS_ACCESS_KEY,
+        aws_secret_access_key=config.AWS_SECRET_KEY,
+        region_name=config.AWS_REGION,
+        endpoint_url=config.AWS_ENDPOINT_URL,
+    )
+
+
+async def previous_get() -> bytes:
+    """
+    Reproduce the previous implementation: a new client and a blocking call.
+    """
+    client = per_call_client()
+    response = client.get_object(Bucket=config.AWS_S3_BUCKET_NAME, Key=KEY)
+    return response["Body"].read()
+
+
+async def shared_get() -> bytes:
+    return await AWSService().get_image(KEY)
+
+
+async def measure(
+    get: Callable[[], Awaitable[bytes]], requests: int, concurrency: int
+) -> float:
+    """
+    Issue requests with bounded concurrency and return the throughput.
+
+    Returns:
+        float: Requests per second.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one() -> None:
+        async with semaphore:
+            await get()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(requests)))
+    return requests / (time.perf_counter() - start)
+
+
+async def run(requests: int, concurrency: int, size: int) -> None:
+    per_call_client().put_object(
+        Bucket=config.AWS_S3_BUCKET_NAME, Key=KEY, Body=b"\0" * size
+    )
+    # Warm up both paths so the first connection is not counted
+    await previous_get()
+    await shared_get()
+
+    previous = await measure(previous_get, requests, concurrency)
+    shared = await measure(shared_get, requests, concurrency)
+    print(f"per-call blocking client: {previous:8.1f} req/s")
+    print(f"shared pooled client:     {shared:8.1f} req/s ({shared / previous:.1f}x)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the S3 client.")
+    parser.add_argument("--endpoint", type=str, default=None, help="S3 endpoint URL")
+    parser.add_argument("--requests", type=int, default=200, help="Number of GETs")
+    parser.add_argument("--concurrency", type=int, default=32, help="GETs in flight")
+    parser.add_argument("--size", type=int, default=256 * 1024, help="Object size")
+    args = parser.parse_args()
+
+    server = None
+    endpoint = args.endpoint
+    if endpoint is None:
+        from moto.server import ThreadedMotoServer
+
+        logging.getLogger("werkzeug").setLevel(logging.ERROR)
+        server = ThreadedMotoServer(port=0)
+        server.start()
+        host, port = server.get_host_and_port()
+        endpoint = f"http://{host}:{port}"
+
+    config.AWS_ENDPOINT_URL = endpoint
+    aws_utils.get_s3_client.cache_clear()
+    try:
+        if server is not None:
+            per_call_client().create_bucket(Bucket=config.AWS_S3_BUCKET_NAME)
+        asyncio.run(run(args.requests, args.concurrency, args.size))
+    finally:
+        aws_utils.shutdown_s3()
+        if server is not None:
+            server.stop()
+
+
+if __name__ == "__main__":
+    main()
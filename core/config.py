@@ -1,4 +1,5 @@
 from pathlib import Path
+from typing import Optional
 
 from pydantic_settings import BaseSettings
 
@@ -17,13 +18,76 @@ class Config(ConfigSettings):
     MYSQL_PASSWORD: str
     MYSQL_ROOT_PASSWORD: str
     MYSQL_DATABASE: str
+    DATABASE_URL: Optional[str] = None
     JWT_SECRET_KEY: str
     JWT_ALGORITHM: str
+    URL_SIGNING_KEY: str
     JWT_EXPIRY: int = 60 * 24
     AWS_ACCESS_KEY: str
     AWS_SECRET_KEY: str
     AWS_REGION: str
     AWS_S3_BUCKET_NAME: str
+    STORAGE_BACKEND: str = "s3"
+    LOCAL_STORAGE_DIR: str = "/tmp/image-processing/storage"
+    LOCAL_STORAGE_BASE_URL: str = "http://127.0.0.1:8000/v1/files"
+    LOCAL_STORAGE_PUBLIC: bool = False
+    AWS_ENDPOINT_URL: Optional[str] = None
+    S3_MAX_POOL_CONNECTIONS: int = 32
+    PRESIGN_EXPIRATION: int = 3600
+    PRESIGN_CACHE_TTL: int = 900
+    PRESIGN_CACHE_SIZE: int = 10_000
+    S3_MULTIPART_PART_SIZE: int = 8 * 1024 * 1024
+    S3_MULTIPART_CONCURRENCY: int = 4
+    IMAGE_HEADER_BYTES: int = 64 * 1024
+    JPEG_QUALITY: int = 75
+    PNG_COMPRESS_LEVEL: int = 6
+    WEBP_QUALITY: int = 80
+    WEBP_METHOD: int = 4
+    AVIF_QUALITY: int = 75
+    AVIF_SPEED: int = 6
+    ENCODE_MIN_QUALITY: int = 30
+    ENCODE_MAX_QUALITY: int = 95
+    ENCODE_MAX_ATTEMPTS: int = 6
+    IMAGE_WORKERS: int = 2
+    IMAGE_QUEUE_DEPTH: int = 32
+    IMAGE_JOB_TIMEOUT: float = 60.0
+    IMAGE_WORKER_MAX_JOBS: int = 100
+    IMAGE_MAX_PIXELS: int = 300_000_000
+    IMAGE_TILED_THRESHOLD_PIXELS: int = 40_000_000
+    IMAGE_TILE_MEMORY_BUDGET: int = 16 * 1024 * 1024
+    DECODED_CACHE_MAX_BYTES: int = 0
+    BATCH_CONCURRENCY: int = 8
+    BATCH_SYNC_LIMIT: int = 50
+    BATCH_MAX_IMAGES: int = 500
+    JOB_MAX_ATTEMPTS: int = 5
+    JOB_LEASE_SECONDS: float = 300.0
+    JOB_POLL_INTERVAL: float = 1.0
+    JOB_RETRY_BASE_DELAY: float = 2.0
+    JOB_RETRY_MAX_DELAY: float = 300.0
+    JOB_WORKER_CONCURRENCY: int = 2
+    VARIANT_WORKERS: int = 1
+    VARIANT_QUEUE_DEPTH: int = 64
+    IMAGE_VARIANT_PRESETS: str = (
+        "thumb:256:webp,thumb:256:jpeg,medium:1024:webp,medium:1024:jpeg,"
+        "large:2048:webp,large:2048:jpeg"
+    )
+    RENDER_CACHE_CONTROL: str = "private, max-age=86400"
+    RENDER_SIGNED_MAX_AGE: int = 86400
+    METRICS_TOKEN: Optional[str] = None
+    TRACING_EXPORTER: str = "none"
+    TRACING_FILE: str = "/tmp/image-processing/traces.jsonl"
+    TRACING_OTLP_ENDPOINT: str = "http://127.0.0.1:4318/v1/traces"
+    TRACING_SAMPLE_RATE: float = 1.0
+    TRACING_SERVICE_NAME: str = "image-processing-service"
+    SERVER_TIMING: bool = False
+    PROFILE_MAX_SECONDS: float = 60.0
+    PROFILE_MAX_CAPTURES: int = 20
+    PROFILE_DIR: str = "/tmp/image-processing/profiles"
+    SOURCE_CACHE_DIR: str = "/tmp/image-processing/sources"
+    SOURCE_CACHE_MAX_BYTES: int = 2 * 1024 * 1024 * 1024
+    DERIVATIVE_CACHE_BACKEND: str = "storage"
+    DERIVATIVE_CACHE_DIR: str = "/tmp/image-processing/derivatives"
+    DERIVATIVE_CACHE_MAX_BYTES: int = 1024 * 1024 * 1024
 
 
 config: Config = Config()
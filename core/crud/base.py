@@ -5,6 +5,7 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.sql.expression import select
 
 from core.database import Base
+from core.utils.tracing import traced
 
 ModelType = TypeVar("ModelType", bound=Base)
 
@@ -30,6 +31,7 @@ class BaseCRUD(Generic[ModelType]):
         self.session = db_session
         self.model: Type[ModelType] = model
 
+    @traced("db.get_all", "db")
     async def get_all(self, skip: int = 0, limit: int = 20) -> Sequence[ModelType]:
         """
         Retrieve a list of all records, with optional pagination.
@@ -45,6 +47,7 @@ class BaseCRUD(Generic[ModelType]):
         result: Result = await self.session.execute(query)
         return result.scalars().all()
 
+    @traced("db.create", "db")
     async def create(self, attributes: Dict[str, Any]) -> ModelType | None:
         """
         Create a new record in the database.
@@ -63,6 +66,7 @@ class BaseCRUD(Generic[ModelType]):
         await self.session.commit()
         return model
 
+    @traced("db.get_by", "db")
     async def get_by(self, field: str, value: Any) -> ModelType:
         """
         Retrieve a single record by a specified field and value.
@@ -80,6 +84,7 @@ class BaseCRUD(Generic[ModelType]):
         result = await self.session.execute(query)
         return result.scalars().first()  # TODO: Adjust the types annotation
 
+    @traced("db.get_by_id", "db")
     async def get_by_id(self, _id: str) -> ModelType:
         """
         Retrieve a single record by its unique ID.
@@ -93,6 +98,7 @@ class BaseCRUD(Generic[ModelType]):
         _model = await self.get_by(field="id", value=_id)
         return _model
 
+    @traced("db.get_all_by", "db")
     async def get_all_by(
         self, field: str, value: Any, skip: int = 0, limit: int = 20
     ) -> List[ModelType]:
@@ -117,6 +123,23 @@ class BaseCRUD(Generic[ModelType]):
         result = await self.session.scalars(query)
         return result.all()  # TODO: Adjust the types annotation
 
+    @traced("db.get_all_in", "db")
+    async def get_all_in(self, field: str, values: Sequence[Any]) -> List[ModelType]:
+        """
+        Retrieve all records whose field matches any of the given values, in one query.
+
+        Args:
+            field (str): The field name to filter by.
+            values (Sequence[Any]): The values to match.
+
+        Returns:
+            List[ModelType]: A list of model instances matching the criteria.
+        """
+        query = select(self.model).where(getattr(self.model, field).in_(values))
+        result = await self.session.scalars(query)
+        return result.all()
+
+    @traced("db.update", "db")
     async def update(self, _id: str, attributes: dict[str, Any]) -> ModelType | None:
         """
         Update an existing record by ID with specified attributes.
@@ -137,6 +160,7 @@ class BaseCRUD(Generic[ModelType]):
         await self.session.commit()
         return model
 
+    @traced("db.delete", "db")
     async def delete(self, _id: str) -> bool | None:
         """
         Delete a record by its unique ID.
@@ -7,12 +7,20 @@ from sqlalchemy.ext.asyncio import (AsyncSession, async_sessionmaker,
 from sqlalchemy.orm import declarative_base
 
 from core.utils import get_database_url
+from core.utils.metrics import registry
 
 DATABASE_URL: str = get_database_url()
 
 engine = create_async_engine(DATABASE_URL)
 async_session_maker = async_sessionmaker(bind=engine, expire_on_commit=False)
 
+registry.gauge(
+    "db_pool_checked_out",
+    "Database connections currently checked out of the pool.",
+    # Pools without checkout tracking (e.g. NullPool) report 0
+    callback=lambda: getattr(engine.pool, "checkedout", lambda: 0)(),
+)
+
 Base = declarative_base()
 
 
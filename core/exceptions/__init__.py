@@ -1,9 +1,17 @@
 from .base import (BadRequestException, CustomException,
-                   DuplicateValueException, NotFoundException)
+                   DuplicateValueException, ForbiddenException,
+                   GatewayTimeoutException, NotFoundException,
+                   ServiceUnavailableException, StorageException,
+                   UnauthorizedException)
 
 __all__ = [
     "CustomException",
     "DuplicateValueException",
     "BadRequestException",
+    "UnauthorizedException",
+    "ForbiddenException",
     "NotFoundException",
+    "ServiceUnavailableException",
+    "GatewayTimeoutException",
+    "StorageException",
 ]
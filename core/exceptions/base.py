@@ -17,6 +17,18 @@ class BadRequestException(CustomException):
     message = HTTPStatus.BAD_REQUEST.description
 
 
+class UnauthorizedException(CustomException):
+    code = HTTPStatus.UNAUTHORIZED
+    error_code = HTTPStatus.UNAUTHORIZED
+    message = HTTPStatus.UNAUTHORIZED.description
+
+
+class ForbiddenException(CustomException):
+    code = HTTPStatus.FORBIDDEN
+    error_code = HTTPStatus.FORBIDDEN
+    message = HTTPStatus.FORBIDDEN.description
+
+
 class NotFoundException(CustomException):
     code = HTTPStatus.NOT_FOUND
     error_code = HTTPStatus.NOT_FOUND
@@ -27,3 +39,21 @@ class DuplicateValueException(CustomException):
     code = HTTPStatus.UNPROCESSABLE_ENTITY
     error_code = HTTPStatus.UNPROCESSABLE_ENTITY
     message = HTTPStatus.UNPROCESSABLE_ENTITY.description
+
+
+class StorageException(CustomException):
+    code = HTTPStatus.BAD_GATEWAY
+    error_code = HTTPStatus.BAD_GATEWAY
+    message = "Storage is unavailable"
+
+
+class ServiceUnavailableException(CustomException):
+    code = HTTPStatus.SERVICE_UNAVAILABLE
+    error_code = HTTPStatus.SERVICE_UNAVAILABLE
+    message = HTTPStatus.SERVICE_UNAVAILABLE.description
+
+
+class GatewayTimeoutException(CustomException):
+    code = HTTPStatus.GATEWAY_TIMEOUT
+    error_code = HTTPStatus.GATEWAY_TIMEOUT
+    message = HTTPStatus.GATEWAY_TIMEOUT.description
@@ -1,6 +1,7 @@
 from fastapi import Depends
 
 from app.crud.image import ImageCRUD
+from app.crud.transform_job import TransformJobCRUD
 from app.crud.user import UserCRUD
 from core.database import get_async_session
 
@@ -17,3 +18,7 @@ class Factory:
     @staticmethod
     def get_image_crud(db_session=Depends(get_async_session)):
         return ImageCRUD(db_session)
+
+    @staticmethod
+    def get_transform_job_crud(db_session=Depends(get_async_session)):
+        return TransformJobCRUD(db_session)
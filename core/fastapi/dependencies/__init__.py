@@ -1,4 +1,5 @@
+from .admin_required import get_admin_user
 from .authentication import AuthenticationRequired
 from .get_current_user import get_current_user
 
-__all__ = ["AuthenticationRequired", "get_current_user"]
+__all__ = ["AuthenticationRequired", "get_admin_user", "get_current_user"]
@@ -0,0 +1,10 @@
+from fastapi import Depends
+
+from core.exceptions import ForbiddenException
+from core.fastapi.dependencies.get_current_user import get_current_user
+
+
+async def get_admin_user(user=Depends(get_current_user)):
+    if not user.is_admin:
+        raise ForbiddenException("Admin privileges required!")
+    return user
@@ -1,3 +1,12 @@
 from .authentication import AuthBackend, AuthenticationMiddleware
+from .metrics import MetricsMiddleware
+from .profiling import ProfilingMiddleware
+from .tracing import TracingMiddleware
 
-__all__ = ["AuthBackend", "AuthenticationMiddleware"]
+__all__ = [
+    "AuthBackend",
+    "AuthenticationMiddleware",
+    "MetricsMiddleware",
+    "ProfilingMiddleware",
+    "TracingMiddleware",
+]
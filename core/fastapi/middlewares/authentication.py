@@ -7,9 +7,11 @@ from starlette.requests import HTTPConnection
 
 from app.schemas.extras import CurrentUser
 from core.utils import JWTTokenHandler
+from core.utils.tracing import traced
 
 
 class AuthBackend(AuthenticationBackend):
+    @traced("auth.authenticate", "auth")
     async def authenticate(
         self, conn: HTTPConnection
     ) -> Tuple[bool, Optional[CurrentUser]]:
@@ -0,0 +1,70 @@
+import time
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from core.utils.metrics import http_request_duration, http_requests
+
+
+def route_template(scope: Scope) -> str:
+    """
+    Return the full path template of the route that handled a request.
+
+    The matched route may belong to an included router and only know its own part
+    of the path, so the prefix is taken from the request path.
+
+    Args:
+        scope (Scope): The ASGI scope, after routing.
+
+    Returns:
+        str: The template, e.g. `/v1/image/{image_id}/render`, or "unmatched".
+    """
+    route = scope.get("route")
+    path_format = getattr(route, "path_format", None)
+    if path_format is None:
+        return "unmatched"
+    path_params = {name: str(value) for name, value in scope.get("path_params", {}).items()}
+    try:
+        rendered = path_format.format(**path_params)
+    except (KeyError, IndexError, ValueError):
+        return path_format
+    path = scope["path"]
+    if not path.endswith(rendered):
+        return path_format
+    return path[: len(path) - len(rendered)] + path_format
+
+
+class MetricsMiddleware:
+    """
+    Counts requests and records their latency per route.
+
+    Requests are labelled with the route's path template (e.g.
+    `/v1/image/{image_id}/render`) rather than the raw path, so the number of
+    series stays bounded; requests that match no route are labelled "unmatched".
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status = 500
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            template = route_template(scope)
+            method = scope["method"]
+            http_requests.inc(method=method, route=template, status=str(status))
+            http_request_duration.observe(
+                time.perf_counter() - start, method=method, route=template
+            )
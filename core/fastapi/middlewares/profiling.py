@@ -0,0 +1,41 @@
+import time
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from core.utils.profiling import request_profiler
+
+
+class ProfilingMiddleware:
+    """
+    Runs cProfile over requests matching the rule set through the monitoring API.
+
+    When no rule is set, requests pass straight through after a single attribute
+    check.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not request_profiler.armed:
+            await self.app(scope, receive, send)
+            return
+
+        profile = request_profiler.start(scope)
+        if profile is None:
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status = 500
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            request_profiler.finish(profile, scope, status, time.perf_counter() - start)
@@ -0,0 +1,51 @@
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from core.fastapi.middlewares.metrics import route_template
+from core.utils.tracing import TRACEPARENT, server_timing, tracer
+
+
+class TracingMiddleware:
+    """
+    Traces every request and, if SERVER_TIMING is on, summarizes the trace in a
+    Server-Timing response header.
+
+    It must be the outermost middleware so that authentication and everything
+    below it is recorded under the request's root span. An incoming W3C
+    `traceparent` header continues the caller's trace.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not tracer.enabled:
+            await self.app(scope, receive, send)
+            return
+
+        traceparent = Headers(scope=scope).get("traceparent")
+        trace = tracer.start_trace(traceparent)
+        if trace is None:
+            await self.app(scope, receive, send)
+            return
+
+        match = TRACEPARENT.match(traceparent or "")
+        parent_id = match.group(2) if match else None
+        with tracer.activate(trace, f"{scope['method']} {scope['path']}", parent_id) as root:
+            root.attributes["http.method"] = scope["method"]
+            root.attributes["http.target"] = scope["path"]
+
+            async def send_wrapper(message: Message) -> None:
+                if message["type"] == "http.response.start":
+                    root.attributes["http.status_code"] = message["status"]
+                    if tracer.server_timing:
+                        # Spans still open (the root itself) are counted up to now
+                        headers = MutableHeaders(scope=message)
+                        headers.append("Server-Timing", server_timing(trace.spans + [root]))
+                await send(message)
+
+            try:
+                await self.app(scope, receive, send_wrapper)
+            finally:
+                # Name the span after the route once routing has happened
+                root.name = f"{scope['method']} {route_template(scope)}"
@@ -1,4 +1,5 @@
-from typing import List
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, List
 
 from fastapi import FastAPI, Request
 from fastapi.middleware import Middleware
@@ -7,7 +8,12 @@ from fastapi.responses import JSONResponse
 
 from api import router
 from core.exceptions import CustomException
-from core.fastapi.middlewares import AuthBackend, AuthenticationMiddleware
+from core.fastapi.middlewares import (AuthBackend, AuthenticationMiddleware,
+                                     MetricsMiddleware, ProfilingMiddleware,
+                                     TracingMiddleware)
+from core.utils.aws_utils import shutdown_s3
+from core.utils.executor import image_executor, variant_executor
+from core.utils.tracing import tracer
 
 
 def on_auth_error(request: Request, exc: Exception):
@@ -39,6 +45,9 @@ def init_listeners(app_: FastAPI) -> None:
 
 def make_middleware() -> List[Middleware]:
     middleware = [
+        Middleware(TracingMiddleware),
+        Middleware(MetricsMiddleware),
+        Middleware(ProfilingMiddleware),
         Middleware(
             CORSMiddleware,
             allow_origins=["*"],
@@ -55,12 +64,22 @@ def make_middleware() -> List[Middleware]:
     return middleware
 
 
+@asynccontextmanager
+async def lifespan(app_: FastAPI) -> AsyncIterator[None]:
+    yield
+    image_executor.shutdown()
+    variant_executor.shutdown()
+    shutdown_s3()
+    tracer.shutdown()
+
+
 def create_app() -> FastAPI:
     app_ = FastAPI(
         title="Image Processing Server",
         description="Image Processing Server by @eedu7",
         version="1.0.0",
         middleware=make_middleware(),
+        lifespan=lifespan,
     )
     init_routers(app_=app_)
     init_listeners(app_=app_)
@@ -1,13 +1,125 @@
-from typing import Optional
+import asyncio
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache, partial
+from typing import Any, Awaitable, BinaryIO, Callable, Dict, List, Optional, TypeVar
 
 import boto3
+from botocore.config import Config as BotoConfig
 from botocore.exceptions import ClientError, NoCredentialsError
 
 from core.config import config
-from core.exceptions import BadRequestException
+from core.exceptions import (BadRequestException, CustomException,
+                             StorageException)
+from core.utils.presign import presigned_urls
+from core.utils.storage import Storage
+from core.utils.tracing import traced
 
+T = TypeVar("T")
 
-class AWSService:
+# Downloads are copied to their destination in chunks of this size.
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+
+# S3 rejects multipart parts (other than the last) smaller than 5 MiB.
+MIN_PART_SIZE = 5 * 1024 * 1024
+
+# Error codes of a missing object or bucket.
+MISSING_CODES = ("404", "NoSuchKey", "NotFound", "NoSuchBucket")
+
+
+def storage_error(error: Exception, action: str) -> CustomException:
+    """
+    Translate an error raised while talking to S3.
+
+    Missing objects and requests S3 rejects as invalid are the caller's problem and
+    become BadRequestException. Everything else (throttling, 5xx responses,
+    connection errors, timeouts, missing credentials) is a failure of the storage
+    itself and becomes StorageException, which job workers retry.
+
+    Args:
+        error (Exception): The error.
+        action (str): What was being done, e.g. "Error retrieving object".
+
+    Returns:
+        CustomException: The exception to raise.
+    """
+    if isinstance(error, CustomException):
+        return error
+    if isinstance(error, NoCredentialsError):
+        return StorageException("AWS credentials not available.")
+    if isinstance(error, ClientError):
+        message = f"{action}: {error.response['Error'].get('Message', '')}"
+        code = error.response["Error"].get("Code", "")
+        status = error.response.get("ResponseMetadata", {}).get("HTTPStatusCode") or 0
+        if code in MISSING_CODES or (400 <= status < 500 and status not in (403, 408, 429)):
+            return BadRequestException(message)
+        return StorageException(message)
+    return StorageException(f"Unexpected error: {str(error)}")
+
+
+@lru_cache(maxsize=None)
+def get_s3_client():
+    """
+    Return the process-wide S3 client, creating it on first use.
+
+    boto3 clients are thread-safe, so one client and its connection pool are shared
+    by every request instead of resolving credentials and connecting each time.
+
+    Returns:
+        The S3 client.
+    """
+    return boto3.client(
+        "s3",
+        aws_access_key_id=config.AWS_ACCESS_KEY,
+        aws_secret_access_key=config.AWS_SECRET_KEY,
+        region_name=config.AWS_REGION,
+        endpoint_url=config.AWS_ENDPOINT_URL or None,
+        config=BotoConfig(max_pool_connections=config.S3_MAX_POOL_CONNECTIONS),
+    )
+
+
+@lru_cache(maxsize=None)
+def get_s3_executor() -> ThreadPoolExecutor:
+    """
+    Return the thread pool that runs blocking S3 calls.
+
+    It has one thread per pooled connection, so calls beyond that wait in the pool's
+    queue instead of blocking the event loop or opening extra connections.
+
+    Returns:
+        ThreadPoolExecutor: The S3 thread pool.
+    """
+    return ThreadPoolExecutor(
+        max_workers=config.S3_MAX_POOL_CONNECTIONS, thread_name_prefix="s3"
+    )
+
+
+async def run_s3(func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """
+    Run a blocking S3 call on the S3 thread pool.
+
+    Args:
+        func (Callable): The blocking function, usually an S3 client method.
+        *args: Positional arguments for `func`.
+        **kwargs: Keyword arguments for `func`.
+
+    Returns:
+        The result of `func`.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_s3_executor(), partial(func, *args, **kwargs))
+
+
+def shutdown_s3() -> None:
+    """
+    Stop the S3 thread pool, waiting for running calls to finish.
+    """
+    if get_s3_executor.cache_info().currsize:
+        get_s3_executor().shutdown(wait=True)
+        get_s3_executor.cache_clear()
+
+
+class AWSService(Storage):
     """
     A service class for interacting with AWS S3.
 
@@ -16,21 +128,17 @@ class AWSService:
 
     def __init__(self):
         """
-        Initialize the AWSService instance and set up the S3 client.
+        Initialize the AWSService instance with the shared S3 client.
         """
         self.AWS_ACCESS_KEY = config.AWS_ACCESS_KEY
         self.AWS_SECRET_KEY = config.AWS_SECRET_KEY
         self.BUCKET_NAME = config.AWS_S3_BUCKET_NAME
         self.REGION_NAME = config.AWS_REGION
+        self.ENDPOINT_URL = config.AWS_ENDPOINT_URL
 
-        # Initialize the S3 client with provided credentials and region
-        self.s3_client = boto3.client(
-            "s3",
-            aws_access_key_id=self.AWS_ACCESS_KEY,
-            aws_secret_access_key=self.AWS_SECRET_KEY,
-            region_name=self.REGION_NAME,
-        )
+        self.s3_client = get_s3_client()
 
+    @traced("s3.get_image", "storage")
     async def get_image(self, file_name: str) -> bytes:
         """
         Retrieve an image from the S3 bucket.
@@ -42,22 +150,132 @@ class AWSService:
             bytes: The file's contents in bytes.
 
         Raises:
-            BadRequestException: If there are issues retrieving the file.
+            BadRequestException: If the object is missing or the request is invalid.
+            StorageException: If S3 fails or cannot be reached.
         """
         try:
+            response = await run_s3(
+                self.s3_client.get_object, Bucket=self.BUCKET_NAME, Key=file_name
+            )
+            return await run_s3(response["Body"].read)
+
+        except Exception as e:
+            raise storage_error(e, "Error retrieving object")
+
+    @traced("s3.download_image", "storage")
+    async def download_image(self, file_name: str, file_obj: BinaryIO) -> int:
+        """
+        Stream an image from the S3 bucket into a file object, chunk by chunk.
+
+        Unlike `get_image`, the object is never held in memory as a whole.
+
+        Args:
+            file_name (str): The name of the file to retrieve.
+            file_obj (BinaryIO): The writable binary file to copy it into.
+
+        Returns:
+            int: The number of bytes written.
+
+        Raises:
+            BadRequestException: If the object is missing or the request is invalid.
+            StorageException: If S3 fails or cannot be reached.
+        """
+
+        def copy() -> int:
             response = self.s3_client.get_object(Bucket=self.BUCKET_NAME, Key=file_name)
-            return response["Body"].read()
+            size = 0
+            for chunk in response["Body"].iter_chunks(DOWNLOAD_CHUNK_SIZE):
+                file_obj.write(chunk)
+                size += len(chunk)
+            return size
 
-        except NoCredentialsError:
-            raise BadRequestException("AWS credentials not available.")
-        except ClientError as e:
-            raise BadRequestException(
-                f"Error retrieving object: {e.response['Error']['Message']}"
+        try:
+            return await run_s3(copy)
+
+        except Exception as e:
+            raise storage_error(e, "Error retrieving object")
+
+    @traced("s3.get_image_range", "storage")
+    async def get_image_range(self, file_name: str, length: int) -> bytes:
+        """
+        Retrieve the first bytes of an image with a ranged GET.
+
+        Args:
+            file_name (str): The name of the file to retrieve.
+            length (int): The number of bytes to read from the start of the file.
+
+        Returns:
+            bytes: Up to `length` bytes; fewer if the file is shorter.
+
+        Raises:
+            BadRequestException: If the object is missing or the request is invalid.
+            StorageException: If S3 fails or cannot be reached.
+        """
+        try:
+            response = await run_s3(
+                self.s3_client.get_object,
+                Bucket=self.BUCKET_NAME,
+                Key=file_name,
+                Range=f"bytes=0-{length - 1}",
+            )
+            return await run_s3(response["Body"].read)
+
+        except Exception as e:
+            raise storage_error(e, "Error retrieving object")
+
+    @traced("s3.head_image", "storage")
+    async def head_image(self, file_name: str) -> Dict[str, Any]:
+        """
+        Retrieve the metadata of an image in the S3 bucket without downloading it.
+
+        Args:
+            file_name (str): The name of the file.
+
+        Returns:
+            Dict[str, Any]: The object metadata, including "ETag" and "ContentLength".
+
+        Raises:
+            BadRequestException: If the object is missing or the request is invalid.
+            StorageException: If S3 fails or cannot be reached.
+        """
+        try:
+            return await run_s3(
+                self.s3_client.head_object, Bucket=self.BUCKET_NAME, Key=file_name
             )
+
+        except Exception as e:
+            raise storage_error(e, "Error retrieving object metadata")
+
+    @traced("s3.object_exists", "storage")
+    async def object_exists(self, file_name: str) -> bool:
+        """
+        Check whether an object exists in the S3 bucket.
+
+        Args:
+            file_name (str): The name of the file.
+
+        Returns:
+            bool: True if the object exists.
+
+        Raises:
+            BadRequestException: If the request is invalid.
+            StorageException: If S3 fails or cannot be reached.
+        """
+        try:
+            await run_s3(
+                self.s3_client.head_object, Bucket=self.BUCKET_NAME, Key=file_name
+            )
+            return True
+
+        except ClientError as e:
+            if e.response["Error"]["Code"] in MISSING_CODES:
+                return False
+            raise storage_error(e, "Error retrieving object metadata")
         except Exception as e:
-            raise BadRequestException(f"Unexpected error: {str(e)}")
+            raise storage_error(e, "Error retrieving object metadata")
 
-    async def upload_image_to_s3(
+    @traced("s3.upload_image", "storage")
+    async def upload_image(
         self, file_data: bytes, file_name: str, content_type: str
     ) -> str:
         """
@@ -72,10 +290,12 @@ class AWSService:
             str: The public URL of the uploaded file.
 
         Raises:
-            BadRequestException: If there are issues during the upload process.
+            BadRequestException: If the object is missing or the request is invalid.
+            StorageException: If S3 fails or cannot be reached.
         """
         try:
-            self.s3_client.put_object(
+            await run_s3(
+                self.s3_client.put_object,
                 Bucket=self.BUCKET_NAME,
                 Key=file_name,
                 Body=file_data,
@@ -83,14 +303,131 @@ class AWSService:
             )
             return await self.create_image_url(file_name)
 
-        except NoCredentialsError:
-            raise BadRequestException("AWS credentials not available.")
-        except ClientError as e:
-            raise BadRequestException(
-                f"Error uploading image: {e.response['Error']['Message']}"
-            )
         except Exception as e:
-            raise BadRequestException(f"Unexpected error: {str(e)}")
+            raise storage_error(e, "Error uploading image")
+
+    @traced("s3.upload_stream", "storage")
+    async def upload_stream(
+        self, file_obj: BinaryIO, file_name: str, content_type: str
+    ) -> Dict[str, Any]:
+        """
+        Stream a file object to the S3 bucket, hashing it on the way.
+
+        Files that fit into one part are sent with a single PUT. Larger files are sent
+        as a multipart upload whose parts are uploaded concurrently; at most
+        S3_MULTIPART_CONCURRENCY parts are held in memory at a time, so the file is
+        never buffered whole.
+
+        Args:
+            file_obj (BinaryIO): The file to upload, read from its current position.
+            file_name (str): The name of the file to be saved.
+            content_type (str): The MIME type of the file.
+
+        Returns:
+            Dict[str, Any]: The "url" of the uploaded file, its "size" in bytes and its
+                SHA-256 "content_hash".
+
+        Raises:
+            BadRequestException: If the object is missing or the request is invalid.
+            StorageException: If S3 fails or cannot be reached.
+        """
+        part_size = max(config.S3_MULTIPART_PART_SIZE, MIN_PART_SIZE)
+        digest = hashlib.sha256()
+
+        async def read_part() -> bytes:
+            chunk = await asyncio.to_thread(file_obj.read, part_size)
+            digest.update(chunk)
+            return chunk
+
+        try:
+            first_part = await read_part()
+            if len(first_part) < part_size:
+                size = len(first_part)
+                await run_s3(
+                    self.s3_client.put_object,
+                    Bucket=self.BUCKET_NAME,
+                    Key=file_name,
+                    Body=first_part,
+                    ContentType=content_type,
+                )
+            else:
+                size = await self._upload_multipart(
+                    first_part, read_part, file_name, content_type
+                )
+            return {
+                "url": await self.create_image_url(file_name),
+                "size": size,
+                "content_hash": digest.hexdigest(),
+            }
+
+        except Exception as e:
+            raise storage_error(e, "Error uploading image")
+
+    async def _upload_multipart(
+        self,
+        first_part: bytes,
+        read_part: Callable[[], Awaitable[bytes]],
+        file_name: str,
+        content_type: str,
+    ) -> int:
+        upload_id = (
+            await run_s3(
+                self.s3_client.create_multipart_upload,
+                Bucket=self.BUCKET_NAME,
+                Key=file_name,
+                ContentType=content_type,
+            )
+        )["UploadId"]
+        slots = asyncio.Semaphore(max(1, config.S3_MULTIPART_CONCURRENCY))
+        tasks: List[asyncio.Task] = []
+
+        async def send_part(number: int, data: bytes) -> Dict[str, Any]:
+            try:
+                response = await run_s3(
+                    self.s3_client.upload_part,
+                    Bucket=self.BUCKET_NAME,
+                    Key=file_name,
+                    UploadId=upload_id,
+                    PartNumber=number,
+                    Body=data,
+                )
+                return {"ETag": response["ETag"], "PartNumber": number}
+            finally:
+                slots.release()
+
+        try:
+            size, part = 0, first_part
+            while part:
+                # Waiting for a free slot bounds the number of parts held in memory
+                await slots.acquire()
+                for task in tasks:
+                    if task.done() and task.exception() is not None:
+                        raise task.exception()
+                tasks.append(asyncio.create_task(send_part(len(tasks) + 1, part)))
+                size += len(part)
+                part = await read_part()
+
+            parts = await asyncio.gather(*tasks)
+            await run_s3(
+                self.s3_client.complete_multipart_upload,
+                Bucket=self.BUCKET_NAME,
+                Key=file_name,
+                UploadId=upload_id,
+                MultipartUpload={"Parts": parts},
+            )
+            return size
+
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            await run_s3(
+                self.s3_client.abort_multipart_upload,
+                Bucket=self.BUCKET_NAME,
+                Key=file_name,
+                UploadId=upload_id,
+            )
+            raise
 
     async def create_image_url(self, file_name: str) -> str:
         """
@@ -102,56 +439,72 @@ class AWSService:
         Returns:
             str: The public URL of the file.
         """
+        if self.ENDPOINT_URL:
+            return f"{self.ENDPOINT_URL.rstrip('/')}/{self.BUCKET_NAME}/{file_name}"
         return f"https://{self.BUCKET_NAME}.s3.{self.REGION_NAME}.amazonaws.com/{file_name}"
 
     async def generate_presigned_url(
-        self, file_name: str, expiration: int = 3600
+        self, file_name: str, expiration: int = config.PRESIGN_EXPIRATION
     ) -> str:
         """
         Generate a presigned URL for accessing an object in S3.
 
+        URLs are signed locally and cached, so repeated requests for the same object
+        within PRESIGN_CACHE_TTL seconds return the same URL.
+
         Args:
             file_name (str): The name of the file in the S3 bucket.
-            expiration (int): The time in seconds for the URL to remain valid. Defaults to 3600.
+            expiration (int): The time in seconds for the URL to remain valid. Defaults to
+                PRESIGN_EXPIRATION.
 
         Returns:
             str: The presigned URL.
+        """
+        return presigned_urls.get(file_name, expiration)
+
+    @traced("s3.delete_object", "storage")
+    async def delete_object(self, file_name: str) -> None:
+        """
+        Delete an object from the S3 bucket.
+
+        Args:
+            file_name (str): The name of the file to delete.
 
         Raises:
-            BadRequestException: If there are issues generating the presigned URL.
+            BadRequestException: If the object is missing or the request is invalid.
+            StorageException: If S3 fails or cannot be reached.
         """
         try:
-            return self.s3_client.generate_presigned_url(
-                "get_object",
-                Params={"Bucket": self.BUCKET_NAME, "Key": file_name},
-                ExpiresIn=expiration,
-            )
-        except NoCredentialsError:
-            raise BadRequestException("AWS credentials not available.")
-        except ClientError as e:
-            raise BadRequestException(
-                f"Error generating presigned URL: {e.response['Error']['Message']}"
+            await run_s3(
+                self.s3_client.delete_object, Bucket=self.BUCKET_NAME, Key=file_name
             )
         except Exception as e:
-            raise BadRequestException(f"Unexpected error: {str(e)}")
+            raise storage_error(e, "Error deleting object")
 
-    async def delete_object(self, file_name: str) -> None:
+    @traced("s3.list_objects", "storage")
+    async def list_objects(self, prefix: str) -> List[str]:
         """
-        Delete an object from the S3 bucket.
+        List the keys of the objects in the S3 bucket under a prefix.
 
         Args:
-            file_name (str): The name of the file to delete.
+            prefix (str): The key prefix.
+
+        Returns:
+            List[str]: The object keys.
 
         Raises:
-            BadRequestException: If there are issues deleting the object.
+            StorageException: If S3 fails or cannot be reached.
         """
+
+        def list_keys() -> List[str]:
+            paginator = self.s3_client.get_paginator("list_objects_v2")
+            return [
+                item["Key"]
+                for page in paginator.paginate(Bucket=self.BUCKET_NAME, Prefix=prefix)
+                for item in page.get("Contents", [])
+            ]
+
         try:
-            self.s3_client.delete_object(Bucket=self.BUCKET_NAME, Key=file_name)
-        except NoCredentialsError:
-            raise BadRequestException("AWS credentials not available.")
-        except ClientError as e:
-            raise BadRequestException(
-                f"Error deleting object: {e.response['Error']['Message']}"
-            )
+            return await run_s3(list_keys)
         except Exception as e:
-            raise BadRequestException(f"Unexpected error: {str(e)}")
+            raise storage_error(e, "Error listing objects")
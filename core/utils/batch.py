@@ -0,0 +1,127 @@
+import asyncio
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Sequence
+
+from icecream import ic
+
+from core.config import config
+from core.exceptions import CustomException
+from core.utils.transform import transform_stored_image
+
+
+async def run_batch(
+    items: Sequence[Dict[str, Any]],
+    transformations: Dict[str, Any],
+    concurrency: int = config.BATCH_CONCURRENCY,
+) -> List[Dict[str, Any]]:
+    """
+    Apply one transformation to many images with bounded concurrency.
+
+    Items that are already marked with an error are passed through untouched, and an
+    image that fails to transform only fails its own item. While
+    one image is being transformed, the next ones are downloading or uploading, so S3
+    round trips overlap with CPU work.
+
+    Args:
+        items (Sequence[dict]): One dict per image with "image_id" and either "name"
+            (the object key) or "error".
+        transformations (dict): The transformations to apply.
+        concurrency (int): Maximum number of images in flight.
+
+    Returns:
+        List[dict]: Per-item results with "image_id" and either "url" or "error".
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run_item(item: Dict[str, Any]) -> Dict[str, Any]:
+        if "error" in item:
+            return {"image_id": item["image_id"], "error": item["error"]}
+        async with semaphore:
+            try:
+                url = await transform_stored_image(item["name"], transformations)
+                return {"image_id": item["image_id"], "url": url}
+            except CustomException as e:
+                return {"image_id": item["image_id"], "error": e.message}
+            except Exception as e:
+                # One broken image must not fail the rest of the batch
+                ic(f"Batch item {item['image_id']} failed: {e!r}")
+                return {"image_id": item["image_id"], "error": "Image could not be transformed"}
+
+    return await asyncio.gather(*(run_item(item) for item in items))
+
+
+class BatchJobRegistry:
+    """
+    Tracks batches that run in the background after the request has returned.
+
+    Jobs live in process memory; the oldest finished jobs are forgotten once the
+    registry holds more than `max_jobs`.
+    """
+
+    def __init__(self, max_jobs: int = 1000) -> None:
+        self.max_jobs = max_jobs
+        self._jobs: OrderedDict[str, Dict[str, Any]] = OrderedDict()
+        self._tasks: Dict[str, asyncio.Task] = {}
+
+    def submit(
+        self, user_id: str, items: Sequence[Dict[str, Any]], transformations: Dict[str, Any]
+    ) -> str:
+        """
+        Start a batch in the background.
+
+        Args:
+            user_id (str): The owner of the batch.
+            items (Sequence[dict]): The batch items, as accepted by `run_batch`.
+            transformations (dict): The transformations to apply.
+
+        Returns:
+            str: The job ID.
+        """
+        job_id = str(uuid.uuid4())
+        self._jobs[job_id] = {
+            "id": job_id,
+            "user_id": user_id,
+            "status": "running",
+            "total": len(items),
+            "results": None,
+        }
+        task = asyncio.create_task(self._run(job_id, items, transformations))
+        self._tasks[job_id] = task
+        self._forget_finished()
+        return job_id
+
+    async def _run(
+        self, job_id: str, items: Sequence[Dict[str, Any]], transformations: Dict[str, Any]
+    ) -> None:
+        job = self._jobs[job_id]
+        try:
+            job["results"] = await run_batch(items, transformations)
+            job["status"] = "completed"
+        except Exception as e:
+            job["status"] = "failed"
+            job["error"] = str(e)
+        finally:
+            self._tasks.pop(job_id, None)
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Return a job's state.
+
+        Args:
+            job_id (str): The job ID.
+
+        Returns:
+            Optional[dict]: The job, or None if it is unknown.
+        """
+        return self._jobs.get(job_id)
+
+    def _forget_finished(self) -> None:
+        for job_id in list(self._jobs):
+            if len(self._jobs) <= self.max_jobs:
+                break
+            if job_id not in self._tasks:
+                del self._jobs[job_id]
+
+
+batch_jobs = BatchJobRegistry()
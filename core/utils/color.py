@@ -0,0 +1,173 @@
+import math
+from typing import List, Optional, Sequence
+
+import numpy as np
+from PIL import Image
+
+# Colour operations are affine maps on (R, G, B), held as 4x4 homogeneous matrices so
+# that a chain of them composes into a single matrix. Offsets are in 0-255 units.
+
+# ITU-R 601-2 luma, the same weights Pillow uses for convert("L").
+LUMA = np.array([0.299, 0.587, 0.114])
+
+# Rec. 709 luma, which the SVG hue rotation matrix is built on.
+HUE_LUMA = np.array([0.213, 0.715, 0.072])
+
+
+def _affine(linear: np.ndarray, offset: Optional[Sequence[float]] = None) -> np.ndarray:
+    matrix = np.eye(4)
+    matrix[:3, :3] = linear
+    if offset is not None:
+        matrix[:3, 3] = offset
+    return matrix
+
+
+def identity_matrix() -> np.ndarray:
+    """
+    Return the colour matrix that leaves every pixel unchanged.
+    """
+    return np.eye(4)
+
+
+def grayscale_matrix() -> np.ndarray:
+    """
+    Return the colour matrix that replaces every channel with the pixel's luma.
+    """
+    return _affine(np.tile(LUMA, (3, 1)))
+
+
+def sepia_matrix() -> np.ndarray:
+    """
+    Return the classic sepia tone colour matrix.
+    """
+    return _affine(
+        np.array(
+            [
+                [0.393, 0.769, 0.189],
+                [0.349, 0.686, 0.168],
+                [0.272, 0.534, 0.131],
+            ]
+        )
+    )
+
+
+def brightness_matrix(factor: float) -> np.ndarray:
+    """
+    Return a colour matrix that scales brightness.
+
+    Args:
+        factor (float): 1.0 keeps the image unchanged, 0.0 gives black.
+    """
+    return _affine(np.eye(3) * factor)
+
+
+def contrast_matrix(factor: float) -> np.ndarray:
+    """
+    Return a colour matrix that scales contrast around mid-grey.
+
+    Args:
+        factor (float): 1.0 keeps the image unchanged, 0.0 gives flat grey.
+    """
+    return _affine(np.eye(3) * factor, [128.0 * (1.0 - factor)] * 3)
+
+
+def saturation_matrix(factor: float) -> np.ndarray:
+    """
+    Return a colour matrix that scales saturation.
+
+    Args:
+        factor (float): 1.0 keeps the image unchanged, 0.0 gives grayscale.
+    """
+    return _affine((1.0 - factor) * np.tile(LUMA, (3, 1)) + factor * np.eye(3))
+
+
+def hue_rotation_matrix(degrees: float) -> np.ndarray:
+    """
+    Return a colour matrix that rotates hue while preserving luma.
+
+    This is the hueRotate matrix of the SVG feColorMatrix filter.
+
+    Args:
+        degrees (float): The rotation angle in degrees.
+    """
+    cos = math.cos(math.radians(degrees))
+    sin = math.sin(math.radians(degrees))
+    luma = np.tile(HUE_LUMA, (3, 1))
+    return _affine(
+        luma
+        + cos * (np.eye(3) - luma)
+        + sin
+        * np.array(
+            [
+                [-0.213, -0.715, 0.928],
+                [0.143, 0.140, -0.283],
+                [-0.787, 0.715, 0.072],
+            ]
+        )
+    )
+
+
+def channel_mix_matrix(rows: List[List[float]]) -> np.ndarray:
+    """
+    Return a colour matrix from explicit channel mixing weights.
+
+    Args:
+        rows (List[List[float]]): Three rows, one per output channel, of three
+            weights for (R, G, B) and an optional fourth offset in 0-255 units.
+
+    Raises:
+        ValueError: If the rows do not form a 3x3 or 3x4 matrix.
+    """
+    mix = np.array(rows, dtype=float)
+    if mix.shape not in ((3, 3), (3, 4)):
+        raise ValueError("Channel mix must be a 3x3 or 3x4 matrix")
+    return _affine(mix[:, :3], mix[:, 3] if mix.shape[1] == 4 else None)
+
+
+def compose(*matrices: np.ndarray) -> np.ndarray:
+    """
+    Compose colour matrices into one.
+
+    Args:
+        *matrices (np.ndarray): The matrices, in the order they would be applied.
+
+    Returns:
+        np.ndarray: A single matrix with the same effect.
+    """
+    result = np.eye(4)
+    for matrix in matrices:
+        result = matrix @ result
+    return result
+
+
+def apply_color_matrix(image: Image, matrix: np.ndarray, grayscale: bool = False) -> Image:
+    """
+    Apply a colour matrix to an image in a single pass.
+
+    The conversion runs inside Pillow's `Image.convert(matrix=...)`, so no float copy
+    of the image is made. An alpha channel, if any, is carried over unchanged.
+
+    Args:
+        image (Image): The image to transform.
+        matrix (np.ndarray): The 4x4 colour matrix.
+        grayscale (bool): Produce a single-band image from the matrix's first row.
+
+    Returns:
+        Image: The transformed image, "L"/"LA" if grayscale, else "RGB"/"RGBA".
+    """
+    alpha = None
+    if image.mode in ("LA", "PA") or (image.mode == "P" and "transparency" in image.info):
+        image = image.convert("RGBA")
+    if image.mode == "RGBA":
+        alpha = image.getchannel("A")
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+
+    if grayscale:
+        result = image.convert("L", tuple(matrix[0, :].tolist()))
+    else:
+        result = image.convert("RGB", tuple(matrix[:3, :].flatten().tolist()))
+
+    if alpha is not None:
+        result.putalpha(alpha)
+    return result
@@ -10,5 +10,8 @@ def get_database_url(
     host: str = "my_db",
     driver: str = "aiomysql",
 ) -> str:
+    # A full URL (e.g. SQLite for local runs and load tests) replaces the MySQL settings
+    if config.DATABASE_URL:
+        return config.DATABASE_URL
     database_url: str = f"mysql+{driver}://{user}:{password}@{host}/{database}"
     return database_url
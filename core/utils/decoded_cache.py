@@ -0,0 +1,118 @@
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+
+from PIL import Image
+
+from core.config import config
+
+
+def decoded_size(image: Image) -> int:
+    """
+    Compute the memory a decoded image occupies.
+
+    Pillow keeps single-band images at their native sample size and pads every
+    multi-band pixel (RGB included) to 32 bits.
+
+    Args:
+        image (Image): The decoded image.
+
+    Returns:
+        int: The size of the pixel data in bytes.
+    """
+    if len(image.getbands()) > 1 or image.mode in ("I", "F"):
+        bytes_per_pixel = 4
+    elif image.mode.startswith("I;16"):
+        bytes_per_pixel = 2
+    else:
+        bytes_per_pixel = 1
+    return image.width * image.height * bytes_per_pixel
+
+
+class DecodedImageCache:
+    """
+    Keeps recently decoded source images in memory within a strict byte budget.
+
+    Cached images are shared between requests and must never be modified; the
+    pipeline copies an image before any operation that would write into it.
+    Each image worker process has its own cache.
+    """
+
+    def __init__(self, max_bytes: int) -> None:
+        """
+        Initialize the cache.
+
+        Args:
+            max_bytes (int): The maximum total size of the cached pixel data; 0
+                disables the cache.
+        """
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[Hashable, Image] = OrderedDict()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    def get(self, key: Hashable) -> Optional[Image]:
+        """
+        Return a cached image and mark it as recently used.
+
+        Args:
+            key (Hashable): The source identity.
+
+        Returns:
+            Optional[Image]: The shared decoded image, or None on a miss.
+        """
+        image = self._entries.get(key)
+        if image is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._entries.move_to_end(key)
+        return image
+
+    def put(self, key: Hashable, image: Image) -> bool:
+        """
+        Cache a decoded image, evicting least recently used images to make room.
+
+        Args:
+            key (Hashable): The source identity.
+            image (Image): The decoded image. It must not be modified afterwards.
+
+        Returns:
+            bool: True if the image was cached; False if it exceeds the whole budget.
+        """
+        size = decoded_size(image)
+        if size > self.max_bytes:
+            return False
+
+        previous = self._entries.pop(key, None)
+        if previous is not None:
+            self.size -= decoded_size(previous)
+        while self._entries and self.size + size > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self.size -= decoded_size(evicted)
+        self._entries[key] = image
+        self.size += size
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Return the hit and miss counters and the memory in use.
+
+        Returns:
+            Dict[str, Any]: The hits, misses, hit rate and bytes in use.
+        """
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "size": self.size,
+            "max_size": self.max_bytes,
+        }
+
+
+decoded_images = DecodedImageCache(config.DECODED_CACHE_MAX_BYTES)
@@ -0,0 +1,282 @@
+import asyncio
+import hashlib
+import json
+from typing import Any, Dict, Optional
+
+from core.config import config
+from core.utils.disk_cache import DiskLRUCache
+from core.utils.images import encoder_options
+from core.utils.storage import get_storage
+
+# Bump whenever the image engine changes its output, so stale derivatives stop matching.
+DERIVATIVE_VERSION = "2"
+
+DERIVATIVE_PREFIX = "derivatives/"
+
+
+def canonical_transformations(transformations: Dict[str, Any]) -> str:
+    """
+    Serialize a transformation spec so equivalent specs produce the same string.
+
+    Unset (None) and disabled (False) values are dropped, the output format is left
+    out because it is part of the key on its own, and keys are sorted.
+
+    Args:
+        transformations (dict): The transformation spec.
+
+    Returns:
+        str: The canonical JSON serialization.
+    """
+
+    def clean(value: Any) -> Any:
+        if isinstance(value, dict):
+            cleaned = {k: clean(v) for k, v in value.items() if v is not None and v is not False}
+            return {k: v for k, v in cleaned.items() if v != {}}
+        if isinstance(value, (list, tuple)):
+            return [clean(v) for v in value]
+        return value
+
+    spec = {k: v for k, v in transformations.items() if k != "format"}
+    return json.dumps(clean(spec), sort_keys=True, separators=(",", ":"))
+
+
+def derivative_digest(
+    source_name: str, source_etag: str, transformations: Dict[str, Any], format_image: str
+) -> str:
+    """
+    Hash the identity of a derivative: its source, transformation spec, format and
+    encoder settings, so changing e.g. WEBP_QUALITY does not serve stale derivatives.
+    Results of the adaptive quality search (`max_bytes`, `target_quality`) also
+    depend on the ENCODE_* search settings.
+
+    Args:
+        source_name (str): The object key of the source image.
+        source_etag (str): The ETag (or content hash) of the source image.
+        transformations (dict): The transformation spec.
+        format_image (str): The resolved output format.
+
+    Returns:
+        str: The hex SHA-256 digest.
+    """
+    parts = [
+        DERIVATIVE_VERSION,
+        source_name,
+        source_etag,
+        canonical_transformations(transformations),
+        format_image,
+        json.dumps(encoder_options(format_image), sort_keys=True),
+    ]
+    if (
+        transformations.get("max_bytes") is not None
+        or transformations.get("target_quality") is not None
+    ):
+        search = {
+            "min_quality": config.ENCODE_MIN_QUALITY,
+            "max_quality": config.ENCODE_MAX_QUALITY,
+            "max_attempts": config.ENCODE_MAX_ATTEMPTS,
+        }
+        parts.append(json.dumps(search, sort_keys=True))
+    identity = "\0".join(parts)
+    return hashlib.sha256(identity.encode()).hexdigest()
+
+
+def derivative_prefix(source_name: str) -> str:
+    """
+    Return the object key prefix shared by all derivatives of a source image, so they
+    can be listed and deleted with it.
+
+    Args:
+        source_name (str): The object key of the source image.
+
+    Returns:
+        str: The key prefix, ending in "/".
+    """
+    return f"{DERIVATIVE_PREFIX}{hashlib.sha256(source_name.encode()).hexdigest()[:32]}/"
+
+
+def derivative_key(
+    source_name: str, source_etag: str, transformations: Dict[str, Any], format_image: str
+) -> str:
+    """
+    Build the content-addressed object key of a derivative.
+
+    Args:
+        source_name (str): The object key of the source image.
+        source_etag (str): The ETag (or content hash) of the source image.
+        transformations (dict): The transformation spec.
+        format_image (str): The resolved output format.
+
+    Returns:
+        str: The derivative's object key.
+    """
+    digest = derivative_digest(source_name, source_etag, transformations, format_image)
+    return f"{derivative_prefix(source_name)}{digest}.{format_image}"
+
+
+class DiskDerivativeBackend:
+    """
+    Keeps derivatives on local disk, evicting least recently used entries by size.
+
+    The disk copy is separate from the stored object, so it can outlive it.
+    """
+
+    in_storage = False
+
+    def __init__(self, directory: str, max_bytes: int) -> None:
+        self.disk = DiskLRUCache(directory, max_bytes)
+
+    async def contains(self, key: str) -> bool:
+        return await asyncio.to_thread(self.disk.contains, key)
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return await asyncio.to_thread(self.disk.get, key)
+
+    async def put(self, key: str, data: bytes) -> None:
+        await asyncio.to_thread(self.disk.put, key, data)
+
+    async def discard(self, key: str) -> None:
+        await asyncio.to_thread(self.disk.discard, key)
+
+
+class StorageDerivativeBackend:
+    """
+    Uses the image storage itself (the S3 bucket or the local storage) as the cache.
+
+    Derivatives are uploaded under their content-addressed key by the caller, so a
+    lookup is a HEAD request and storing has nothing left to do.
+    """
+
+    in_storage = True
+
+    async def contains(self, key: str) -> bool:
+        return await get_storage().object_exists(key)
+
+    async def get(self, key: str) -> Optional[bytes]:
+        if not await self.contains(key):
+            return None
+        return await get_storage().get_image(key)
+
+    async def put(self, key: str, data: bytes) -> None:
+        return None
+
+    async def discard(self, key: str) -> None:
+        return None
+
+
+class DerivativeCache:
+    """
+    Looks up transformation results by derivative key and counts hits and misses.
+    """
+
+    def __init__(self, backend: Optional[Any]) -> None:
+        """
+        Initialize the cache.
+
+        Args:
+            backend: The storage backend, or None to disable caching.
+        """
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.backend is not None
+
+    @property
+    def in_storage(self) -> bool:
+        """Whether a cache hit means the derivative is also in the image storage."""
+        return self.enabled and self.backend.in_storage
+
+    async def contains(self, key: str) -> bool:
+        """
+        Check whether a derivative is cached, counting the lookup as a hit or miss.
+
+        Args:
+            key (str): The derivative key.
+
+        Returns:
+            bool: True on a cache hit.
+        """
+        if await self.backend.contains(key):
+            self.hits += 1
+            return True
+        self.misses += 1
+        return False
+
+    async def get(self, key: str) -> Optional[bytes]:
+        """
+        Read a cached derivative, counting the lookup as a hit or miss.
+
+        Args:
+            key (str): The derivative key.
+
+        Returns:
+            Optional[bytes]: The derivative, or None on a miss.
+        """
+        data = await self.backend.get(key)
+        if data is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return data
+
+    async def put(self, key: str, data: bytes) -> None:
+        """
+        Store a derivative.
+
+        Args:
+            key (str): The derivative key.
+            data (bytes): The encoded derivative.
+        """
+        await self.backend.put(key, data)
+
+    async def discard(self, key: str) -> None:
+        """
+        Drop a derivative from the cache; the stored object is left to the caller.
+
+        Args:
+            key (str): The derivative key.
+        """
+        await self.backend.discard(key)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Return the hit and miss counters.
+
+        Returns:
+            Dict[str, Any]: The hits, misses and hit rate.
+        """
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+def create_derivative_cache() -> DerivativeCache:
+    """
+    Create the derivative cache configured by DERIVATIVE_CACHE_BACKEND.
+
+    Returns:
+        DerivativeCache: The configured cache.
+
+    Raises:
+        ValueError: If the backend name is unknown.
+    """
+    backend_name = config.DERIVATIVE_CACHE_BACKEND.lower()
+    if backend_name == "none":
+        return DerivativeCache(None)
+    if backend_name in ("s3", "storage"):
+        return DerivativeCache(StorageDerivativeBackend())
+    if backend_name == "disk":
+        return DerivativeCache(
+            DiskDerivativeBackend(
+                config.DERIVATIVE_CACHE_DIR, config.DERIVATIVE_CACHE_MAX_BYTES
+            )
+        )
+    raise ValueError(f"Unknown derivative cache backend: {backend_name}")
+
+
+derivative_cache = create_derivative_cache()
@@ -0,0 +1,217 @@
+import hashlib
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional
+
+
+class DiskLRUCache:
+    """
+    A size-bounded cache of byte blobs stored as files in one directory.
+
+    Entries are evicted least recently used first once the total size exceeds the
+    limit. Writes go to a temporary file that is renamed into place, so readers
+    never see a partial entry. The index is rebuilt from the directory on start-up,
+    ordered by access time. Entries that are pinned (in use by a reader) are never
+    evicted. The index is guarded by a lock, so the cache can be used from the event
+    loop and from worker threads at once.
+    """
+
+    def __init__(self, directory: str, max_bytes: int) -> None:
+        """
+        Initialize the cache.
+
+        Args:
+            directory (str): The directory holding the cached files.
+            max_bytes (int): The maximum total size of all entries.
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries: OrderedDict[str, int] = OrderedDict()
+        self._pins: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+        os.makedirs(directory, exist_ok=True)
+        files = []
+        for entry in os.scandir(directory):
+            if entry.is_file() and not entry.name.startswith("."):
+                stat = entry.stat()
+                files.append((stat.st_atime, entry.name, stat.st_size))
+        for _, name, size in sorted(files):
+            self._entries[name] = size
+            self.size += size
+        self._evict()
+
+    @staticmethod
+    def _file_name(key: str) -> str:
+        return hashlib.sha256(key.encode()).hexdigest()
+
+    def path(self, key: str) -> Optional[str]:
+        """
+        Return the path of a cached entry and mark it as recently used.
+
+        Args:
+            key (str): The cache key.
+
+        Returns:
+            Optional[str]: The file path, or None if the key is not cached.
+        """
+        name = self._file_name(key)
+        file_path = os.path.join(self.directory, name)
+        with self._lock:
+            if name not in self._entries:
+                return None
+            if not os.path.exists(file_path):
+                self.size -= self._entries.pop(name)
+                return None
+            self._entries.move_to_end(name)
+        return file_path
+
+    def contains(self, key: str) -> bool:
+        """
+        Check whether a key is cached, marking it as recently used.
+
+        Args:
+            key (str): The cache key.
+
+        Returns:
+            bool: True if the key is cached.
+        """
+        return self.path(key) is not None
+
+    def get(self, key: str) -> Optional[bytes]:
+        """
+        Read a cached entry.
+
+        Args:
+            key (str): The cache key.
+
+        Returns:
+            Optional[bytes]: The cached data, or None if the key is not cached.
+        """
+        file_path = self.path(key)
+        if file_path is None:
+            return None
+        try:
+            with open(file_path, "rb") as file:
+                return file.read()
+        except FileNotFoundError:
+            # Evicted or discarded since the lookup
+            return None
+
+    def put(self, key: str, data: bytes) -> None:
+        """
+        Store an entry, evicting older entries if the cache grows past its limit.
+
+        Args:
+            key (str): The cache key.
+            data (bytes): The data to store.
+        """
+        if len(data) > self.max_bytes:
+            return
+
+        tmp_path = self.reserve()
+        try:
+            with open(tmp_path, "wb") as file:
+                file.write(data)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        self.commit(key, tmp_path)
+
+    def reserve(self) -> str:
+        """
+        Create an empty temporary file in the cache directory for a new entry.
+
+        Fill it and then pass it to `commit`, or delete it.
+
+        Returns:
+            str: The path of the temporary file.
+        """
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix=".")
+        os.close(fd)
+        return tmp_path
+
+    def commit(self, key: str, tmp_path: str) -> Optional[str]:
+        """
+        Move a filled temporary file from `reserve` into the cache as an entry.
+
+        Args:
+            key (str): The cache key.
+            tmp_path (str): The temporary file.
+
+        Returns:
+            Optional[str]: The path of the entry, or None if the file is larger than
+                the whole cache; the temporary file is then left in place.
+        """
+        size = os.path.getsize(tmp_path)
+        if size > self.max_bytes:
+            return None
+
+        name = self._file_name(key)
+        file_path = os.path.join(self.directory, name)
+        with self._lock:
+            os.replace(tmp_path, file_path)
+            self.size -= self._entries.pop(name, 0)
+            self._entries[name] = size
+            self.size += size
+            self._evict()
+        return file_path
+
+    def discard(self, key: str) -> None:
+        """
+        Remove an entry, if it is cached.
+
+        Args:
+            key (str): The cache key.
+        """
+        name = self._file_name(key)
+        with self._lock:
+            if name not in self._entries:
+                return
+            self.size -= self._entries.pop(name)
+            try:
+                os.unlink(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                pass
+
+    def pin(self, key: str) -> None:
+        """
+        Protect an entry from eviction until a matching `unpin`.
+
+        Args:
+            key (str): The cache key.
+        """
+        name = self._file_name(key)
+        with self._lock:
+            self._pins[name] = self._pins.get(name, 0) + 1
+
+    def unpin(self, key: str) -> None:
+        """
+        Release a `pin`.
+
+        Args:
+            key (str): The cache key.
+        """
+        name = self._file_name(key)
+        with self._lock:
+            if self._pins.get(name, 0) <= 1:
+                self._pins.pop(name, None)
+            else:
+                self._pins[name] -= 1
+            self._evict()
+
+    def _evict(self) -> None:
+        # Called with the lock held
+        for name in list(self._entries):
+            if self.size <= self.max_bytes:
+                break
+            if name in self._pins:
+                continue
+            self.size -= self._entries.pop(name)
+            try:
+                os.unlink(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                pass
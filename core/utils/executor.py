@@ -0,0 +1,183 @@
+import asyncio
+import multiprocessing
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, List, Optional, TypeVar
+
+from core.config import config
+from core.exceptions import GatewayTimeoutException, ServiceUnavailableException
+from core.utils.metrics import collect_stages, observe_stages, registry
+from core.utils.profiling import (install_pool_sampler, pool_registry,
+                                  registered_workers)
+from core.utils.tracing import add_stage_spans, span
+
+T = TypeVar("T")
+
+
+class ImageExecutor:
+    """
+    Runs CPU-bound image work outside the event loop.
+
+    Jobs go to a process pool so a large transform cannot stall other requests on
+    the same worker. The number of jobs running or waiting is bounded, every job has
+    a timeout, and pool processes are replaced after a fixed number of jobs to
+    contain memory growth in Pillow.
+    """
+
+    def __init__(
+        self,
+        name: str = "image",
+        job: str = "transform",
+        workers: int = config.IMAGE_WORKERS,
+        queue_depth: int = config.IMAGE_QUEUE_DEPTH,
+        timeout: float = config.IMAGE_JOB_TIMEOUT,
+        max_jobs_per_worker: int = config.IMAGE_WORKER_MAX_JOBS,
+    ) -> None:
+        """
+        Initialize the executor. The pool itself is created on first use.
+
+        Args:
+            name (str): Names the pool, e.g. in CPU profiles.
+            job (str): The `job` label of the stage timings of its jobs.
+            workers (int): Number of worker processes. 0 runs jobs on a thread pool
+                in the current process instead.
+            queue_depth (int): Maximum number of jobs running or waiting at once.
+            timeout (float): Seconds to wait for a single job.
+            max_jobs_per_worker (int): Jobs a worker process runs before it is replaced.
+        """
+        self.name = name
+        self.job = job
+        self.workers = workers
+        self.queue_depth = queue_depth
+        self.timeout = timeout
+        self.max_jobs_per_worker = max_jobs_per_worker
+        self.pending = 0
+        self._pool: Optional[Executor] = None
+        self._registry: Optional[str] = None
+
+    def _get_pool(self) -> Executor:
+        if self._pool is None:
+            if self.workers <= 0:
+                self._pool = ThreadPoolExecutor(thread_name_prefix=self.name)
+            else:
+                # max_tasks_per_child cannot be combined with "fork". The fork server
+                # imports the image module once, so replacement workers start quickly.
+                if "forkserver" in multiprocessing.get_all_start_methods():
+                    context = multiprocessing.get_context("forkserver")
+                    context.set_forkserver_preload(["core.utils.images"])
+                else:
+                    context = multiprocessing.get_context("spawn")
+                self._registry = pool_registry(config.PROFILE_DIR, self.name)
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=context,
+                    max_tasks_per_child=self.max_jobs_per_worker,
+                    initializer=install_pool_sampler,
+                    initargs=(config.PROFILE_DIR, self.name, self._registry),
+                )
+        return self._pool
+
+    async def run(self, func: Callable[..., T], *args: Any) -> T:
+        """
+        Run a function in the pool and wait for its result.
+
+        Args:
+            func (Callable[..., T]): A picklable, module-level function.
+            *args (Any): Positional arguments for the function.
+
+        Returns:
+            T: The function's return value.
+
+        Raises:
+            ServiceUnavailableException: If the queue is full or the pool broke.
+            GatewayTimeoutException: If the job does not finish in time.
+        """
+        if self.pending >= self.queue_depth:
+            raise ServiceUnavailableException("Image processing queue is full.")
+
+        loop = asyncio.get_running_loop()
+        self.pending += 1
+        try:
+            # Stage timings recorded inside the job come back with its result
+            job = self._get_pool().submit(collect_stages, func, *args)
+        except BaseException as e:
+            self.pending -= 1
+            if isinstance(e, BrokenProcessPool):
+                self.shutdown()
+                raise ServiceUnavailableException("Image processing worker crashed.")
+            raise
+        # The slot is held until the job itself ends, not until the caller stops
+        # waiting, so jobs abandoned after a timeout still count against the queue
+        job.add_done_callback(lambda _: self._release(loop))
+
+        try:
+            with span("image.job", "image", function=func.__name__):
+                result, stages = await asyncio.wait_for(
+                    asyncio.wrap_future(job), timeout=self.timeout
+                )
+                observe_stages(stages, self.job)
+                add_stage_spans(stages, "image")
+            return result
+        except asyncio.TimeoutError:
+            # A process cannot be interrupted mid-job; the worker finishes it and
+            # the result is discarded.
+            raise GatewayTimeoutException("Image processing timed out.")
+        except BrokenProcessPool:
+            self.shutdown()
+            raise ServiceUnavailableException("Image processing worker crashed.")
+
+    def worker_pids(self) -> List[int]:
+        """
+        List the pool's worker processes, e.g. to profile them.
+
+        Only workers that are ready to be profiled are listed, see
+        `install_pool_sampler`.
+
+        Returns:
+            List[int]: The process IDs; empty for a thread pool or before first use.
+        """
+        if self._registry is None:
+            return []
+        return registered_workers(self._registry)
+
+    def _release(self, loop: asyncio.AbstractEventLoop) -> None:
+        # Runs in the pool's thread when a job ends
+        def release() -> None:
+            self.pending -= 1
+
+        try:
+            loop.call_soon_threadsafe(release)
+        except RuntimeError:
+            # The loop is closed, nothing waits on the count any more
+            pass
+
+    def shutdown(self) -> None:
+        """
+        Shut down the pool without waiting for running jobs.
+        """
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+            self._registry = None
+
+
+image_executor = ImageExecutor()
+
+# Upload variants are rendered in the background; a separate pool keeps upload bursts
+# from queueing ahead of interactive transforms or making them fail as busy.
+variant_executor = ImageExecutor(
+    name="variant",
+    job="variants",
+    workers=config.VARIANT_WORKERS, queue_depth=config.VARIANT_QUEUE_DEPTH
+)
+
+registry.gauge(
+    "image_executor_pending",
+    "Image jobs running or waiting in the executor.",
+    callback=lambda: image_executor.pending,
+)
+registry.gauge(
+    "variant_executor_pending",
+    "Upload variant jobs running or waiting in the variant executor.",
+    callback=lambda: variant_executor.pending,
+)
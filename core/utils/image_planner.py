@@ -0,0 +1,238 @@
+import math
+from typing import Any, Dict, List, Optional, Tuple
+
+# A single pipeline step: the operation name and its keyword arguments.
+Operation = Tuple[str, Dict[str, Any]]
+Size = Tuple[int, int]
+
+# Operations whose output does not depend on pixel values, so a grayscale conversion
+# can move across them without changing the result (beyond rounding).
+GEOMETRIC_OPERATIONS = {"resize", "resize_region", "crop", "rotate", "transpose", "watermark"}
+
+RIGHT_ANGLE_TRANSPOSES = {90: "ROTATE_90", 180: "ROTATE_180", 270: "ROTATE_270"}
+
+
+def resolve_resize(size: Size, width: Optional[int], height: Optional[int]) -> Size:
+    """
+    Fill in a missing resize dimension so that the aspect ratio is preserved.
+
+    Args:
+        size (Size): The image size before the resize.
+        width (Optional[int]): The requested width, if any.
+        height (Optional[int]): The requested height, if any.
+
+    Returns:
+        Size: The target size; the current size if neither dimension is given.
+    """
+    if width is None and height is None:
+        return size
+    if width is None:
+        width = max(1, round(size[0] * height / size[1]))
+    if height is None:
+        height = max(1, round(size[1] * width / size[0]))
+    return width, height
+
+
+def output_size(operation: Operation, size: Size) -> Size:
+    """
+    Estimate the image size after an operation.
+
+    Args:
+        operation (Operation): The operation.
+        size (Size): The image size before the operation.
+
+    Returns:
+        Size: The image size after the operation.
+    """
+    name, params = operation
+    width, height = size
+    if name == "resize":
+        return resolve_resize(size, params["width"], params["height"])
+    if name in ("resize_region", "crop"):
+        return params["width"], params["height"]
+    if name == "transpose":
+        if params["method"] in ("ROTATE_90", "ROTATE_270"):
+            return height, width
+        return width, height
+    if name == "rotate":
+        angle = math.radians(params["angle"])
+        cos, sin = abs(math.cos(angle)), abs(math.sin(angle))
+        return round(width * cos + height * sin), round(width * sin + height * cos)
+    return width, height
+
+
+def is_grayscale_only(operation: Operation) -> bool:
+    """
+    Check whether an operation is a plain grayscale conversion.
+
+    Grayscale takes precedence over sepia, so a sepia flag alongside it is irrelevant.
+    Any other colour filter may carry offsets and must stay where it is.
+
+    Args:
+        operation (Operation): The operation.
+
+    Returns:
+        bool: True if the operation only converts to grayscale.
+    """
+    name, params = operation
+    return (
+        name == "filter"
+        and bool(params.get("grayscale"))
+        and set(params) <= {"grayscale", "sepia"}
+    )
+
+
+def estimate_cost(operations: List[Operation], size: Size, bands: int) -> int:
+    """
+    Estimate the cost of running operations as the number of band samples they write.
+
+    Args:
+        operations (List[Operation]): The operations.
+        size (Size): The source size.
+        bands (int): The number of colour bands of the source.
+
+    Returns:
+        int: The estimated cost.
+    """
+    cost = 0
+    for operation in operations:
+        size = output_size(operation, size)
+        cost += size[0] * size[1] * bands
+        if is_grayscale_only(operation):
+            bands = 1
+    return cost
+
+
+def _drop_identities(operations: List[Operation], size: Size) -> List[Operation]:
+    planned = []
+    for operation in operations:
+        name, params = operation
+        if name == "resize":
+            width, height = resolve_resize(size, params["width"], params["height"])
+            if (width, height) == size:
+                continue
+            operation = ("resize", {"width": width, "height": height})
+        if name == "rotate":
+            angle = params["angle"] % 360
+            if angle == 0:
+                continue
+            if angle in RIGHT_ANGLE_TRANSPOSES:
+                operation = ("transpose", {"method": RIGHT_ANGLE_TRANSPOSES[angle]})
+        planned.append(operation)
+        size = output_size(operation, size)
+    return planned
+
+
+def _fuse_resize_crop(operations: List[Operation]) -> List[Operation]:
+    planned: List[Operation] = []
+    for operation in operations:
+        name, params = operation
+        previous = planned[-1] if planned else None
+        if name == "crop" and previous is not None and previous[0] == "resize":
+            full_width, full_height = previous[1]["width"], previous[1]["height"]
+            left, top = params["x"], params["y"]
+            right, bottom = left + params["width"], top + params["height"]
+            if 0 <= left < right <= full_width and 0 <= top < bottom <= full_height:
+                # Resampling only the cropped region of the source gives the same
+                # pixels as resizing everything and then cropping.
+                planned[-1] = (
+                    "resize_region",
+                    {
+                        "width": params["width"],
+                        "height": params["height"],
+                        "box": (
+                            left / full_width,
+                            top / full_height,
+                            right / full_width,
+                            bottom / full_height,
+                        ),
+                        "full_size": (full_width, full_height),
+                    },
+                )
+                continue
+        planned.append(operation)
+    return planned
+
+
+def _place_grayscale(operations: List[Operation], size: Size, bands: int) -> List[Operation]:
+    if bands not in (1, 3):
+        # Pillow resamples RGBA with premultiplied alpha but LA without, so with an
+        # alpha band the order changes the result
+        return operations
+    for index, operation in enumerate(operations):
+        if not is_grayscale_only(operation):
+            continue
+
+        # The conversion can move across geometric operations in either direction.
+        start = index
+        while start > 0 and operations[start - 1][0] in GEOMETRIC_OPERATIONS:
+            start -= 1
+        end = index
+        while end < len(operations) - 1 and operations[end + 1][0] in GEOMETRIC_OPERATIONS:
+            end += 1
+
+        others = operations[:index] + operations[index + 1:]
+        best, best_cost = operations, estimate_cost(operations, size, bands)
+        for position in range(start, end + 1):
+            candidate = others[:position] + [operation] + others[position:]
+            cost = estimate_cost(candidate, size, bands)
+            if cost < best_cost:
+                best, best_cost = candidate, cost
+        return best
+    return operations
+
+
+def plan_operations(
+    operations: List[Operation], source_size: Size, source_bands: int = 3
+) -> List[Operation]:
+    """
+    Rewrite operations into a cheaper plan with the same output.
+
+    - Resizes get both dimensions filled in (keeping the aspect ratio).
+    - Resizes to the current size and rotations by multiples of 360 degrees are dropped.
+    - Rotations by 90, 180 or 270 degrees become lossless transposes.
+    - A resize followed by a crop becomes a single resample of the cropped region.
+    - A grayscale conversion moves to where it is cheapest, so that as many operations
+      as possible work on one band instead of three. Sources with an alpha band keep
+      the requested order.
+
+    Resampling operations may round differently by a level or so when reordered; the
+    result is otherwise identical.
+
+    Args:
+        operations (List[Operation]): The operations in requested order.
+        source_size (Size): The size of the decoded source.
+        source_bands (int): The number of bands of the decoded source.
+
+    Returns:
+        List[Operation]: The planned operations.
+    """
+    planned = _drop_identities(operations, source_size)
+    planned = _fuse_resize_crop(planned)
+    return _place_grayscale(planned, source_size, source_bands)
+
+
+def describe_plan(
+    operations: List[Operation], source_size: Optional[Size] = None
+) -> List[Dict[str, Any]]:
+    """
+    Describe a plan in a JSON-friendly form for debugging.
+
+    Args:
+        operations (List[Operation]): The operations.
+        source_size (Optional[Size]): The source size; if given, each step also
+            reports its estimated output size.
+
+    Returns:
+        List[dict]: One entry per operation with its name and parameters.
+    """
+    steps = []
+    size = source_size
+    for operation in operations:
+        name, params = operation
+        step = {"operation": name, **params}
+        if size is not None:
+            size = output_size(operation, size)
+            step["output_size"] = size
+        steps.append(step)
+    return steps
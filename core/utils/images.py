@@ -1,21 +1,317 @@
-import time
-from typing import Tuple, Dict, Any
-from PIL import Image, ImageDraw, ImageFont
 import io
-import numpy as np
+import os
+import time
+from functools import partial
+from typing import Any, BinaryIO, Callable, Dict, List, Optional, Set, Tuple, Union
+
+from PIL import Image, ImageColor, ImageDraw, ImageFont
+
+from core.config import config
+from core.utils import color
+from core.utils.decoded_cache import decoded_images
+from core.utils.image_planner import Operation, plan_operations, resolve_resize
+from core.utils.metrics import time_stage
+from core.utils.quality import comparison_size, luma_view, structural_similarity
+from core.utils.tiling import apply_in_strips
+
+# Pillow only knows "JPEG", so file extensions are mapped to encoder names.
+PIL_FORMATS = {"jpg": "JPEG", "jpeg": "JPEG", "png": "PNG", "webp": "WEBP", "avif": "AVIF"}
+
+# AVIF (and, in unusual builds, WebP) depends on how Pillow was compiled.
+Image.init()
+VALID_FORMATS = {name for name, pil_format in PIL_FORMATS.items() if pil_format in Image.SAVE}
+
+# Lossy formats whose size can be traded against fidelity with a quality setting.
+QUALITY_FORMATS = {"JPEG", "WEBP", "AVIF"}
+
+# A result within this fraction under the byte budget ends the quality search early.
+BUDGET_TOLERANCE = 0.05
+
+# A result within this much above the target SSIM ends the quality search early.
+SSIM_TOLERANCE = 0.005
+
+# Formats `auto` may pick when the client accepts them, smallest output first.
+AUTO_FORMATS = ("avif", "webp")
+
+# What `auto` falls back to for opaque sources when none of AUTO_FORMATS is accepted.
+AUTO_OPAQUE_FORMAT = "jpeg"
+
+# Large scans are expected; keep Pillow's decompression bomb check above them.
+Image.MAX_IMAGE_PIXELS = config.IMAGE_MAX_PIXELS
+
+# An encoded image: its bytes, a path to a file holding it, or an open binary file.
+ImageSource = Union[bytes, str, BinaryIO]
 
+# Downscales keep at least this much headroom over the target size before the final
+# high-quality resample, the same margin Pillow uses for `Image.thumbnail`.
+REDUCING_GAP = 2
 
-def decode_image(image_bytes: bytes) -> Image:
+
+def decode_image(source: ImageSource, draft_size: Optional[Tuple[int, int]] = None) -> Image:
     """
-    Decode an image from bytes.
+    Open an image for decoding.
+
+    Only the header is parsed here; pixels are decoded when the image is first used.
+    Paths and file objects are read directly, so the encoded image is never copied
+    into memory as a whole.
 
     Args:
-        image_bytes (bytes): The image in bytes.
+        source (ImageSource): The image as bytes, a file path or a binary file object.
+        draft_size (Optional[Tuple[int, int]]): The size the image will be downscaled to.
+            JPEG sources are then decoded at the smallest DCT scale (1/2, 1/4 or 1/8)
+            that still covers twice this size, instead of at full resolution.
 
     Returns:
         Image: The decoded image as a Pillow Image object.
     """
-    return Image.open(io.BytesIO(image_bytes))
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        source = io.BytesIO(source)
+    image = Image.open(source)
+    if draft_size is not None:
+        draft_image(image, draft_size)
+    return image
+
+
+def draft_image(image: Image, draft_size: Tuple[int, int]) -> Image:
+    """
+    Configure a not yet loaded JPEG image to decode at a reduced scale.
+
+    Args:
+        image (Image): The opened, not yet loaded image.
+        draft_size (Tuple[int, int]): The size the image will be downscaled to. JPEG
+            sources are decoded at the smallest DCT scale (1/2, 1/4 or 1/8) that still
+            covers twice this size. Other formats are left as they are.
+
+    Returns:
+        Image: The same image.
+    """
+    if image.format == "JPEG":
+        width, height = draft_size
+        image.draft(None, (width * REDUCING_GAP, height * REDUCING_GAP))
+    return image
+
+
+def encode_image(image: Image, format_image: str) -> bytes:
+    """
+    Encode a Pillow image into bytes.
+
+    Args:
+        image (Image): The image to encode.
+        format_image (str): The output format (e.g., "jpg", "jpeg", "png").
+
+    Returns:
+        bytes: The encoded image in bytes.
+    """
+    pil_format = PIL_FORMATS.get(format_image.lower(), format_image.upper())
+    if pil_format == "JPEG" and image.mode not in ("RGB", "L", "CMYK"):
+        image = image.convert("RGB")
+
+    img_byte_arr = io.BytesIO()
+    image.save(img_byte_arr, format=pil_format, **encoder_options(format_image))
+    return img_byte_arr.getvalue()
+
+
+def encode_adaptive(
+    image: Image,
+    format_image: str,
+    max_bytes: Optional[int] = None,
+    target_quality: Optional[float] = None,
+) -> bytes:
+    """
+    Encode an image, choosing the quality setting to meet a byte budget and/or a
+    perceptual target.
+
+    The quality is found by a binary search over ENCODE_MIN_QUALITY to
+    ENCODE_MAX_QUALITY that encodes the same image at most ENCODE_MAX_ATTEMPTS times
+    and stops as soon as a result is close enough to the budget or target. Fidelity
+    is measured as SSIM against the image itself on a downscaled luma copy.
+
+    - With only `max_bytes`, the configured quality is tried first and kept if it
+      fits; otherwise the highest quality that fits is used.
+    - With `target_quality`, the lowest quality whose SSIM reaches it is used, as
+      long as it fits the budget; the budget wins when both cannot be met.
+    - If nothing fits the budget, the smallest result is returned.
+
+    Lossless formats have no quality setting and are encoded once as usual.
+
+    Args:
+        image (Image): The image to encode.
+        format_image (str): The output format.
+        max_bytes (Optional[int]): The maximum size of the encoded image.
+        target_quality (Optional[float]): The minimum SSIM, between 0 and 1.
+
+    Returns:
+        bytes: The encoded image in bytes.
+    """
+    pil_format = PIL_FORMATS.get(format_image.lower(), format_image.upper())
+    if pil_format not in QUALITY_FORMATS or (max_bytes is None and target_quality is None):
+        return encode_image(image, format_image)
+    if pil_format == "JPEG" and image.mode not in ("RGB", "L", "CMYK"):
+        image = image.convert("RGB")
+
+    options = encoder_options(format_image)
+    size = comparison_size(image.size)
+    reference = luma_view(image, size) if target_quality is not None else None
+    attempts: Dict[int, Tuple[bytes, Optional[float]]] = {}
+
+    def attempt(quality: int) -> Tuple[bytes, Optional[float]]:
+        img_byte_arr = io.BytesIO()
+        image.save(img_byte_arr, format=pil_format, **{**options, "quality": quality})
+        data = img_byte_arr.getvalue()
+        score = None
+        if reference is not None:
+            encoded = decode_image(data)
+            if encoded.format == "JPEG":
+                # Only the luma of a downscaled copy is compared, so decode just that
+                encoded.draft("L", size)
+            score = structural_similarity(reference, luma_view(encoded, size))
+        attempts[quality] = (data, score)
+        return data, score
+
+    def fits(data: bytes) -> bool:
+        return max_bytes is None or len(data) <= max_bytes
+
+    def meets(score: Optional[float]) -> bool:
+        return target_quality is None or score >= target_quality
+
+    low, high = config.ENCODE_MIN_QUALITY, config.ENCODE_MAX_QUALITY
+    if target_quality is None:
+        data, _ = attempt(options["quality"])
+        if fits(data):
+            return data
+        high = options["quality"] - 1
+
+    while low <= high and len(attempts) < config.ENCODE_MAX_ATTEMPTS:
+        quality = (low + high) // 2
+        if len(attempts) == config.ENCODE_MAX_ATTEMPTS - 1 and not any(
+            fits(data) for data, _ in attempts.values()
+        ):
+            # Nothing fit so far; spend the last attempt on the smallest setting
+            quality = low
+        data, score = attempt(quality)
+        if fits(data) and meets(score):
+            if target_quality is not None:
+                if score < target_quality + SSIM_TOLERANCE:
+                    break
+            elif len(data) >= max_bytes * (1 - BUDGET_TOLERANCE):
+                break
+        if (target_quality is not None and meets(score)) or not fits(data):
+            high = quality - 1
+        else:
+            low = quality + 1
+
+    fitting = sorted(quality for quality, (data, _) in attempts.items() if fits(data))
+    if not fitting:
+        if (
+            config.ENCODE_MIN_QUALITY not in attempts
+            and len(attempts) < config.ENCODE_MAX_ATTEMPTS
+        ):
+            attempt(config.ENCODE_MIN_QUALITY)
+        return min((data for data, _ in attempts.values()), key=len)
+    if target_quality is not None:
+        meeting = [quality for quality in fitting if meets(attempts[quality][1])]
+        if meeting:
+            return attempts[meeting[0]][0]
+    return attempts[fitting[-1]][0]
+
+
+def encoder_options(format_image: str) -> Dict[str, Any]:
+    """
+    Return the configured encoder settings for an output format.
+
+    Args:
+        format_image (str): The output format.
+
+    Returns:
+        Dict[str, Any]: Keyword arguments for `Image.save`.
+    """
+    pil_format = PIL_FORMATS.get(format_image.lower(), format_image.upper())
+    if pil_format == "JPEG":
+        return {"quality": config.JPEG_QUALITY}
+    if pil_format == "PNG":
+        return {"compress_level": config.PNG_COMPRESS_LEVEL}
+    if pil_format == "WEBP":
+        return {"quality": config.WEBP_QUALITY, "method": config.WEBP_METHOD}
+    if pil_format == "AVIF":
+        return {"quality": config.AVIF_QUALITY, "speed": config.AVIF_SPEED}
+    return {}
+
+
+def resolve_format(format_image: str | None, original_format: str) -> str:
+    """
+    Resolve the output format of a transformation.
+
+    Args:
+        format_image (str | None): The requested format, if any.
+        original_format (str): The original format of the image.
+
+    Returns:
+        str: The lower-cased output format.
+
+    Raises:
+        ValueError: If the format is unsupported.
+    """
+    format_image = (format_image or original_format).lower()
+    if format_image == "string":
+        format_image = original_format.lower()
+    if format_image not in VALID_FORMATS:
+        raise ValueError(f"Unsupported format: {format_image}")
+    return format_image
+
+
+def _accepted_media_types(accept: Optional[str]) -> Set[str]:
+    accepted = set()
+    for media_range in (accept or "").split(","):
+        media_type, *params = [part.strip() for part in media_range.split(";")]
+        quality = 1.0
+        for param in params:
+            if param.startswith("q="):
+                try:
+                    quality = float(param[2:])
+                except ValueError:
+                    quality = 0.0
+        if quality > 0:
+            accepted.add(media_type.lower())
+    return accepted
+
+
+def negotiate_format(accept: Optional[str]) -> Optional[str]:
+    """
+    Pick the output format for `auto` from an HTTP Accept header.
+
+    The smallest supported format the client explicitly accepts wins; wildcards
+    such as `image/*` do not count, since browsers send them regardless.
+
+    Args:
+        accept (Optional[str]): The Accept header.
+
+    Returns:
+        Optional[str]: The format, or None if the client accepts none of AUTO_FORMATS.
+    """
+    accepted = _accepted_media_types(accept)
+    for format_image in AUTO_FORMATS:
+        if format_image in VALID_FORMATS and f"image/{format_image}" in accepted:
+            return format_image
+    return None
+
+
+def negotiate_opaque_format(accept: Optional[str]) -> Optional[str]:
+    """
+    Pick the format `auto` falls back to for opaque sources, when `negotiate_format`
+    finds none.
+
+    Every browser decodes JPEG, so wildcards count here.
+
+    Args:
+        accept (Optional[str]): The Accept header.
+
+    Returns:
+        Optional[str]: AUTO_OPAQUE_FORMAT if the client accepts it, else None.
+    """
+    accepted = _accepted_media_types(accept)
+    if {f"image/{AUTO_OPAQUE_FORMAT}", "image/*", "*/*"} & accepted:
+        return AUTO_OPAQUE_FORMAT
+    return None
 
 
 def create_file_name(file_name: str) -> str:
@@ -31,6 +327,202 @@ def create_file_name(file_name: str) -> str:
     return str(int(time.time())) + file_name.replace(" ", "")
 
 
+def resize(image: Image, width: Optional[int], height: Optional[int]) -> Image:
+    """
+    Resize a decoded image to the specified dimensions.
+
+    Large downscales first shrink the image by an integer factor with `Image.reduce`,
+    which is a cheap box average, and then finish with a Lanczos resample.
+
+    Args:
+        image (Image): The decoded image.
+        width (Optional[int]): The desired width of the image. If omitted, it follows
+            from the height and the aspect ratio.
+        height (Optional[int]): The desired height of the image. If omitted, it follows
+            from the width and the aspect ratio.
+
+    Returns:
+        Image: The resized image.
+
+    Raises:
+        ValueError: If a dimension is not positive.
+    """
+    width, height = resolve_resize(image.size, width, height)
+    if width <= 0 or height <= 0:
+        raise ValueError("Resize dimensions must be positive")
+    factor = min(image.width // (width * REDUCING_GAP), image.height // (height * REDUCING_GAP))
+    if factor > 1 and image.mode not in ("1", "P"):
+        image = image.reduce(factor)
+    return image.resize((width, height), Image.Resampling.LANCZOS)
+
+
+def resize_region(
+    image: Image,
+    width: int,
+    height: int,
+    box: Tuple[float, float, float, float],
+    full_size: Tuple[int, int],
+) -> Image:
+    """
+    Resize only a region of a decoded image, equivalent to a resize followed by a crop.
+
+    Args:
+        image (Image): The decoded image.
+        width (int): The width of the result.
+        height (int): The height of the result.
+        box (Tuple[float, float, float, float]): The region as fractions of the image
+            size (left, upper, right, lower), so it holds for draft-decoded images too.
+        full_size (Tuple[int, int]): The size the whole image would have been resized to.
+
+    Returns:
+        Image: The resized region.
+    """
+    left, top, right, bottom = box
+    source_box = (
+        left * image.width,
+        top * image.height,
+        right * image.width,
+        bottom * image.height,
+    )
+    return image.resize(
+        (width, height),
+        Image.Resampling.LANCZOS,
+        box=source_box,
+        reducing_gap=REDUCING_GAP,
+    )
+
+
+def crop(image: Image, x: int, y: int, width: int, height: int) -> Image:
+    """
+    Crop a decoded image to the specified rectangle.
+
+    Args:
+        image (Image): The decoded image.
+        x (int): The x-coordinate of the top-left corner of the crop area.
+        y (int): The y-coordinate of the top-left corner of the crop area.
+        width (int): The width of the crop area.
+        height (int): The height of the crop area.
+
+    Returns:
+        Image: The cropped image.
+    """
+    return image.crop((x, y, x + width, y + height))
+
+
+def rotate(image: Image, angle: int) -> Image:
+    """
+    Rotate a decoded image by the specified angle around its center.
+
+    Args:
+        image (Image): The decoded image.
+        angle (int): The angle in degrees to rotate the image.
+
+    Returns:
+        Image: The rotated image.
+    """
+    return image.rotate(angle, expand=True)
+
+
+def transpose(image: Image, method: str) -> Image:
+    """
+    Flip or rotate a decoded image by a multiple of 90 degrees without resampling.
+
+    Args:
+        image (Image): The decoded image.
+        method (str): The name of a `Image.Transpose` member, e.g. "ROTATE_90".
+
+    Returns:
+        Image: The transposed image.
+    """
+    return image.transpose(Image.Transpose[method])
+
+
+def watermark(
+    image: Image,
+    watermark_text: str,
+    position: Tuple[int, int] = (10, 10),
+    font_scale: float = 1.0,
+    color: Tuple[int, int, int] = (255, 255, 255),
+    thickness: int = 2,
+) -> Image:
+    """
+    Draw a text watermark onto a decoded image in place.
+
+    Args:
+        image (Image): The decoded image.
+        watermark_text (str): The text to use as the watermark.
+        position (Tuple[int, int]): The position of the watermark text.
+        font_scale (float): The font scale of the watermark text.
+        color (Tuple[int, int, int]): The color of the watermark text in RGB format.
+        thickness (int): The thickness of the watermark text.
+
+    Returns:
+        Image: The watermarked image.
+    """
+    fill = color
+    if image.mode in ("L", "LA"):
+        fill = ImageColor.getcolor("rgb({}, {}, {})".format(*color), image.mode)
+    draw = ImageDraw.Draw(image)
+    font = ImageFont.load_default()
+    draw.text(position, watermark_text, font=font, fill=fill)
+    return image
+
+
+def filter_image(
+    image: Image,
+    grayscale: bool = False,
+    sepia: bool = False,
+    brightness: Optional[float] = None,
+    contrast: Optional[float] = None,
+    saturation: Optional[float] = None,
+    hue_rotate: Optional[float] = None,
+    channel_mix: Optional[List[List[float]]] = None,
+) -> Image:
+    """
+    Apply colour filters to a decoded image.
+
+    Every filter is a colour matrix. The requested ones are composed, in the order
+    channel mix, brightness, contrast, saturation, hue rotation, sepia, grayscale, and
+    applied in a single pass. Grayscale takes precedence over sepia and produces a
+    single-band image.
+
+    Args:
+        image (Image): The decoded image.
+        grayscale (bool): Convert to grayscale.
+        sepia (bool): Apply a sepia tone.
+        brightness (Optional[float]): Brightness factor, 1.0 is unchanged.
+        contrast (Optional[float]): Contrast factor, 1.0 is unchanged.
+        saturation (Optional[float]): Saturation factor, 1.0 is unchanged.
+        hue_rotate (Optional[float]): Hue rotation in degrees.
+        channel_mix (Optional[List[List[float]]]): A 3x3 or 3x4 channel mixing matrix.
+
+    Returns:
+        Image: The filtered image.
+
+    Raises:
+        ValueError: If the channel mix is malformed.
+    """
+    matrices = []
+    if channel_mix is not None:
+        matrices.append(color.channel_mix_matrix(channel_mix))
+    if brightness is not None:
+        matrices.append(color.brightness_matrix(brightness))
+    if contrast is not None:
+        matrices.append(color.contrast_matrix(contrast))
+    if saturation is not None:
+        matrices.append(color.saturation_matrix(saturation))
+    if hue_rotate is not None:
+        matrices.append(color.hue_rotation_matrix(hue_rotate))
+    if sepia and not grayscale:
+        matrices.append(color.sepia_matrix())
+    if grayscale:
+        matrices.append(color.grayscale_matrix())
+
+    if not matrices:
+        return image
+    return color.apply_color_matrix(image, color.compose(*matrices), grayscale=grayscale)
+
+
 def resize_image(image_bytes: bytes, width: int, height: int) -> bytes:
     """
     Resize an image to the specified dimensions.
@@ -43,11 +535,8 @@ def resize_image(image_bytes: bytes, width: int, height: int) -> bytes:
     Returns:
         bytes: The resized image in bytes.
     """
-    image = decode_image(image_bytes)
-    resized = image.resize((width, height))
-    img_byte_arr = io.BytesIO()
-    resized.save(img_byte_arr, format='JPEG')
-    return img_byte_arr.getvalue()
+    image = decode_image(image_bytes, draft_size=(width, height))
+    return encode_image(resize(image, width, height), "JPEG")
 
 
 def crop_image(image_bytes: bytes, x: int, y: int, width: int, height: int) -> bytes:
@@ -64,11 +553,7 @@ def crop_image(image_bytes: bytes, x: int, y: int, width: int, height: int) -> b
     Returns:
         bytes: The cropped image in bytes.
     """
-    image = decode_image(image_bytes)
-    cropped = image.crop((x, y, x + width, y + height))
-    img_byte_arr = io.BytesIO()
-    cropped.save(img_byte_arr, format='JPEG')
-    return img_byte_arr.getvalue()
+    return encode_image(crop(decode_image(image_bytes), x, y, width, height), "JPEG")
 
 
 def rotate_image(image_bytes: bytes, angle: int) -> bytes:
@@ -82,11 +567,7 @@ def rotate_image(image_bytes: bytes, angle: int) -> bytes:
     Returns:
         bytes: The rotated image in bytes.
     """
-    image = decode_image(image_bytes)
-    rotated = image.rotate(angle, expand=True)
-    img_byte_arr = io.BytesIO()
-    rotated.save(img_byte_arr, format='JPEG')
-    return img_byte_arr.getvalue()
+    return encode_image(rotate(decode_image(image_bytes), angle), "JPEG")
 
 
 def add_watermark(
@@ -111,13 +592,10 @@ def add_watermark(
     Returns:
         bytes: The image with the watermark in bytes.
     """
-    image = decode_image(image_bytes)
-    draw = ImageDraw.Draw(image)
-    font = ImageFont.load_default()
-    draw.text(position, watermark_text, font=font, fill=color)
-    img_byte_arr = io.BytesIO()
-    image.save(img_byte_arr, format='JPEG')
-    return img_byte_arr.getvalue()
+    image = watermark(
+        decode_image(image_bytes), watermark_text, position, font_scale, color, thickness
+    )
+    return encode_image(image, "JPEG")
 
 
 def apply_filter(image_bytes: bytes, filter_type: str) -> bytes:
@@ -130,42 +608,336 @@ def apply_filter(image_bytes: bytes, filter_type: str) -> bytes:
 
     Returns:
         bytes: The filtered image in bytes.
+
+    Raises:
+        ValueError: If the filter type is unknown.
     """
-    image = decode_image(image_bytes)
-    if filter_type == "grayscale":
-        filtered = image.convert("L")
-    elif filter_type == "sepia":
-        sepia_image = np.array(image)
-        sepia_filter = np.array([[0.272, 0.534, 0.131], [0.349, 0.686, 0.168], [0.393, 0.769, 0.189]])
-        sepia_image = np.dot(sepia_image[...,:3], sepia_filter.T)
-        sepia_image = np.clip(sepia_image, 0, 255).astype(np.uint8)
-        filtered = Image.fromarray(sepia_image)
-    else:
+    if filter_type not in ("grayscale", "sepia"):
         raise ValueError(f"Unknown filter type: {filter_type}")
+    image = filter_image(decode_image(image_bytes), **{filter_type: True})
+    return encode_image(image, "JPEG")
 
-    img_byte_arr = io.BytesIO()
-    filtered.save(img_byte_arr, format='JPEG')
-    return img_byte_arr.getvalue()
+
+OPERATIONS: Dict[str, Callable[..., Image]] = {
+    "resize": resize,
+    "resize_region": resize_region,
+    "crop": crop,
+    "rotate": rotate,
+    "transpose": transpose,
+    "watermark": watermark,
+    "filter": filter_image,
+}
+
+# Pixel-local operations that can run strip by strip on very large images.
+TILED_OPERATIONS = {"filter"}
+
+# Operations that draw into the image they are given instead of returning a new one.
+IN_PLACE_OPERATIONS = {"watermark"}
+
+
+class ImagePipeline:
+    """
+    Runs a sequence of operations on a single in-memory image.
+
+    The source is decoded once, every operation works on the same Pillow image and
+    the result is encoded once in the requested format, so chaining operations costs
+    neither extra decodes nor extra generations of lossy compression.
+
+    Images above a pixel threshold switch to tiled mode: pixel-local operations run
+    strip by strip within a fixed memory budget instead of allocating full-size copies.
+    """
+
+    def __init__(
+        self,
+        operations: List[Operation],
+        tiled_threshold: int = config.IMAGE_TILED_THRESHOLD_PIXELS,
+        tile_memory_budget: int = config.IMAGE_TILE_MEMORY_BUDGET,
+    ) -> None:
+        """
+        Initialize the pipeline.
+
+        Args:
+            operations (List[Operation]): The operations to run, in order.
+            tiled_threshold (int): Pixel count above which tiled mode is used.
+            tile_memory_budget (int): Memory budget for one strip, in bytes.
+        """
+        for name, _ in operations:
+            if name not in OPERATIONS:
+                raise ValueError(f"Unknown operation: {name}")
+        self.operations = operations
+        self.tiled_threshold = tiled_threshold
+        self.tile_memory_budget = tile_memory_budget
+
+    @classmethod
+    def from_transformations(cls, transformations: Dict[str, Any]) -> "ImagePipeline":
+        """
+        Build a pipeline from a transformation dictionary.
+
+        Operations run in the order resize, crop, rotate, watermark, filter.
+
+        Args:
+            transformations (dict): A dictionary of transformations to apply, as
+                accepted by `apply_image_transformations`.
+
+        Returns:
+            ImagePipeline: The pipeline for the given transformations.
+
+        Raises:
+            ValueError: If a resize or crop has a size that is not positive.
+        """
+        operations: List[Operation] = []
+
+        resize_params = transformations.get("resize")
+        if resize_params is not None:
+            for dimension in ("width", "height"):
+                if resize_params[dimension] is not None and resize_params[dimension] <= 0:
+                    raise ValueError(f"Resize {dimension} must be positive")
+            operations.append(
+                ("resize", {"width": resize_params["width"], "height": resize_params["height"]})
+            )
+
+        crop_params = transformations.get("crop")
+        if crop_params is not None:
+            for dimension in ("width", "height"):
+                if crop_params[dimension] is None or crop_params[dimension] <= 0:
+                    raise ValueError(f"Crop {dimension} must be positive")
+            operations.append(
+                (
+                    "crop",
+                    {
+                        "x": crop_params["x"] or 0,
+                        "y": crop_params["y"] or 0,
+                        "width": crop_params["width"],
+                        "height": crop_params["height"],
+                    },
+                )
+            )
+
+        if transformations.get("rotate") is not None:
+            operations.append(("rotate", {"angle": transformations["rotate"]}))
+
+        if transformations.get("watermark") is not None:
+            operations.append(("watermark", {"watermark_text": transformations["watermark"]}))
+
+        filter_params = transformations.get("filter")
+        if filter_params is not None:
+            filters = {
+                name: value
+                for name, value in filter_params.items()
+                if value is not None and value is not False
+            }
+            if filters:
+                operations.append(("filter", filters))
+
+        return cls(operations)
+
+    def run(self, image: Image, shared: bool = False) -> Image:
+        """
+        Run every operation on a decoded image.
+
+        Args:
+            image (Image): The decoded source image.
+            shared (bool): Whether the image is shared (e.g. held by the decoded image
+                cache). It is then copied before the first operation that would write
+                into it, and left untouched otherwise.
+
+        Returns:
+            Image: The transformed image.
+        """
+        for name, params in self.operations:
+            operation = partial(OPERATIONS[name], **params)
+            tiled = name in TILED_OPERATIONS and image.width * image.height > self.tiled_threshold
+            if shared and (tiled or name in IN_PLACE_OPERATIONS):
+                image = image.copy()
+                shared = False
+            with time_stage(f"op_{name}"):
+                if tiled:
+                    result = apply_in_strips(image, operation, self.tile_memory_budget)
+                else:
+                    result = operation(image)
+            shared = shared and result is image
+            image = result
+        return image
+
+    def optimize(self, source_size: Tuple[int, int], source_bands: int = 3) -> "ImagePipeline":
+        """
+        Return an equivalent pipeline with a cheaper plan.
+
+        Args:
+            source_size (Tuple[int, int]): The size of the decoded source.
+            source_bands (int): The number of bands of the decoded source.
+
+        Returns:
+            ImagePipeline: The planned pipeline.
+        """
+        return ImagePipeline(
+            plan_operations(self.operations, source_size, source_bands),
+            tiled_threshold=self.tiled_threshold,
+            tile_memory_budget=self.tile_memory_budget,
+        )
+
+    def process(
+        self,
+        source: ImageSource,
+        format_image: str,
+        optimize: bool = True,
+        cache_decoded: bool = False,
+        max_bytes: Optional[int] = None,
+        target_quality: Optional[float] = None,
+    ) -> bytes:
+        """
+        Decode the source once, run the pipeline and encode the result once.
+
+        Args:
+            source (ImageSource): The source image as bytes, a file path or a file object.
+            format_image (str): The output format.
+            optimize (bool): Rewrite the operations into a cheaper plan first.
+            cache_decoded (bool): Look the decoded source up in, and add it to, the
+                decoded image cache. Only for file paths that keep identifying the
+                same image, such as source cache entries.
+            max_bytes (Optional[int]): A byte budget for the output; see
+                `encode_adaptive`.
+            target_quality (Optional[float]): A minimum SSIM for the output; see
+                `encode_adaptive`.
+
+        Returns:
+            bytes: The transformed image in bytes.
+        """
+        image = decode_image(source)
+        pipeline = self
+        if optimize:
+            pipeline = self.optimize(image.size, len(image.getbands()))
+
+        draft_size = pipeline.draft_size()
+        if draft_size is not None:
+            draft_image(image, draft_size)
+
+        shared = False
+        key = None
+        if cache_decoded and decoded_images.enabled and isinstance(source, str):
+            # Draft decoding has already set the size and mode the pixels will have
+            stat = os.stat(source)
+            key = (source, stat.st_mtime_ns, stat.st_size, image.size, image.mode)
+            cached = decoded_images.get(key)
+            if cached is not None:
+                image = cached
+                shared = True
+        if not shared:
+            # Decoding is lazy; load here so the decode is timed on its own
+            with time_stage("decode"):
+                image.load()
+            if key is not None:
+                shared = decoded_images.put(key, image)
+
+        image = pipeline.run(image, shared=shared)
+        with time_stage("encode"):
+            return encode_adaptive(image, format_image, max_bytes, target_quality)
+
+    def draft_size(self) -> Optional[Tuple[int, int]]:
+        """
+        Return the size the source can be draft-decoded at, if any.
+
+        Only a leading resize allows decoding below full resolution; any other first
+        step needs the source pixels as they are.
+
+        Returns:
+            Optional[Tuple[int, int]]: The target size of the leading resize, or None.
+        """
+        if not self.operations:
+            return None
+        name, params = self.operations[0]
+        if name == "resize" and None not in (params["width"], params["height"]):
+            return params["width"], params["height"]
+        if name == "resize_region":
+            return tuple(params["full_size"])
+        return None
+
+
+def fit_within(size: Tuple[int, int], max_edge: int) -> Tuple[int, int]:
+    """
+    Compute the size of an image scaled so its longer edge is at most `max_edge`.
+
+    Images that already fit are never upscaled.
+
+    Args:
+        size (Tuple[int, int]): The image size.
+        max_edge (int): The maximum length of the longer edge.
+
+    Returns:
+        Tuple[int, int]: The scaled size.
+    """
+    width, height = size
+    scale = max_edge / max(width, height)
+    if scale >= 1:
+        return width, height
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+def render_variants(
+    source: ImageSource, presets: List[Tuple[str, int, str]]
+) -> List[Dict[str, Any]]:
+    """
+    Render several downscaled variants of an image from a single decode.
+
+    The source is draft-decoded for the largest preset, and every smaller size is
+    resized from the previous one rather than from the full source.
+
+    Args:
+        source (ImageSource): The source image as bytes, a file path or a file object.
+        presets (List[Tuple[str, int, str]]): (name, max edge, format) per variant.
+
+    Returns:
+        List[dict]: One dict per preset with "name", "format", "width", "height"
+            and the encoded "data".
+    """
+    image = decode_image(source)
+    source_size = image.size
+    largest = max(max_edge for _, max_edge, _ in presets)
+    draft_image(image, fit_within(source_size, largest))
+
+    variants = []
+    for max_edge in sorted({max_edge for _, max_edge, _ in presets}, reverse=True):
+        target = fit_within(source_size, max_edge)
+        if image.size != target:
+            image = resize(image, *target)
+        for name, preset_edge, format_image in presets:
+            if preset_edge == max_edge:
+                variants.append(
+                    {
+                        "name": name,
+                        "format": format_image,
+                        "width": image.width,
+                        "height": image.height,
+                        "data": encode_image(image, format_image),
+                    }
+                )
+    return variants
 
 
 def apply_image_transformations(
-    image_bytes: bytes,
+    source: ImageSource,
     transformations: Dict[str, Any],
     original_format: str,
+    cache_decoded: bool = False,
 ) -> bytes:
     """
     Applies a series of transformations to the image, preserving the original format unless specified.
 
     Args:
-        image_bytes (bytes): The original image in bytes.
+        source (ImageSource): The original image as bytes, a file path or a file object.
         transformations (dict): A dictionary of transformations to apply.
             - resize: {"width": int, "height": int}
             - crop: {"x": int, "y": int, "width": int, "height": int}
             - rotate: int (degrees)
             - watermark: str (text to add as a watermark)
-            - filter: {"grayscale": bool, "sepia": bool}
+            - filter: {"grayscale": bool, "sepia": bool, "brightness": float,
+                "contrast": float, "saturation": float, "hue_rotate": float,
+                "channel_mix": List[List[float]]}
             - format: Optional[str] (desired output format, e.g., "jpg", "png")
+            - max_bytes: Optional[int] (byte budget for the output)
+            - target_quality: Optional[float] (minimum SSIM of the output, 0-1)
         original_format (str): The original format of the image (e.g., "png", "jpeg").
+        cache_decoded (bool): Use the decoded image cache; see `ImagePipeline.process`.
 
     Returns:
         bytes: The transformed image in bytes.
@@ -173,41 +945,12 @@ def apply_image_transformations(
     Raises:
         ValueError: If the format is unsupported or encoding fails.
     """
-    # Apply transformations step by step
-    resize = transformations.get("resize", None)
-    crop = transformations.get("crop", None)
-    rotate = transformations.get("rotate", None)
-    watermark = transformations.get("watermark", None)
-    filter_image = transformations.get("filter", None)
-
-    if resize is not None:
-        image_bytes = resize_image(image_bytes, resize["width"], resize["height"])
-
-    if crop is not None:
-        image_bytes = crop_image(image_bytes, crop["x"], crop["y"], crop["width"], crop["height"])
-
-    if rotate is not None:
-        image_bytes = rotate_image(image_bytes, transformations["rotate"])
-
-    if watermark is not None:
-        image_bytes = add_watermark(image_bytes, transformations["watermark"])
-
-    if filter_image is not None:
-        if transformations["filter"].get("grayscale", False):
-            image_bytes = apply_filter(image_bytes, "grayscale")
-        elif transformations["filter"].get("sepia", False):
-            image_bytes = apply_filter(image_bytes, "sepia")
-
-    # Handle format change or preserve original format
-    format_image = transformations.get("format", original_format).lower()
-    if format_image == "string":
-        format_image = original_format
-    valid_formats = {"jpg", "jpeg", "png"}
-    if format_image not in valid_formats:
-        raise ValueError(f"Unsupported format: {format_image}")
-
-    # Convert the image to the desired or original format
-    img = decode_image(image_bytes)
-    img_byte_arr = io.BytesIO()
-    img.save(img_byte_arr, format=format_image.upper())
-    return img_byte_arr.getvalue()
+    format_image = resolve_format(transformations.get("format"), original_format)
+    pipeline = ImagePipeline.from_transformations(transformations)
+    return pipeline.process(
+        source,
+        format_image,
+        cache_decoded=cache_decoded,
+        max_bytes=transformations.get("max_bytes"),
+        target_quality=transformations.get("target_quality"),
+    )
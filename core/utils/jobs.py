@@ -0,0 +1,154 @@
+import asyncio
+import os
+import random
+import socket
+from typing import Any, Dict, Optional
+
+from icecream import ic
+
+from app.crud.image import ImageCRUD
+from app.crud.transform_job import TransformJobCRUD
+from app.models.transform_job import JOB_KIND_VARIANTS, TransformJob
+from core.config import config
+from core.database.session import async_session_maker
+from core.exceptions import (BadRequestException, CustomException,
+                             NotFoundException)
+from core.utils.transform import transform_stored_image
+from core.utils.variants import store_variants
+
+
+def backoff_delay(attempt: int) -> float:
+    """
+    Compute the delay before retrying a job, with exponential backoff and jitter.
+
+    Args:
+        attempt (int): The number of attempts made so far (1 for the first failure).
+
+    Returns:
+        float: The delay in seconds.
+    """
+    delay = min(
+        config.JOB_RETRY_MAX_DELAY, config.JOB_RETRY_BASE_DELAY * 2 ** (attempt - 1)
+    )
+    return delay * random.uniform(0.5, 1.0)
+
+
+def describe_job(job: TransformJob) -> Dict[str, Any]:
+    """
+    Describe a job for API responses.
+
+    Args:
+        job (TransformJob): The job.
+
+    Returns:
+        dict: The job's public fields.
+    """
+    return {
+        "id": job.id,
+        "image_id": job.image_id,
+        "kind": job.kind,
+        "status": job.status,
+        "attempts": job.attempts,
+        "max_attempts": job.max_attempts,
+        "url": job.result_url,
+        "error": job.error,
+        "created_at": job.created_at,
+        "updated_at": job.updated_at,
+    }
+
+
+async def run_job(job: TransformJob, worker_id: str) -> None:
+    """
+    Run a claimed job (a transformation, or the variants of an upload) and record
+    its outcome.
+
+    Invalid transformations and missing images fail the job immediately; storage
+    outages, busy or timed-out image workers and any other error are retried with
+    backoff until the job runs out of attempts.
+
+    Args:
+        job (TransformJob): The claimed job.
+        worker_id (str): The worker holding the lease.
+    """
+    retry_delay: Optional[float] = None
+    try:
+        if job.attempts > job.max_attempts:
+            raise BadRequestException("Job exceeded its maximum number of attempts")
+
+        async with async_session_maker() as session:
+            image = await ImageCRUD(session).get_by_id(job.image_id)
+        if image is None:
+            raise BadRequestException("Image not found")
+
+        if job.kind == JOB_KIND_VARIANTS:
+            await store_variants(image.id, image.name)
+            url = None
+        else:
+            url = await transform_stored_image(image.name, job.transformations)
+        async with async_session_maker() as session:
+            completed = await TransformJobCRUD(session).complete(job.id, worker_id, url)
+        if not completed:
+            ic(f"Lost the lease on job {job.id} before it completed")
+        return
+    except (BadRequestException, NotFoundException) as e:
+        error = e.message
+    except CustomException as e:
+        # Storage failed, or the worker pool was busy or timed out (StorageException,
+        # ServiceUnavailableException, GatewayTimeoutException); another attempt
+        # may succeed
+        error = e.message
+        retry_delay = backoff_delay(job.attempts)
+    except Exception as e:
+        error = str(e)
+        retry_delay = backoff_delay(job.attempts)
+
+    if retry_delay is not None and job.attempts >= job.max_attempts:
+        retry_delay = None
+    async with async_session_maker() as session:
+        await TransformJobCRUD(session).fail(job.id, worker_id, error, retry_delay)
+
+
+async def work(worker_id: str, stop: asyncio.Event) -> None:
+    """
+    Claim and run jobs one at a time until `stop` is set.
+
+    Args:
+        worker_id (str): Identifies the worker in job leases.
+        stop (asyncio.Event): Set to finish after the current job.
+    """
+    while not stop.is_set():
+        try:
+            async with async_session_maker() as session:
+                job = await TransformJobCRUD(session).claim_next(
+                    worker_id, config.JOB_LEASE_SECONDS
+                )
+        except Exception as e:
+            ic(f"Failed to claim a transform job: {e}")
+            job = None
+
+        if job is None:
+            try:
+                await asyncio.wait_for(stop.wait(), timeout=config.JOB_POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            continue
+
+        await run_job(job, worker_id)
+
+
+async def run_workers(concurrency: int, stop: Optional[asyncio.Event] = None) -> None:
+    """
+    Run several job loops in this process.
+
+    Each loop holds at most one lease, so `concurrency` bounds how many jobs this
+    process works on at once; the CPU work itself goes through the image executor.
+
+    Args:
+        concurrency (int): Number of concurrent job loops.
+        stop (Optional[asyncio.Event]): Set to stop the loops after their current job.
+    """
+    stop = stop or asyncio.Event()
+    prefix = f"{socket.gethostname()}:{os.getpid()}"
+    await asyncio.gather(
+        *(work(f"{prefix}:{index}"[:64], stop) for index in range(concurrency))
+    )
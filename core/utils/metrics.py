@@ -0,0 +1,347 @@
+import math
+import threading
+import time
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import (Any, Callable, Dict, Iterator, List, Optional, Sequence,
+                    Tuple)
+
+# Latency buckets in seconds, from single image operations to slow transforms.
+DEFAULT_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0
+)
+
+LabelValues = Tuple[str, ...]
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if value == int(value) and abs(value) < 1e15:
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{_escape(str(value))}"' for name, value in zip(names, values))
+    return "{" + pairs + "}"
+
+
+class Metric(ABC):
+    """
+    Base class of a metric family: a name, help text and a set of label names.
+
+    Updates are guarded by a lock, so metrics can be updated from request handlers
+    and thread pool workers alike.
+    """
+
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        if set(labels) != set(self.label_names):
+            raise ValueError(f"{self.name} expects labels {self.label_names}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.label_names)
+
+    @abstractmethod
+    def samples(self) -> Iterator[Tuple[str, LabelValues, Tuple[str, ...], float]]:
+        """
+        Yield (suffix, label values, extra label names/values, value) per sample.
+        """
+
+    def render(self) -> List[str]:
+        """
+        Render the family in the Prometheus text exposition format.
+
+        Returns:
+            List[str]: The lines of the family.
+        """
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.kind}",
+        ]
+        for suffix, values, extra, value in self.samples():
+            names = self.label_names + tuple(extra[0::2])
+            label_values = values + tuple(extra[1::2])
+            lines.append(
+                f"{self.name}{suffix}{_format_labels(names, label_values)} {_format_value(value)}"
+            )
+        return lines
+
+
+class Counter(Metric):
+    """
+    A value that only goes up, such as a number of requests.
+    """
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()) -> None:
+        super().__init__(name, documentation, labels)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        """
+        Increase the counter.
+
+        Args:
+            amount (float): The non-negative increment.
+            **labels (str): The label values.
+        """
+        if amount < 0:
+            raise ValueError("Counters can only increase")
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def samples(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            yield "_total", key, (), value
+
+
+class Gauge(Metric):
+    """
+    A value that goes up and down. Either set explicitly, or read from a callback
+    each time the metrics are collected.
+    """
+
+    kind = "gauge"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labels: Sequence[str] = (),
+        callback: Optional[Callable[[], float]] = None,
+    ) -> None:
+        super().__init__(name, documentation, labels)
+        self._values: Dict[LabelValues, float] = {}
+        self.callback = callback
+
+    def set(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def samples(self):
+        if self.callback is not None:
+            yield "", (), (), float(self.callback())
+            return
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            yield "", key, (), value
+
+
+class Histogram(Metric):
+    """
+    Counts observations into cumulative buckets, e.g. request latencies.
+    """
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labels: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> None:
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: the count of each bucket (plus +Inf), and the sum
+        self._values: Dict[LabelValues, Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        """
+        Record an observation.
+
+        Args:
+            value (float): The observed value, e.g. seconds.
+            **labels (str): The label values.
+        """
+        key = self._key(labels)
+        index = len(self.buckets)
+        for position, bound in enumerate(self.buckets):
+            if value <= bound:
+                index = position
+                break
+        with self._lock:
+            counts, total = self._values.setdefault(
+                key, ([0] * (len(self.buckets) + 1), [0.0])
+            )
+            counts[index] += 1
+            total[0] += value
+
+    def samples(self):
+        with self._lock:
+            items = sorted((key, (list(counts), total[0])) for key, (counts, total) in self._values.items())
+        for key, (counts, total) in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                yield "_bucket", key, ("le", _format_value(bound)), cumulative
+            yield "_sum", key, (), total
+            yield "_count", key, (), cumulative
+
+
+class MetricsRegistry:
+    """
+    Holds the metric families of this process and renders them for scraping.
+
+    Each process keeps its own registry; with several server processes, every one
+    of them is scraped (or aggregated) separately.
+    """
+
+    def __init__(self) -> None:
+        self._metrics: Dict[str, Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: Metric) -> Metric:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} is already registered")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labels: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labels))
+
+    def gauge(
+        self,
+        name: str,
+        documentation: str,
+        labels: Sequence[str] = (),
+        callback: Optional[Callable[[], float]] = None,
+    ) -> Gauge:
+        return self.register(Gauge(name, documentation, labels, callback))
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labels: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        return self.register(Histogram(name, documentation, labels, buckets))
+
+    def render(self) -> str:
+        """
+        Render every metric in the Prometheus text exposition format (0.0.4).
+
+        Returns:
+            str: The exposition, ending in a newline.
+        """
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines: List[str] = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+http_requests = registry.counter(
+    "http_requests", "HTTP requests by route, method and status.", ("method", "route", "status")
+)
+http_request_duration = registry.histogram(
+    "http_request_duration_seconds", "HTTP request latency by route.", ("method", "route")
+)
+transform_stage_duration = registry.histogram(
+    "image_transform_stage_duration_seconds",
+    "Time spent per stage of image work, by job (transform or variants).",
+    ("job", "stage"),
+)
+image_bytes_processed = registry.counter(
+    "image_bytes_processed", "Bytes of source images read and results written.", ("direction",)
+)
+
+# Stage timings of work running in the image executor are collected here and sent
+# back with the result, since pool processes have registries of their own.
+_stage_collector: ContextVar[Optional[List[Tuple[str, float, int]]]] = ContextVar(
+    "stage_collector", default=None
+)
+
+
+def record_stage(stage: str, seconds: float) -> None:
+    """
+    Record the duration of a transformation stage. Outside the executor, stages
+    always belong to a transform.
+
+    Args:
+        stage (str): The stage name, e.g. "decode" or "op_resize".
+        seconds (float): The duration.
+    """
+    collector = _stage_collector.get()
+    if collector is not None:
+        collector.append((stage, seconds, time.time_ns()))
+    else:
+        transform_stage_duration.observe(seconds, job="transform", stage=stage)
+
+
+@contextmanager
+def time_stage(stage: str) -> Iterator[None]:
+    """
+    Time a block as a transformation stage, see `record_stage`.
+
+    Args:
+        stage (str): The stage name.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(stage, time.perf_counter() - start)
+
+
+def collect_stages(
+    func: Callable[..., Any], *args: Any
+) -> Tuple[Any, List[Tuple[str, float, int]]]:
+    """
+    Call a function and return its result with the stages it recorded.
+
+    Used as the entry point of executor jobs; pass the stages to `observe_stages`
+    in the calling process.
+
+    Args:
+        func (Callable[..., Any]): The function.
+        *args (Any): Its positional arguments.
+
+    Returns:
+        Tuple[Any, List[Tuple[str, float, int]]]: The result and the stages as
+            (stage, seconds, end time in ns) tuples; the end time lets the caller
+            place the stage in a trace.
+    """
+    stages: List[Tuple[str, float, int]] = []
+    token = _stage_collector.set(stages)
+    try:
+        return func(*args), stages
+    finally:
+        _stage_collector.reset(token)
+
+
+def observe_stages(stages: List[Tuple[str, float, int]], job: str = "transform") -> None:
+    """
+    Record stages collected by `collect_stages`.
+
+    Args:
+        stages (List[Tuple[str, float, int]]): The (stage, seconds, end time) tuples.
+        job (str): The kind of job they belong to, "transform" or "variants".
+    """
+    for stage, seconds, _ in stages:
+        transform_stage_duration.observe(seconds, job=job, stage=stage)
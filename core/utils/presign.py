@@ -0,0 +1,197 @@
+import hashlib
+import hmac
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Dict, Optional, Tuple
+from urllib.parse import quote, urlsplit
+
+from core.config import config
+
+ALGORITHM = "AWS4-HMAC-SHA256"
+
+
+def _hmac(key: bytes, message: str) -> bytes:
+    return hmac.new(key, message.encode(), hashlib.sha256).digest()
+
+
+class PresignedURLSigner:
+    """
+    Signs S3 GET URLs with AWS Signature Version 4 query parameters, locally.
+
+    This is the computation boto3's `generate_presigned_url` performs, without
+    its request model machinery. The signing key only depends on the date, so it is
+    derived once per day instead of once per URL.
+    """
+
+    def __init__(
+        self,
+        access_key: str,
+        secret_key: str,
+        region: str,
+        bucket: str,
+        endpoint_url: Optional[str] = None,
+    ) -> None:
+        """
+        Initialize the signer.
+
+        Args:
+            access_key (str): The AWS access key ID.
+            secret_key (str): The AWS secret access key.
+            region (str): The bucket's region.
+            bucket (str): The bucket name.
+            endpoint_url (Optional[str]): An S3-compatible endpoint; objects are then
+                addressed path-style under it.
+        """
+        self.access_key = access_key
+        self.secret_key = secret_key
+        self.region = region
+        self.bucket = bucket
+
+        if endpoint_url:
+            endpoint = urlsplit(endpoint_url)
+            self.scheme, self.host = endpoint.scheme, endpoint.netloc
+            self.path_prefix = f"{endpoint.path.rstrip('/')}/{bucket}"
+        else:
+            self.scheme, self.host = "https", f"{bucket}.s3.{region}.amazonaws.com"
+            self.path_prefix = ""
+        self._signing_keys: Dict[str, bytes] = {}
+
+    def signing_key(self, date: str) -> bytes:
+        """
+        Return the SigV4 signing key for a date, deriving it on first use.
+
+        Args:
+            date (str): The date as YYYYMMDD.
+
+        Returns:
+            bytes: The signing key.
+        """
+        key = self._signing_keys.get(date)
+        if key is None:
+            key = _hmac(f"AWS4{self.secret_key}".encode(), date)
+            for part in (self.region, "s3", "aws4_request"):
+                key = _hmac(key, part)
+            # Only today's (and, around midnight, yesterday's) keys are ever needed
+            if len(self._signing_keys) > 1:
+                self._signing_keys.clear()
+            self._signing_keys[date] = key
+        return key
+
+    def sign(self, file_name: str, expiration: int, signed_at: Optional[float] = None) -> str:
+        """
+        Build a presigned GET URL for an object.
+
+        Args:
+            file_name (str): The object key.
+            expiration (int): Seconds the URL stays valid after `signed_at`.
+            signed_at (Optional[float]): The signing time as a UNIX timestamp;
+                defaults to now.
+
+        Returns:
+            str: The presigned URL.
+        """
+        moment = datetime.fromtimestamp(
+            time.time() if signed_at is None else signed_at, tz=timezone.utc
+        )
+        amz_date = moment.strftime("%Y%m%dT%H%M%SZ")
+        date = amz_date[:8]
+        scope = f"{date}/{self.region}/s3/aws4_request"
+
+        path = f"{self.path_prefix}/{quote(file_name, safe='/-_.~')}"
+        query = "&".join(
+            f"{name}={quote(value, safe='-_.~')}"
+            for name, value in (
+                ("X-Amz-Algorithm", ALGORITHM),
+                ("X-Amz-Credential", f"{self.access_key}/{scope}"),
+                ("X-Amz-Date", amz_date),
+                ("X-Amz-Expires", str(expiration)),
+                ("X-Amz-SignedHeaders", "host"),
+            )
+        )
+        canonical_request = "\n".join(
+            ("GET", path, query, f"host:{self.host}", "", "host", "UNSIGNED-PAYLOAD")
+        )
+        string_to_sign = "\n".join(
+            (
+                ALGORITHM,
+                amz_date,
+                scope,
+                hashlib.sha256(canonical_request.encode()).hexdigest(),
+            )
+        )
+        signature = hmac.new(
+            self.signing_key(date), string_to_sign.encode(), hashlib.sha256
+        ).hexdigest()
+        return f"{self.scheme}://{self.host}{path}?{query}&X-Amz-Signature={signature}"
+
+
+class PresignedURLCache:
+    """
+    Hands out presigned URLs that stay the same for a while.
+
+    Time is divided into windows of `ttl` seconds, and every URL requested within a
+    window is signed as of the window's start. Repeated requests for an object
+    therefore get the identical URL (so browsers and CDNs can cache the image), and
+    it is served from an LRU cache without signing again. Because `ttl` is shorter
+    than the expiration, every handed-out URL is still valid for at least
+    `expiration - ttl` seconds.
+    """
+
+    def __init__(self, signer: PresignedURLSigner, ttl: int, max_entries: int) -> None:
+        """
+        Initialize the cache.
+
+        Args:
+            signer (PresignedURLSigner): The signer.
+            ttl (int): The window length in seconds.
+            max_entries (int): The maximum number of cached URLs.
+        """
+        self.signer = signer
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._urls: OrderedDict[Tuple[str, int, int], str] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, file_name: str, expiration: int) -> str:
+        """
+        Return a presigned GET URL for an object.
+
+        Args:
+            file_name (str): The object key.
+            expiration (int): The validity of the URL in seconds. Windows are capped
+                to half of it, so short-lived URLs never expire early.
+
+        Returns:
+            str: The presigned URL.
+        """
+        ttl = max(1, min(self.ttl, expiration // 2))
+        window = int(time.time()) // ttl
+        key = (file_name, expiration, window)
+
+        url = self._urls.get(key)
+        if url is not None:
+            self.hits += 1
+            self._urls.move_to_end(key)
+            return url
+
+        self.misses += 1
+        url = self.signer.sign(file_name, expiration, signed_at=window * ttl)
+        self._urls[key] = url
+        if len(self._urls) > self.max_entries:
+            self._urls.popitem(last=False)
+        return url
+
+
+presigned_urls = PresignedURLCache(
+    PresignedURLSigner(
+        config.AWS_ACCESS_KEY,
+        config.AWS_SECRET_KEY,
+        config.AWS_REGION,
+        config.AWS_S3_BUCKET_NAME,
+        config.AWS_ENDPOINT_URL,
+    ),
+    ttl=config.PRESIGN_CACHE_TTL,
+    max_entries=config.PRESIGN_CACHE_SIZE,
+)
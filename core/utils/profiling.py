@@ -0,0 +1,548 @@
+import cProfile
+import io
+import json
+import marshal
+import multiprocessing.util
+import os
+import pstats
+import re
+import shutil
+import signal
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from collections import Counter, deque
+from types import CodeType, FrameType
+from typing import Any, Deque, Dict, List, Optional
+
+from core.config import config
+from core.exceptions import BadRequestException, ServiceUnavailableException
+
+# Leaf frames of threads that are waiting rather than running: locks and
+# conditions, the event loop's selector and idle thread pool workers.
+IDLE_FRAMES = {
+    ("threading.py", "wait"),
+    ("threading.py", "_wait_for_tstate_lock"),
+    ("selectors.py", "select"),
+    ("queue.py", "get"),
+    ("thread.py", "_worker"),
+    ("connection.py", "wait"),
+}
+
+# Longest stack kept per sample, counted from the root.
+MAX_STACK_DEPTH = 200
+
+
+def _short_path(filename: str) -> str:
+    for prefix in sorted(sys.path, key=len, reverse=True):
+        if prefix and filename.startswith(prefix + os.sep):
+            return filename[len(prefix) + 1 :]
+    return filename
+
+
+_labels: Dict[CodeType, str] = {}
+
+
+def _label(code: CodeType) -> str:
+    label = _labels.get(code)
+    if label is None:
+        name = getattr(code, "co_qualname", code.co_name)
+        label = f"{name} ({_short_path(code.co_filename)}:{code.co_firstlineno})"
+        # ";" separates frames in the collapsed format
+        label = label.replace(";", ":")
+        _labels[code] = label
+    return label
+
+
+def _stack(frame: Optional[FrameType]) -> List[str]:
+    codes = []
+    while frame is not None:
+        codes.append(frame.f_code)
+        frame = frame.f_back
+    codes.reverse()
+    return [_label(code) for code in codes[:MAX_STACK_DEPTH]]
+
+
+def sample_threads(
+    seconds: float, interval: float, include_idle: bool, prefix: str = ""
+) -> Counter:
+    """
+    Sample the stacks of every other thread of this process for a while.
+
+    Args:
+        seconds (float): How long to sample for.
+        interval (float): The time between samples, in seconds.
+        include_idle (bool): Whether to keep samples of waiting threads.
+        prefix (str): Put in front of every thread name, e.g. to name the process.
+
+    Returns:
+        Counter: The number of samples per collapsed stack.
+    """
+    own = threading.get_ident()
+    samples: Counter = Counter()
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        frames = sys._current_frames()
+        for ident, frame in frames.items():
+            if ident == own:
+                continue
+            code = frame.f_code
+            if not include_idle and (
+                (os.path.basename(code.co_filename), code.co_name) in IDLE_FRAMES
+            ):
+                continue
+            thread = (prefix + names.get(ident, str(ident))).replace(";", ":")
+            samples[";".join([thread] + _stack(frame))] += 1
+        # Do not keep the other threads' frames alive while sleeping
+        del frames
+        frame = None
+        time.sleep(interval)
+    return samples
+
+
+def _serve_pool_profiles(directory: str, name: str) -> None:
+    # Waits for SIGUSR1 in its own thread, so a request is answered even while the
+    # main thread is busy in C code (where a Python signal handler would not run)
+    pid = os.getpid()
+    while True:
+        signal.sigwait({signal.SIGUSR1})
+        request_path = os.path.join(directory, f"{pid}.request")
+        try:
+            with open(request_path) as file:
+                request = json.load(file)
+            os.unlink(request_path)
+        except (OSError, ValueError):
+            continue
+        samples = sample_threads(
+            request["seconds"], request["interval"], request["include_idle"], f"{name}-{pid}/"
+        )
+        _write_atomic(
+            request["output"],
+            "".join(f"{stack} {count}\n" for stack, count in samples.items()),
+        )
+
+
+def _write_atomic(path: str, text: str) -> None:
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".")
+    with os.fdopen(fd, "w") as file:
+        file.write(text)
+    os.replace(tmp_path, path)
+
+
+def _unregister(path: str) -> None:
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+
+
+def install_pool_sampler(directory: str, name: str, registry: str) -> None:
+    """
+    Let `SamplingProfiler` sample this process; the initializer of image worker
+    pool processes.
+
+    The process registers in `registry` only once it is ready for SIGUSR1, whose
+    default action would terminate it, and unregisters when it exits.
+
+    Args:
+        directory (str): Where profile requests and results are exchanged.
+        name (str): Names the pool in the sampled stacks, e.g. "image".
+        registry (str): The pool's registry, see `pool_registry`.
+    """
+    if not hasattr(signal, "pthread_sigmask"):
+        return
+    os.makedirs(directory, exist_ok=True)
+    # Blocked in every thread, so it is only ever taken by `sigwait`
+    signal.pthread_sigmask(signal.SIG_BLOCK, {signal.SIGUSR1})
+    threading.Thread(
+        target=_serve_pool_profiles, args=(directory, name), name="profiler", daemon=True
+    ).start()
+
+    path = os.path.join(registry, str(os.getpid()))
+    try:
+        open(path, "w").close()
+    except FileNotFoundError:
+        # The pool was shut down meanwhile
+        return
+    multiprocessing.util.Finalize(None, _unregister, args=(path,), exitpriority=0)
+
+
+def pool_registry(directory: str, name: str) -> str:
+    """
+    Create an empty directory for the workers of a new pool to register in.
+
+    Args:
+        directory (str): The profile directory, PROFILE_DIR.
+        name (str): The pool name.
+
+    Returns:
+        str: The registry path, to pass to `install_pool_sampler`.
+    """
+    path = os.path.join(directory, "pools", f"{os.getpid()}-{name}")
+    shutil.rmtree(path, ignore_errors=True)
+    os.makedirs(path)
+    return path
+
+
+def registered_workers(registry: str) -> List[int]:
+    """
+    List the live workers registered by `install_pool_sampler`.
+
+    Args:
+        registry (str): The pool's registry, see `pool_registry`.
+
+    Returns:
+        List[int]: The process IDs of workers that can be sampled.
+    """
+    try:
+        entries = os.listdir(registry)
+    except FileNotFoundError:
+        return []
+    pids = []
+    for entry in entries:
+        if not entry.isdigit():
+            continue
+        try:
+            os.kill(int(entry), 0)
+        except ProcessLookupError:
+            # Died without unregistering, e.g. killed
+            _unregister(os.path.join(registry, entry))
+            continue
+        except PermissionError:
+            continue
+        pids.append(int(entry))
+    return sorted(pids)
+
+
+class SamplingProfiler:
+    """
+    Samples the Python stacks of every thread of this process, and of the image
+    worker pool processes, at a fixed interval.
+
+    The result is in the collapsed-stack format of flamegraph.pl and speedscope:
+    one `thread;outer;...;inner count` line per distinct stack. Threads of pool
+    processes are named `<pool>-<pid>/<thread>`. Pool processes sample themselves
+    in a thread started by `install_pool_sampler` when asked with SIGUSR1; results
+    are exchanged as files in `directory`. Nothing runs between profiles, and only
+    one profile runs at a time.
+    """
+
+    def __init__(self, directory: str) -> None:
+        """
+        Initialize the profiler.
+
+        Args:
+            directory (str): Where profile requests and results of pool processes
+                are exchanged.
+        """
+        self.directory = directory
+        self._lock = threading.Lock()
+
+    @property
+    def running(self) -> bool:
+        return self._lock.locked()
+
+    def _request_pool_profiles(
+        self, pids: List[int], seconds: float, interval: float, include_idle: bool
+    ) -> Dict[int, str]:
+        if not pids or not hasattr(signal, "pthread_sigmask"):
+            return {}
+        os.makedirs(self.directory, exist_ok=True)
+        token = uuid.uuid4().hex
+        outputs = {}
+        for pid in pids:
+            output = os.path.join(self.directory, f"{pid}.{token}.folded")
+            request_path = os.path.join(self.directory, f"{pid}.request")
+            _write_atomic(
+                request_path,
+                json.dumps(
+                    {
+                        "seconds": seconds,
+                        "interval": interval,
+                        "include_idle": include_idle,
+                        "output": output,
+                    }
+                ),
+            )
+            try:
+                os.kill(pid, signal.SIGUSR1)
+                outputs[pid] = output
+            except ProcessLookupError:
+                os.unlink(request_path)
+        return outputs
+
+    def _collect_pool_profiles(self, outputs: Dict[int, str], timeout: float) -> Counter:
+        samples: Counter = Counter()
+        deadline = time.monotonic() + timeout
+        while outputs and time.monotonic() < deadline:
+            for pid, output in list(outputs.items()):
+                try:
+                    with open(output) as file:
+                        lines = file.read().splitlines()
+                except FileNotFoundError:
+                    continue
+                os.unlink(output)
+                del outputs[pid]
+                for line in lines:
+                    stack, _, count = line.rpartition(" ")
+                    samples[stack] += int(count)
+            time.sleep(0.05)
+        # Processes that did not answer (e.g. replaced meanwhile) are left out
+        for pid in outputs:
+            for path in (os.path.join(self.directory, f"{pid}.request"), outputs[pid]):
+                try:
+                    os.unlink(path)
+                except FileNotFoundError:
+                    pass
+        return samples
+
+    def profile(
+        self,
+        seconds: float,
+        interval: float,
+        include_idle: bool = False,
+        pool_pids: Optional[List[int]] = None,
+    ) -> str:
+        """
+        Sample all threads of this process and of the given pool processes for a
+        while. Blocks, so run it in a thread.
+
+        Args:
+            seconds (float): How long to sample for.
+            interval (float): The time between samples, in seconds.
+            include_idle (bool): Whether to keep samples of waiting threads.
+            pool_pids (Optional[List[int]]): The pool processes to sample as well,
+                from `registered_workers`.
+
+        Returns:
+            str: The collapsed stacks, heaviest first.
+
+        Raises:
+            ServiceUnavailableException: If a profile is already running.
+        """
+        if not self._lock.acquire(blocking=False):
+            raise ServiceUnavailableException("A CPU profile is already running.")
+        try:
+            outputs = self._request_pool_profiles(
+                pool_pids or [], seconds, interval, include_idle
+            )
+            samples = sample_threads(seconds, interval, include_idle)
+            samples.update(self._collect_pool_profiles(outputs, timeout=5.0))
+            return "".join(f"{stack} {count}\n" for stack, count in samples.most_common())
+        finally:
+            self._lock.release()
+
+
+class ProfileCapture:
+    """
+    The cProfile output of one captured request.
+    """
+
+    def __init__(
+        self, method: str, path: str, status: int, duration: float, profile: cProfile.Profile
+    ) -> None:
+        self.id = uuid.uuid4().hex
+        self.method = method
+        self.path = path
+        self.status = status
+        self.duration = duration
+        self.captured_at = time.time()
+        profile.create_stats()
+        self.stats = profile.stats
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "method": self.method,
+            "path": self.path,
+            "status": self.status,
+            "duration_ms": round(self.duration * 1000, 3),
+            "captured_at": self.captured_at,
+        }
+
+    def text(self, sort: str = "cumulative", limit: int = 50) -> str:
+        """
+        Render the profile as a pstats report.
+
+        Args:
+            sort (str): The pstats sort key, e.g. "cumulative" or "tottime".
+            limit (int): The number of functions to list.
+
+        Returns:
+            str: The report.
+        """
+        stream = io.StringIO()
+        stats = pstats.Stats(stream=stream)
+        stats.stats = self.stats
+        stats.get_top_level_stats()
+        try:
+            stats.sort_stats(sort)
+        except KeyError:
+            raise BadRequestException(f"Unknown sort key: {sort}")
+        stats.print_stats(limit)
+        return stream.getvalue()
+
+    def dump(self) -> bytes:
+        """
+        Serialize the profile like `cProfile.Profile.dump_stats`, for snakeviz,
+        `python -m pstats` and similar tools.
+
+        Returns:
+            bytes: The marshalled stats.
+        """
+        return marshal.dumps(self.stats)
+
+
+class RequestProfiler:
+    """
+    Captures cProfile output for requests matching a rule.
+
+    A rule matches on a route template (e.g. `/v1/image/{image_id}/render`), a
+    request header, or both, and expires after a number of captures or seconds.
+    cProfile follows the event loop thread, so other requests served while a
+    captured one is waiting show up in its profile too; requests are therefore
+    captured one at a time, and a matching request arriving meanwhile is skipped.
+    While no rule is set the middleware only checks `armed`.
+    """
+
+    def __init__(self, max_captures: int) -> None:
+        self.captures: Deque[ProfileCapture] = deque(maxlen=max_captures)
+        self.armed = False
+        self._route: Optional[re.Pattern] = None
+        self._rule: Dict[str, Any] = {}
+        self._header: Optional[bytes] = None
+        self._header_value: Optional[bytes] = None
+        self._remaining = 0
+        self._expires_at = 0.0
+        self._busy = False
+
+    def arm(
+        self,
+        route: Optional[str],
+        header: Optional[str],
+        header_value: Optional[str],
+        limit: int,
+        ttl: float,
+    ) -> Dict[str, Any]:
+        """
+        Start capturing requests that match all of the given criteria.
+
+        Args:
+            route (Optional[str]): A route template; `{param}` matches one segment.
+            header (Optional[str]): A header the request must carry.
+            header_value (Optional[str]): The value the header must have.
+            limit (int): How many requests to capture.
+            ttl (float): How many seconds to keep capturing.
+
+        Returns:
+            dict: The rule, see `state`.
+
+        Raises:
+            BadRequestException: If neither a route nor a header is given.
+        """
+        if route is None and header is None:
+            raise BadRequestException("A route or a header is required.")
+        if header_value is not None and header is None:
+            raise BadRequestException("A header value requires a header.")
+        self._route = None
+        if route is not None:
+            pattern = re.sub(r"\\\{[^/]+?\\\}", "[^/]+", re.escape(route.rstrip("/") or "/"))
+            self._route = re.compile(f"^{pattern}/?$")
+        self._header = header.lower().encode("latin-1") if header else None
+        self._header_value = header_value.encode("latin-1") if header_value is not None else None
+        self._remaining = limit
+        self._expires_at = time.time() + ttl
+        self._rule = {"route": route, "header": header, "header_value": header_value}
+        self.armed = True
+        return self.state()
+
+    def disarm(self) -> None:
+        self.armed = False
+        self._rule = {}
+
+    def state(self) -> Dict[str, Any]:
+        """
+        Describe the current rule.
+
+        Returns:
+            dict: Whether capturing is on, the rule, and how much of it remains.
+        """
+        if self.armed and time.time() >= self._expires_at:
+            self.disarm()
+        return {
+            "armed": self.armed,
+            **self._rule,
+            "remaining": self._remaining if self.armed else 0,
+            "expires_at": self._expires_at if self.armed else None,
+            "pid": os.getpid(),
+        }
+
+    def start(self, scope: Dict[str, Any]) -> Optional[cProfile.Profile]:
+        """
+        Start profiling a request if it matches the rule.
+
+        Args:
+            scope (dict): The ASGI scope of the request.
+
+        Returns:
+            Optional[cProfile.Profile]: The running profile, or None.
+        """
+        if self._busy:
+            return None
+        if time.time() >= self._expires_at:
+            self.disarm()
+            return None
+        if self._route is not None and not self._route.match(scope["path"]):
+            return None
+        if self._header is not None:
+            values = [value for name, value in scope["headers"] if name == self._header]
+            if not values or (self._header_value is not None and self._header_value not in values):
+                return None
+
+        self._remaining -= 1
+        if self._remaining <= 0:
+            self.disarm()
+        self._busy = True
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Another profiler (e.g. a debugger) is active on this thread
+            self._busy = False
+            return None
+        return profile
+
+    def finish(
+        self,
+        profile: cProfile.Profile,
+        scope: Dict[str, Any],
+        status: int,
+        duration: float,
+    ) -> None:
+        """
+        Stop a profile started by `start` and keep it.
+
+        Args:
+            profile (cProfile.Profile): The profile.
+            scope (dict): The ASGI scope of the request.
+            status (int): The response status.
+            duration (float): The request duration in seconds.
+        """
+        profile.disable()
+        self._busy = False
+        self.captures.append(
+            ProfileCapture(scope["method"], scope["path"], status, duration, profile)
+        )
+
+    def get(self, capture_id: str) -> Optional[ProfileCapture]:
+        for capture in self.captures:
+            if capture.id == capture_id:
+                return capture
+        return None
+
+
+sampling_profiler = SamplingProfiler(config.PROFILE_DIR)
+request_profiler = RequestProfiler(config.PROFILE_MAX_CAPTURES)
@@ -0,0 +1,85 @@
+from typing import Tuple
+
+import numpy as np
+from PIL import Image
+
+# SSIM is computed on a luma copy downscaled to this longer edge; structural errors
+# from compression survive the downscale, and the metric then costs well under the
+# time of an encode even for large images.
+SSIM_MAX_EDGE = 256
+
+# Side of the square window local statistics are computed over, as in Wang et al.
+SSIM_WINDOW = 7
+
+# Stabilizing constants for 8-bit data (K1 = 0.01, K2 = 0.03).
+SSIM_C1 = (0.01 * 255) ** 2
+SSIM_C2 = (0.03 * 255) ** 2
+
+
+def comparison_size(size: Tuple[int, int]) -> Tuple[int, int]:
+    """
+    Compute the size images are compared at.
+
+    Args:
+        size (Tuple[int, int]): The image size.
+
+    Returns:
+        Tuple[int, int]: The size with the longer edge at most SSIM_MAX_EDGE.
+    """
+    width, height = size
+    scale = min(1.0, SSIM_MAX_EDGE / max(width, height))
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+def luma_view(image: Image, size: Tuple[int, int]) -> np.ndarray:
+    """
+    Return the luma of an image at the comparison size as a float array.
+
+    Args:
+        image (Image): The image.
+        size (Tuple[int, int]): The comparison size, see `comparison_size`.
+
+    Returns:
+        np.ndarray: A (height, width) array of luma values in 0-255.
+    """
+    if image.mode != "L":
+        image = image.convert("L")
+    if image.size != size:
+        image = image.resize(size, Image.Resampling.BOX)
+    return np.asarray(image, dtype=np.float64)
+
+
+def _window_mean(values: np.ndarray, window: int) -> np.ndarray:
+    # Box filter over every full window, via a summed-area table
+    table = np.pad(values.cumsum(axis=0).cumsum(axis=1), ((1, 0), (1, 0)))
+    sums = (
+        table[window:, window:]
+        - table[:-window, window:]
+        - table[window:, :-window]
+        + table[:-window, :-window]
+    )
+    return sums / (window * window)
+
+
+def structural_similarity(reference: np.ndarray, candidate: np.ndarray) -> float:
+    """
+    Compute the mean structural similarity (SSIM) of two luma arrays.
+
+    Args:
+        reference (np.ndarray): The reference luma, see `luma_view`.
+        candidate (np.ndarray): The luma to compare, of the same shape.
+
+    Returns:
+        float: The SSIM, 1.0 for identical images.
+    """
+    window = min(SSIM_WINDOW, *reference.shape)
+    mean_ref = _window_mean(reference, window)
+    mean_cand = _window_mean(candidate, window)
+    var_ref = _window_mean(reference * reference, window) - mean_ref**2
+    var_cand = _window_mean(candidate * candidate, window) - mean_cand**2
+    covariance = _window_mean(reference * candidate, window) - mean_ref * mean_cand
+
+    similarity = ((2 * mean_ref * mean_cand + SSIM_C1) * (2 * covariance + SSIM_C2)) / (
+        (mean_ref**2 + mean_cand**2 + SSIM_C1) * (var_ref + var_cand + SSIM_C2)
+    )
+    return float(similarity.mean())
@@ -0,0 +1,109 @@
+import hashlib
+import hmac
+import time
+from typing import Any, Dict, Optional
+from urllib.parse import urlencode
+
+from core.config import config
+
+# The render query parameters a signature covers.
+RENDER_PARAMS = ("w", "h", "fmt", "filter", "rotate", "max_bytes", "target_quality")
+
+# Render URLs get their own key derived from URL_SIGNING_KEY, so a render signature
+# can never pass as a presigned file URL or the other way round.
+_RENDER_KEY = hmac.new(config.URL_SIGNING_KEY.encode(), b"render-url", hashlib.sha256).digest()
+
+
+def canonical_query(params: Dict[str, Any]) -> str:
+    """
+    Serialize render parameters in a fixed order, leaving out unset ones.
+
+    Args:
+        params (dict): The render parameters by query name.
+
+    Returns:
+        str: The query string, e.g. "fmt=webp&w=320".
+    """
+    return urlencode(
+        sorted((name, str(params[name])) for name in RENDER_PARAMS if params.get(name) is not None)
+    )
+
+
+def render_signature(image_id: str, params: Dict[str, Any], expires: int) -> str:
+    """
+    Sign a render of an image.
+
+    Args:
+        image_id (str): The image ID.
+        params (dict): The render parameters by query name.
+        expires (int): The expiry time as a UNIX timestamp.
+
+    Returns:
+        str: The hex HMAC-SHA256 signature.
+    """
+    message = f"{image_id}\n{canonical_query(params)}\n{expires}".encode()
+    return hmac.new(_RENDER_KEY, message, hashlib.sha256).hexdigest()
+
+
+def sign_render_query(
+    image_id: str, params: Dict[str, Any], expiration: int = config.PRESIGN_EXPIRATION
+) -> Dict[str, Any]:
+    """
+    Build the query string of a signed render URL.
+
+    Expiry times are aligned to a window like presigned file URLs, so repeated requests get
+    the same URL for a while and CDNs can keep serving it from cache.
+
+    Args:
+        image_id (str): The image ID.
+        params (dict): The render parameters by query name.
+        expiration (int): Seconds the URL stays valid; the rounding can take off up
+            to half of it.
+
+    Returns:
+        dict: The "query" string and the "expires" timestamp.
+    """
+    window = max(1, min(config.PRESIGN_CACHE_TTL, expiration // 2))
+    expires = (int(time.time()) // window) * window + expiration
+    signature = render_signature(image_id, params, expires)
+    query = canonical_query(params)
+    query = f"{query}&" if query else ""
+    return {
+        "query": f"{query}expires={expires}&signature={signature}",
+        "expires": expires,
+    }
+
+
+def verify_render_signature(
+    image_id: str, params: Dict[str, Any], expires: Optional[int], signature: Optional[str]
+) -> bool:
+    """
+    Check a signed render URL's signature and expiry.
+
+    Args:
+        image_id (str): The image ID from the path.
+        params (dict): The render parameters from the query.
+        expires (Optional[int]): The expiry time from the URL.
+        signature (Optional[str]): The signature from the URL.
+
+    Returns:
+        bool: True if the URL is authentic and has not expired.
+    """
+    if expires is None or signature is None or expires < time.time():
+        return False
+    return hmac.compare_digest(render_signature(image_id, params, expires), signature)
+
+
+def signed_cache_control(expires: int) -> str:
+    """
+    Return the Cache-Control header of a signed render: public, so CDNs and browsers
+    share it, but never cached past the URL's expiry.
+
+    Args:
+        expires (int): The expiry time of the URL.
+
+    Returns:
+        str: The header value.
+    """
+    max_age = max(0, min(config.RENDER_SIGNED_MAX_AGE, expires - int(time.time())))
+    return f"public, max-age={max_age}"
@@ -0,0 +1,162 @@
+import asyncio
+import os
+import shutil
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, Optional
+
+from core.config import config
+from core.utils.disk_cache import DiskLRUCache
+from core.utils.storage import get_storage
+
+
+class SourceCache:
+    """
+    A read-through cache of source images on local disk, in front of the storage.
+
+    Entries are keyed by object name and ETag, so a replaced object never matches a
+    stale entry; a HEAD request (or an ETag the caller already has) validates every
+    use. Concurrent misses for the same object share one download.
+
+    The index and the pins that keep files in use from being evicted live in
+    memory, so every process (e.g. each uvicorn worker) keeps its files in its own
+    subdirectory, named after its PID, and `max_bytes` applies per process.
+    Subdirectories of processes that have exited are removed.
+    """
+
+    def __init__(self, directory: str, max_bytes: int) -> None:
+        """
+        Initialize the cache. The directory is set up on first use, in the process
+        that uses it.
+
+        Args:
+            directory (str): The directory holding the cached sources.
+            max_bytes (int): The maximum total size of the cache per process; 0
+                disables it.
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._disk: Optional[DiskLRUCache] = None
+        self._pid: Optional[int] = None
+        self._downloads: Dict[str, asyncio.Future] = {}
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    @property
+    def disk(self) -> Optional[DiskLRUCache]:
+        """The cache of the current process, or None if caching is disabled."""
+        if not self.enabled:
+            return None
+        if self._pid != os.getpid():
+            # First use, or first use after a fork
+            self._pid = os.getpid()
+            self._remove_stale()
+            self._disk = DiskLRUCache(
+                os.path.join(self.directory, str(self._pid)), self.max_bytes
+            )
+            self._downloads = {}
+        return self._disk
+
+    def _remove_stale(self) -> None:
+        if not os.path.isdir(self.directory):
+            return
+        for entry in os.scandir(self.directory):
+            if not entry.is_dir() or not entry.name.isdigit():
+                continue
+            pid = int(entry.name)
+            if pid == self._pid:
+                continue
+            try:
+                os.kill(pid, 0)
+            except ProcessLookupError:
+                shutil.rmtree(entry.path, ignore_errors=True)
+            except PermissionError:
+                # Alive, but owned by another user
+                pass
+
+    @asynccontextmanager
+    async def source_file(self, name: str, etag: Optional[str] = None) -> AsyncIterator[str]:
+        """
+        Make a stored image available as a local file for the duration of the context.
+
+        Args:
+            name (str): The object key of the image.
+            etag (Optional[str]): The object's current ETag, if already known.
+
+        Yields:
+            str: The path of the file. It must not be modified.
+        """
+        storage = get_storage()
+        disk = self.disk
+        if disk is None or storage.local_path(name) is not None:
+            # Local objects are already on disk; caching them would only copy them
+            async with storage.source_file(name) as path:
+                yield path
+            return
+
+        if etag is None:
+            etag = (await storage.head_image(name))["ETag"]
+        key = f"{name}\0{etag}"
+
+        disk.pin(key)
+        try:
+            path = await self._fetch(name, key)
+            if path is None:
+                # Larger than the whole cache; use a one-off download
+                async with storage.source_file(name) as path:
+                    yield path
+            else:
+                yield path
+        finally:
+            disk.unpin(key)
+
+    async def _fetch(self, name: str, key: str) -> Optional[str]:
+        path = self.disk.path(key)
+        if path is not None:
+            self.hits += 1
+            return path
+
+        download = self._downloads.get(key)
+        if download is None:
+            self.misses += 1
+            download = asyncio.ensure_future(self._download(name, key))
+            self._downloads[key] = download
+            download.add_done_callback(lambda _: self._downloads.pop(key, None))
+        else:
+            # Another request is already downloading this object
+            self.hits += 1
+        # One waiter giving up must not cancel the download for the others
+        return await asyncio.shield(download)
+
+    async def _download(self, name: str, key: str) -> Optional[str]:
+        tmp_path = self.disk.reserve()
+        try:
+            with open(tmp_path, "wb") as file:
+                await get_storage().download_image(name, file)
+            return self.disk.commit(key, tmp_path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Return the hit and miss counters and the cache size.
+
+        Returns:
+            Dict[str, Any]: The hits, misses, hit rate and bytes in use.
+        """
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "size": self.disk.size if self.disk else 0,
+            "max_size": self.disk.max_bytes if self.disk else 0,
+        }
+
+
+source_cache = SourceCache(config.SOURCE_CACHE_DIR, config.SOURCE_CACHE_MAX_BYTES)
@@ -0,0 +1,378 @@
+import asyncio
+import hashlib
+import hmac
+import mmap
+import os
+import tempfile
+import time
+from abc import ABC, abstractmethod
+from contextlib import asynccontextmanager
+from functools import lru_cache
+from typing import Any, AsyncIterator, BinaryIO, Dict, List, Optional
+from urllib.parse import quote
+
+from core.config import config
+from core.exceptions import BadRequestException, StorageException
+from core.utils.tracing import traced
+
+# Files are copied in chunks of this size.
+CHUNK_SIZE = 1024 * 1024
+
+
+class Storage(ABC):
+    """
+    Where original images, variants and derivatives are kept.
+
+    Object names are relative keys such as "1730000000photo.jpg" or
+    "derivatives/<source>/<digest>.png". Methods raise BadRequestException for missing
+    objects and invalid names, and StorageException when the storage itself fails
+    (I/O errors, outages), which is worth retrying.
+    """
+
+    @abstractmethod
+    async def get_image(self, file_name: str) -> bytes:
+        """Read a whole object."""
+
+    @abstractmethod
+    async def get_image_range(self, file_name: str, length: int) -> bytes:
+        """Read up to `length` bytes from the start of an object."""
+
+    @abstractmethod
+    async def download_image(self, file_name: str, file_obj: BinaryIO) -> int:
+        """Copy an object into a writable binary file and return its size."""
+
+    @abstractmethod
+    async def head_image(self, file_name: str) -> Dict[str, Any]:
+        """Return an object's metadata, including "ETag" and "ContentLength"."""
+
+    @abstractmethod
+    async def object_exists(self, file_name: str) -> bool:
+        """Check whether an object exists."""
+
+    @abstractmethod
+    async def upload_image(self, file_data: bytes, file_name: str, content_type: str) -> str:
+        """Store an object and return its URL."""
+
+    @abstractmethod
+    async def upload_stream(
+        self, file_obj: BinaryIO, file_name: str, content_type: str
+    ) -> Dict[str, Any]:
+        """Store a file object and return its "url", "size" and SHA-256 "content_hash"."""
+
+    @abstractmethod
+    async def create_image_url(self, file_name: str) -> str:
+        """Return the public URL of an object."""
+
+    @abstractmethod
+    async def generate_presigned_url(self, file_name: str, expiration: int) -> str:
+        """Return a URL that grants read access to an object for `expiration` seconds."""
+
+    @abstractmethod
+    async def delete_object(self, file_name: str) -> None:
+        """Delete an object."""
+
+    @abstractmethod
+    async def list_objects(self, prefix: str) -> List[str]:
+        """Return the names of the objects whose names start with `prefix`."""
+
+    def local_path(self, file_name: str) -> Optional[str]:
+        """
+        Return the path of an object on local disk, if the storage keeps it there.
+
+        Args:
+            file_name (str): The object name.
+
+        Returns:
+            Optional[str]: The path, or None if the object is not a local file.
+        """
+        return None
+
+    @asynccontextmanager
+    async def source_file(self, file_name: str) -> AsyncIterator[str]:
+        """
+        Make an object available as a local file for the duration of the context.
+
+        Remote objects are streamed into a temporary file; local objects are used in
+        place. Image workers open the file by path, so the image is neither held in
+        memory whole nor copied into the worker process.
+
+        Args:
+            file_name (str): The object name.
+
+        Yields:
+            str: The path of the file.
+        """
+        path = self.local_path(file_name)
+        if path is not None:
+            yield path
+            return
+
+        suffix = os.path.splitext(file_name)[1]
+        with tempfile.NamedTemporaryFile(suffix=suffix, delete=False) as file:
+            path = file.name
+        try:
+            with open(path, "wb") as file:
+                await self.download_image(file_name, file)
+            yield path
+        finally:
+            os.unlink(path)
+
+
+class LocalStorage(Storage):
+    """
+    Keeps objects as files under a root directory.
+
+    Reads go through `mmap`, so reading a header only touches its first pages.
+    Writes go to a temporary file in the same directory that is renamed into
+    place, so readers never see a partial file. Files are served by the `/v1/files`
+    route, which hands the path to the server (sendfile where available). Unless the
+    storage is public, that route only serves presigned URLs, so those are what
+    `create_image_url` returns.
+    """
+
+    def __init__(self, root: str, base_url: str, secret: str, public: bool = False) -> None:
+        """
+        Initialize the storage.
+
+        Args:
+            root (str): The directory holding the objects.
+            base_url (str): The URL the files route is served under.
+            secret (str): The key used to sign presigned URLs.
+            public (bool): Whether files are served without a signature.
+        """
+        self.root = os.path.realpath(root)
+        self.base_url = base_url.rstrip("/")
+        self.secret = secret.encode()
+        self.public = public
+        os.makedirs(self.root, exist_ok=True)
+
+    def path(self, file_name: str) -> str:
+        """
+        Resolve an object name to its path under the root directory.
+
+        Args:
+            file_name (str): The object name.
+
+        Returns:
+            str: The absolute path.
+
+        Raises:
+            BadRequestException: If the name points outside the root directory.
+        """
+        path = os.path.realpath(os.path.join(self.root, file_name))
+        if os.path.commonpath((self.root, path)) != self.root or path == self.root:
+            raise BadRequestException("Invalid object name")
+        return path
+
+    def local_path(self, file_name: str) -> Optional[str]:
+        path = self.path(file_name)
+        return path if os.path.isfile(path) else None
+
+    def _read(self, file_name: str, length: Optional[int] = None) -> bytes:
+        try:
+            with open(self.path(file_name), "rb") as file:
+                if os.fstat(file.fileno()).st_size == 0:
+                    return b""
+                with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                    return mapped[:length]
+        except FileNotFoundError:
+            raise BadRequestException(f"Error retrieving object: {file_name} not found")
+        except OSError as e:
+            raise StorageException(f"Error retrieving object: {e}")
+
+    @traced("local.get_image", "storage")
+    async def get_image(self, file_name: str) -> bytes:
+        return await asyncio.to_thread(self._read, file_name)
+
+    @traced("local.get_image_range", "storage")
+    async def get_image_range(self, file_name: str, length: int) -> bytes:
+        return await asyncio.to_thread(self._read, file_name, length)
+
+    @traced("local.download_image", "storage")
+    async def download_image(self, file_name: str, file_obj: BinaryIO) -> int:
+        def copy() -> int:
+            try:
+                with open(self.path(file_name), "rb") as file:
+                    size = os.fstat(file.fileno()).st_size
+                    if size == 0:
+                        return 0
+                    with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                        view = memoryview(mapped)
+                        try:
+                            for offset in range(0, size, CHUNK_SIZE):
+                                file_obj.write(view[offset:offset + CHUNK_SIZE])
+                        finally:
+                            view.release()
+                    return size
+            except FileNotFoundError:
+                raise BadRequestException(f"Error retrieving object: {file_name} not found")
+            except OSError as e:
+                raise StorageException(f"Error retrieving object: {e}")
+
+        return await asyncio.to_thread(copy)
+
+    @traced("local.head_image", "storage")
+    async def head_image(self, file_name: str) -> Dict[str, Any]:
+        try:
+            stat = await asyncio.to_thread(os.stat, self.path(file_name))
+        except FileNotFoundError:
+            raise BadRequestException(
+                f"Error retrieving object metadata: {file_name} not found"
+            )
+        except OSError as e:
+            raise StorageException(f"Error retrieving object metadata: {e}")
+        # Files are only ever replaced atomically, so mtime and size identify a version
+        return {
+            "ETag": f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"',
+            "ContentLength": stat.st_size,
+        }
+
+    @traced("local.object_exists", "storage")
+    async def object_exists(self, file_name: str) -> bool:
+        return await asyncio.to_thread(os.path.isfile, self.path(file_name))
+
+    def _write(self, file_name: str, write) -> None:
+        path = self.path(file_name)
+        directory = os.path.dirname(path)
+        try:
+            os.makedirs(directory, exist_ok=True)
+            file_descriptor, temp_path = tempfile.mkstemp(dir=directory, prefix=".upload-")
+        except OSError as e:
+            raise StorageException(f"Error uploading image: {e}")
+        try:
+            with os.fdopen(file_descriptor, "wb") as file:
+                write(file)
+                file.flush()
+                os.fsync(file.fileno())
+            os.replace(temp_path, path)
+        except BaseException as e:
+            os.unlink(temp_path)
+            if isinstance(e, OSError):
+                raise StorageException(f"Error uploading image: {e}")
+            raise
+
+    @traced("local.upload_image", "storage")
+    async def upload_image(self, file_data: bytes, file_name: str, content_type: str) -> str:
+        await asyncio.to_thread(self._write, file_name, lambda file: file.write(file_data))
+        return await self.create_image_url(file_name)
+
+    @traced("local.upload_stream", "storage")
+    async def upload_stream(
+        self, file_obj: BinaryIO, file_name: str, content_type: str
+    ) -> Dict[str, Any]:
+        digest = hashlib.sha256()
+        size = 0
+
+        def copy(file: BinaryIO) -> None:
+            nonlocal size
+            while chunk := file_obj.read(CHUNK_SIZE):
+                digest.update(chunk)
+                file.write(chunk)
+                size += len(chunk)
+
+        await asyncio.to_thread(self._write, file_name, copy)
+        return {
+            "url": await self.create_image_url(file_name),
+            "size": size,
+            "content_hash": digest.hexdigest(),
+        }
+
+    def _url(self, file_name: str) -> str:
+        return f"{self.base_url}/{quote(file_name)}"
+
+    async def create_image_url(self, file_name: str) -> str:
+        if not self.public:
+            return await self.generate_presigned_url(file_name)
+        return self._url(file_name)
+
+    def signature(self, file_name: str, expires: int) -> str:
+        """
+        Sign an object name and expiry time.
+
+        Args:
+            file_name (str): The object name.
+            expires (int): The expiry time as a UNIX timestamp.
+
+        Returns:
+            str: The hex HMAC-SHA256 signature.
+        """
+        message = f"{file_name}\n{expires}".encode()
+        return hmac.new(self.secret, message, hashlib.sha256).hexdigest()
+
+    def verify(self, file_name: str, expires: int, signature: str) -> bool:
+        """
+        Check a presigned URL's signature and expiry.
+
+        Args:
+            file_name (str): The object name.
+            expires (int): The expiry time from the URL.
+            signature (str): The signature from the URL.
+
+        Returns:
+            bool: True if the URL is authentic and has not expired.
+        """
+        return expires >= time.time() and hmac.compare_digest(
+            self.signature(file_name, expires), signature
+        )
+
+    async def generate_presigned_url(
+        self, file_name: str, expiration: int = config.PRESIGN_EXPIRATION
+    ) -> str:
+        # Expiry times are rounded up like the S3 presigned URL windows, so repeated
+        # requests get the same URL for a while
+        window = max(1, min(config.PRESIGN_CACHE_TTL, expiration // 2))
+        expires = (int(time.time()) // window) * window + expiration
+        url = self._url(file_name)
+        return f"{url}?expires={expires}&signature={self.signature(file_name, expires)}"
+
+    @traced("local.delete_object", "storage")
+    async def delete_object(self, file_name: str) -> None:
+        try:
+            await asyncio.to_thread(os.unlink, self.path(file_name))
+        except FileNotFoundError:
+            pass
+
+    @traced("local.list_objects", "storage")
+    async def list_objects(self, prefix: str) -> List[str]:
+        def list_names() -> List[str]:
+            # Only the directory holding the prefix needs walking
+            directory = os.path.dirname(os.path.join(self.root, prefix))
+            if os.path.commonpath((self.root, os.path.realpath(directory))) != self.root:
+                raise BadRequestException("Invalid object name")
+            names = []
+            for parent, _, files in os.walk(directory):
+                for file in files:
+                    name = os.path.relpath(os.path.join(parent, file), self.root)
+                    name = name.replace(os.sep, "/")
+                    if name.startswith(prefix) and not file.startswith(".upload-"):
+                        names.append(name)
+            return sorted(names)
+
+        return await asyncio.to_thread(list_names)
+
+
+@lru_cache(maxsize=None)
+def get_storage() -> Storage:
+    """
+    Return the storage configured by STORAGE_BACKEND ("s3" or "local").
+
+    Returns:
+        Storage: The process-wide storage.
+
+    Raises:
+        ValueError: If the backend name is unknown.
+    """
+    backend_name = config.STORAGE_BACKEND.lower()
+    if backend_name == "s3":
+        # Imported here because the S3 implementation itself builds on this module
+        from core.utils.aws_utils import AWSService
+
+        return AWSService()
+    if backend_name == "local":
+        return LocalStorage(
+            config.LOCAL_STORAGE_DIR,
+            config.LOCAL_STORAGE_BASE_URL,
+            config.URL_SIGNING_KEY,
+            public=config.LOCAL_STORAGE_PUBLIC,
+        )
+    raise ValueError(f"Unknown storage backend: {backend_name}")
@@ -0,0 +1,84 @@
+from typing import Callable, Iterator, Tuple
+
+from PIL import Image, ImageMode
+
+Box = Tuple[int, int, int, int]
+
+
+def pixel_size(mode: str) -> int:
+    """
+    Return how many bytes Pillow stores per pixel of a mode.
+
+    Multi-band modes are stored with 4 bytes per pixel whatever their band count,
+    e.g. RGB and LA take as much memory as RGBA.
+
+    Args:
+        mode (str): The image mode.
+
+    Returns:
+        int: The bytes per pixel.
+    """
+    mode_info = ImageMode.getmode(mode)
+    if len(mode_info.bands) > 1:
+        return 4
+    return int(mode_info.typestr[2:])
+
+
+def strip_height(width: int, pixel_bytes: int, memory_budget: int) -> int:
+    """
+    Compute how many rows fit into a memory budget.
+
+    Args:
+        width (int): The image width in pixels.
+        pixel_bytes (int): The bytes per pixel, see `pixel_size`.
+        memory_budget (int): The budget for one strip, in bytes.
+
+    Returns:
+        int: The strip height in rows, at least 1.
+    """
+    return max(1, memory_budget // max(1, width * pixel_bytes))
+
+
+def iter_strips(size: Tuple[int, int], height: int) -> Iterator[Box]:
+    """
+    Yield the boxes of horizontal strips covering an image.
+
+    Args:
+        size (Tuple[int, int]): The image size.
+        height (int): The strip height in rows.
+
+    Yields:
+        Box: (left, upper, right, lower) of each strip.
+    """
+    width, image_height = size
+    for top in range(0, image_height, height):
+        yield 0, top, width, min(top + height, image_height)
+
+
+def apply_in_strips(
+    image: Image, func: Callable[[Image], Image], memory_budget: int
+) -> Image:
+    """
+    Run a pixel-local operation strip by strip.
+
+    The operation must map every pixel independently of its neighbours and keep the
+    image size. If it keeps the mode, results are pasted back into the source image in
+    place; otherwise they are pasted into one destination image of the new mode. Either
+    way, the extra memory is bounded by a couple of strips instead of a full copy.
+
+    Args:
+        image (Image): The image to process. It may be modified in place.
+        func (Callable[[Image], Image]): The pixel-local operation.
+        memory_budget (int): The budget for one strip, in bytes.
+
+    Returns:
+        Image: The processed image.
+    """
+    mode = func(image.crop((0, 0, 1, 1))).mode
+    destination = image if mode == image.mode else Image.new(mode, image.size)
+
+    pixel_bytes = max(pixel_size(image.mode), pixel_size(mode))
+    height = strip_height(image.width, pixel_bytes, memory_budget)
+    for box in iter_strips(image.size, height):
+        destination.paste(func(image.crop(box)), box)
+    return destination
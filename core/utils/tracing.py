@@ -0,0 +1,461 @@
+import functools
+import json
+import os
+import queue
+import random
+import re
+import threading
+import time
+import urllib.request
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import (Any, Awaitable, Callable, Dict, Iterator, List, Optional,
+                    Tuple, TypeVar)
+
+from core.config import config
+
+T = TypeVar("T")
+
+# W3C trace context: version-traceid-parentid-flags
+TRACEPARENT = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+
+# OTLP span kinds
+KIND_INTERNAL = 1
+KIND_SERVER = 2
+
+# Spans are handed to the exporter thread in batches of at most this many.
+EXPORT_BATCH_SIZE = 512
+
+
+class Span:
+    """
+    A timed unit of work within a trace.
+    """
+
+    __slots__ = (
+        "name",
+        "category",
+        "trace_id",
+        "span_id",
+        "parent_id",
+        "kind",
+        "start_ns",
+        "end_ns",
+        "attributes",
+        "error",
+    )
+
+    def __init__(
+        self,
+        name: str,
+        category: str,
+        trace_id: str,
+        parent_id: Optional[str],
+        kind: int = KIND_INTERNAL,
+        start_ns: Optional[int] = None,
+    ) -> None:
+        self.name = name
+        self.category = category
+        self.trace_id = trace_id
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.kind = kind
+        self.start_ns = time.time_ns() if start_ns is None else start_ns
+        self.end_ns: Optional[int] = None
+        self.attributes: Dict[str, Any] = {}
+        self.error = False
+
+    @property
+    def duration_ms(self) -> float:
+        return ((self.end_ns or time.time_ns()) - self.start_ns) / 1e6
+
+    def to_otlp(self) -> Dict[str, Any]:
+        """
+        Convert the span to the OTLP/JSON span representation.
+
+        Returns:
+            dict: The span as found in `resourceSpans[].scopeSpans[].spans[]`.
+        """
+        attributes = [{"key": "category", "value": {"stringValue": self.category}}]
+        for key, value in self.attributes.items():
+            if isinstance(value, bool):
+                attributes.append({"key": key, "value": {"boolValue": value}})
+            elif isinstance(value, int):
+                attributes.append({"key": key, "value": {"intValue": str(value)}})
+            elif isinstance(value, float):
+                attributes.append({"key": key, "value": {"doubleValue": value}})
+            else:
+                attributes.append({"key": key, "value": {"stringValue": str(value)}})
+        otlp = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": self.kind,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns or self.start_ns),
+            "attributes": attributes,
+            "status": {"code": 2 if self.error else 1},
+        }
+        if self.parent_id is not None:
+            otlp["parentSpanId"] = self.parent_id
+        return otlp
+
+
+class Trace:
+    """
+    The spans recorded for one request.
+    """
+
+    __slots__ = ("trace_id", "sampled", "spans")
+
+    def __init__(self, trace_id: str, sampled: bool) -> None:
+        self.trace_id = trace_id
+        self.sampled = sampled
+        self.spans: List[Span] = []
+
+
+_current_trace: ContextVar[Optional[Trace]] = ContextVar("current_trace", default=None)
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+
+class FileSpanExporter:
+    """
+    Appends spans to a file, one OTLP/JSON span per line.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+    def export(self, spans: List[Span]) -> None:
+        with open(self.path, "a") as f:
+            for span in spans:
+                f.write(json.dumps(span.to_otlp(), separators=(",", ":")) + "\n")
+
+
+class OTLPSpanExporter:
+    """
+    Posts spans to an OTLP/HTTP collector (or any stand-in accepting OTLP/JSON).
+    """
+
+    def __init__(self, endpoint: str, service_name: str, timeout: float = 5.0) -> None:
+        self.endpoint = endpoint
+        self.service_name = service_name
+        self.timeout = timeout
+
+    def export(self, spans: List[Span]) -> None:
+        body = {
+            "resourceSpans": [
+                {
+                    "resource": {
+                        "attributes": [
+                            {"key": "service.name", "value": {"stringValue": self.service_name}}
+                        ]
+                    },
+                    "scopeSpans": [
+                        {
+                            "scope": {"name": __name__},
+                            "spans": [span.to_otlp() for span in spans],
+                        }
+                    ],
+                }
+            ]
+        }
+        request = urllib.request.Request(
+            self.endpoint,
+            data=json.dumps(body).encode(),
+            headers={"Content-Type": "application/json"},
+            method="POST",
+        )
+        with urllib.request.urlopen(request, timeout=self.timeout):
+            pass
+
+
+class Tracer:
+    """
+    Starts traces for requests and ships finished spans to an exporter.
+
+    Exporting happens on a background thread, so a slow file system or collector
+    never delays a response; spans are dropped if the queue is full. Outside of a
+    traced request every span helper is a cheap no-op.
+    """
+
+    def __init__(
+        self,
+        exporter: Optional[Any],
+        sample_rate: float = 1.0,
+        server_timing: bool = False,
+        max_queue: int = 10_000,
+    ) -> None:
+        """
+        Initialize the tracer.
+
+        Args:
+            exporter: A span exporter, or None to export nothing.
+            sample_rate (float): Fraction of new traces that are exported.
+            server_timing (bool): Whether responses carry a Server-Timing header,
+                which needs spans to be recorded for every request.
+            max_queue (int): Maximum number of spans waiting to be exported.
+        """
+        self.exporter = exporter
+        self.sample_rate = sample_rate
+        self.server_timing = server_timing
+        self.dropped = 0
+        self._queue: "queue.Queue[Optional[Span]]" = queue.Queue(max_queue)
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.exporter is not None or self.server_timing
+
+    def start_trace(self, traceparent: Optional[str] = None) -> Optional[Trace]:
+        """
+        Start a trace, continuing the caller's trace if a valid `traceparent` is given.
+
+        Args:
+            traceparent (Optional[str]): The W3C traceparent header of the request.
+
+        Returns:
+            Optional[Trace]: The trace, or None if nothing would use its spans.
+        """
+        match = TRACEPARENT.match(traceparent or "")
+        if match is not None:
+            trace_id, sampled = match.group(1), int(match.group(3), 16) & 1 == 1
+        else:
+            trace_id, sampled = os.urandom(16).hex(), random.random() < self.sample_rate
+        sampled = sampled and self.exporter is not None
+        if not sampled and not self.server_timing:
+            return None
+        return Trace(trace_id, sampled)
+
+    @contextmanager
+    def activate(
+        self, trace: Trace, name: str, parent_id: Optional[str] = None
+    ) -> Iterator[Span]:
+        """
+        Make a trace current and open its root span; the trace is exported on exit.
+
+        Args:
+            trace (Trace): The trace from `start_trace`.
+            name (str): The name of the root span.
+            parent_id (Optional[str]): The caller's span ID, if continuing a trace.
+
+        Yields:
+            Span: The root span.
+        """
+        root = Span(name, "total", trace.trace_id, parent_id, kind=KIND_SERVER)
+        trace_token = _current_trace.set(trace)
+        span_token = _current_span.set(root)
+        try:
+            yield root
+        except BaseException:
+            root.error = True
+            raise
+        finally:
+            root.end_ns = time.time_ns()
+            trace.spans.append(root)
+            _current_span.reset(span_token)
+            _current_trace.reset(trace_token)
+            if trace.sampled:
+                self.export(trace.spans)
+
+    def export(self, spans: List[Span]) -> None:
+        """
+        Queue spans for the exporter thread.
+
+        Args:
+            spans (List[Span]): The finished spans.
+        """
+        self._ensure_thread()
+        for span in spans:
+            try:
+                self._queue.put_nowait(span)
+            except queue.Full:
+                self.dropped += 1
+
+    def _ensure_thread(self) -> None:
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(
+                        target=self._run, name="span-exporter", daemon=True
+                    )
+                    self._thread.start()
+
+    def _run(self) -> None:
+        stopping = False
+        while not stopping:
+            batch = []
+            span = self._queue.get()
+            while span is not None:
+                batch.append(span)
+                if len(batch) >= EXPORT_BATCH_SIZE:
+                    break
+                try:
+                    span = self._queue.get(timeout=0.5)
+                except queue.Empty:
+                    break
+            stopping = span is None
+            if batch:
+                try:
+                    self.exporter.export(batch)
+                except Exception:
+                    # Tracing must never take the service down with it
+                    self.dropped += len(batch)
+
+    def shutdown(self) -> None:
+        """
+        Export the spans still queued and stop the exporter thread.
+        """
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join(timeout=5)
+            self._thread = None
+
+
+@contextmanager
+def span(name: str, category: str, **attributes: Any) -> Iterator[Optional[Span]]:
+    """
+    Record a span under the current span, if a trace is active.
+
+    Args:
+        name (str): The span name, e.g. "s3.get_object".
+        category (str): The group the span is summarized under in Server-Timing,
+            e.g. "db", "storage" or "image".
+        **attributes (Any): Attributes of the span.
+
+    Yields:
+        Optional[Span]: The span, or None when not tracing.
+    """
+    trace = _current_trace.get()
+    if trace is None:
+        yield None
+        return
+    parent = _current_span.get()
+    current = Span(name, category, trace.trace_id, parent.span_id if parent else None)
+    current.attributes.update(attributes)
+    token = _current_span.set(current)
+    try:
+        yield current
+    except BaseException:
+        current.error = True
+        raise
+    finally:
+        current.end_ns = time.time_ns()
+        _current_span.reset(token)
+        trace.spans.append(current)
+
+
+def traced(
+    name: str, category: str
+) -> Callable[[Callable[..., Awaitable[T]]], Callable[..., Awaitable[T]]]:
+    """
+    Decorate a coroutine function so that every call is recorded as a span.
+
+    Args:
+        name (str): The span name.
+        category (str): The span category, see `span`.
+
+    Returns:
+        The decorator.
+    """
+
+    def decorator(func: Callable[..., Awaitable[T]]) -> Callable[..., Awaitable[T]]:
+        @functools.wraps(func)
+        async def wrapper(*args: Any, **kwargs: Any) -> T:
+            if _current_trace.get() is None:
+                return await func(*args, **kwargs)
+            with span(name, category):
+                return await func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def add_stage_spans(stages: List[Tuple[str, float, int]], category: str) -> None:
+    """
+    Record stages timed in another process (see `core.utils.metrics`) as spans
+    under the current span.
+
+    Args:
+        stages (List[Tuple[str, float, int]]): (stage, seconds, end time in ns).
+        category (str): The category of the spans.
+    """
+    trace = _current_trace.get()
+    if trace is None:
+        return
+    parent = _current_span.get()
+    for stage, seconds, end_ns in stages:
+        current = Span(
+            stage,
+            category,
+            trace.trace_id,
+            parent.span_id if parent else None,
+            start_ns=end_ns - int(seconds * 1e9),
+        )
+        current.end_ns = end_ns
+        trace.spans.append(current)
+
+
+def server_timing(spans: List[Span]) -> str:
+    """
+    Summarize spans as a Server-Timing header value.
+
+    Durations are summed per category. A span nested directly in a span of the
+    same category is not counted again, and the root span is reported as "total".
+
+    Args:
+        spans (List[Span]): The spans of a request.
+
+    Returns:
+        str: The header value, e.g. `db;dur=3.1;desc="2 spans", total;dur=12.0`.
+    """
+    categories = {span.span_id: span.category for span in spans}
+    totals: Dict[str, List[float]] = {}
+    for current in spans:
+        if categories.get(current.parent_id) == current.category:
+            continue
+        total = totals.setdefault(current.category, [0.0, 0])
+        total[0] += current.duration_ms
+        total[1] += 1
+
+    entries = []
+    for category, (duration, count) in totals.items():
+        entry = f"{category};dur={duration:.1f}"
+        if category != "total":
+            entry += f';desc="{count} span{"s" if count != 1 else ""}"'
+        entries.append(entry)
+    # The total goes last, after the stages it is made of
+    entries.sort(key=lambda entry: entry.startswith("total;"))
+    return ", ".join(entries)
+
+
+def current_trace() -> Optional[Trace]:
+    return _current_trace.get()
+
+
+def create_tracer() -> Tracer:
+    """
+    Create the tracer configured by the TRACING_* settings and SERVER_TIMING.
+
+    Returns:
+        Tracer: The configured tracer.
+
+    Raises:
+        ValueError: If the exporter name is unknown.
+    """
+    exporter_name = config.TRACING_EXPORTER.lower()
+    if exporter_name == "none":
+        exporter = None
+    elif exporter_name == "file":
+        exporter = FileSpanExporter(config.TRACING_FILE)
+    elif exporter_name == "otlp":
+        exporter = OTLPSpanExporter(config.TRACING_OTLP_ENDPOINT, config.TRACING_SERVICE_NAME)
+    else:
+        raise ValueError(f"Unknown tracing exporter: {exporter_name}")
+    return Tracer(exporter, config.TRACING_SAMPLE_RATE, config.SERVER_TIMING)
+
+
+tracer = create_tracer()
@@ -0,0 +1,310 @@
+import os
+import time
+from typing import Any, Dict, Optional, Tuple
+
+from PIL import Image, UnidentifiedImageError
+
+from core.config import config
+from core.exceptions import BadRequestException
+from core.utils.derivative_cache import (derivative_cache, derivative_key,
+                                         derivative_prefix)
+from core.utils.executor import image_executor
+from core.utils.image_planner import describe_plan
+from core.utils.images import (PIL_FORMATS, ImagePipeline,
+                               apply_image_transformations, decode_image,
+                               resolve_format)
+from core.utils.metrics import image_bytes_processed, record_stage, time_stage
+from core.utils.source_cache import source_cache
+from core.utils.storage import get_storage
+
+
+def content_type_for(format_image: str) -> str:
+    """
+    Return the MIME type of an output format.
+
+    Args:
+        format_image (str): The output format.
+
+    Returns:
+        str: The MIME type.
+    """
+    if format_image == "jpg":
+        return "image/jpeg"
+    return f"image/{format_image}"
+
+
+async def open_source_header(name: str) -> Image:
+    """
+    Open a stored image by reading only the start of the file.
+
+    The header of most images fits in the first IMAGE_HEADER_BYTES, so size and mode
+    are known after a small ranged read. If the header is longer (e.g. a JPEG with
+    a large EXIF block), the whole file is read instead.
+
+    Args:
+        name (str): The object key of the image.
+
+    Returns:
+        Image: The opened image; its pixels must not be loaded.
+    """
+    storage = get_storage()
+    head = await storage.get_image_range(name, config.IMAGE_HEADER_BYTES)
+    try:
+        return decode_image(head)
+    except (UnidentifiedImageError, OSError, SyntaxError):
+        if len(head) < config.IMAGE_HEADER_BYTES:
+            raise
+        return decode_image(await storage.get_image(name))
+
+
+async def settle_opaque_format(name: str, transformations: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Settle the fallback format `auto` left for opaque sources (see
+    `negotiate_transformations`) for one source image.
+
+    Only the header of the source is read, and only if the fallback would change
+    the format.
+
+    Args:
+        name (str): The object key of the source image.
+        transformations (dict): The transformations, possibly with "opaque_format".
+
+    Returns:
+        dict: The transformations without "opaque_format"; its format replaces
+            "format" if the source has no transparency.
+    """
+    opaque_format = transformations.get("opaque_format")
+    transformations = {k: v for k, v in transformations.items() if k != "opaque_format"}
+    if opaque_format is None or transformations.get("format") is not None:
+        return transformations
+    original_format = name.rsplit(".", 1)[-1].lower()
+    if PIL_FORMATS.get(original_format) == PIL_FORMATS.get(opaque_format):
+        return transformations
+    try:
+        image = await open_source_header(name)
+    except (UnidentifiedImageError, OSError, SyntaxError):
+        # Keep the original format; transforming reports the broken source
+        return transformations
+    if not image.has_transparency_data:
+        transformations["format"] = opaque_format
+    return transformations
+
+
+async def locate_derivative(
+    name: str, transformations: Dict[str, Any]
+) -> Tuple[str, str, str]:
+    """
+    Resolve the output format and the content-addressed key of a derivative.
+
+    Args:
+        name (str): The object key of the source image.
+        transformations (dict): The transformations to apply.
+
+    Returns:
+        Tuple[str, str, str]: The output format, the derivative key and the source's
+            ETag; pass the ETag on to `compute_derivative` to save a second HEAD.
+
+    Raises:
+        BadRequestException: If the format is unsupported.
+    """
+    original_format = name.rsplit(".", 1)[-1].lower()
+    try:
+        format_image = resolve_format(transformations.get("format"), original_format)
+    except ValueError as e:
+        raise BadRequestException(str(e))
+
+    source_etag = (await get_storage().head_image(name))["ETag"]
+    key = derivative_key(name, source_etag, transformations, format_image)
+    return format_image, key, source_etag
+
+
+async def compute_derivative(
+    name: str, transformations: Dict[str, Any], source_etag: Optional[str] = None
+) -> bytes:
+    """
+    Fetch a source image through the source cache and transform it in the image
+    worker pool.
+
+    Args:
+        name (str): The object key of the source image.
+        transformations (dict): The transformations to apply.
+        source_etag (Optional[str]): The source's ETag, if already known.
+
+    Returns:
+        bytes: The transformed image in bytes.
+
+    Raises:
+        BadRequestException: If the source is corrupt or a transformation fails.
+    """
+    original_format = name.rsplit(".", 1)[-1].lower()
+    # Decoded images can only be cached for paths that keep naming the same source
+    cache_decoded = source_cache.enabled or get_storage().local_path(name) is not None
+    start = time.perf_counter()
+    async with source_cache.source_file(name, source_etag) as path:
+        record_stage("download", time.perf_counter() - start)
+        image_bytes_processed.inc(os.path.getsize(path), direction="in")
+        try:
+            image_bytes = await image_executor.run(
+                apply_image_transformations,
+                path,
+                transformations,
+                original_format,
+                cache_decoded,
+            )
+        except ValueError as e:
+            raise BadRequestException(str(e))
+        except (UnidentifiedImageError, OSError, SyntaxError, TypeError):
+            # Pillow also reports conversions it cannot do (e.g. CMYK to PNG, or a
+            # watermark on 16-bit data) as OSError or TypeError
+            raise BadRequestException("Unsupported or corrupt image")
+    image_bytes_processed.inc(len(image_bytes), direction="out")
+    return image_bytes
+
+
+async def store_derivative(key: str, image_bytes: bytes, content_type: str) -> str:
+    """
+    Upload a derivative under its key and record it in the derivative cache.
+
+    Args:
+        key (str): The derivative key.
+        image_bytes (bytes): The transformed image in bytes.
+        content_type (str): The MIME type of the image.
+
+    Returns:
+        str: The URL of the derivative.
+    """
+    with time_stage("upload"):
+        url = await get_storage().upload_image(image_bytes, key, content_type=content_type)
+    if derivative_cache.enabled:
+        await derivative_cache.put(key, image_bytes)
+    return url
+
+
+async def transform_stored_image(name: str, transformations: Dict[str, Any]) -> str:
+    """
+    Transform a stored image and store the result.
+
+    If no format is specified, the original format is preserved. When the derivative
+    cache is enabled and already holds the result, nothing is downloaded or computed.
+
+    Args:
+        name (str): The object key of the source image.
+        transformations (dict): The transformations to apply.
+
+    Returns:
+        str: The URL of the transformed image.
+
+    Raises:
+        BadRequestException: If the format is unsupported or a transformation fails.
+    """
+    transformations = await settle_opaque_format(name, transformations)
+    source_etag = None
+    if derivative_cache.enabled:
+        # Derivatives are content-addressed, so a cached result can be returned
+        # without downloading or transforming the source
+        format_image, new_file_name, source_etag = await locate_derivative(
+            name, transformations
+        )
+        if await derivative_cache.contains(new_file_name):
+            storage = get_storage()
+            # A disk-cached derivative can outlive its stored copy, so it is uploaded
+            # again rather than handing out a URL that 404s
+            if derivative_cache.in_storage or await storage.object_exists(new_file_name):
+                return await storage.create_image_url(new_file_name)
+            # Read from the backend directly, the lookup was already counted as a hit
+            image_bytes = await derivative_cache.backend.get(new_file_name)
+            if image_bytes is not None:
+                with time_stage("upload"):
+                    return await storage.upload_image(
+                        image_bytes, new_file_name, content_type=content_type_for(format_image)
+                    )
+    else:
+        original_format = name.rsplit(".", 1)[-1].lower()
+        try:
+            format_image = resolve_format(transformations.get("format"), original_format)
+        except ValueError as e:
+            raise BadRequestException(str(e))
+        new_file_name = (
+            name.rsplit(".", 1)[0] + f".{format_image}"
+            if format_image != original_format
+            else name
+        )
+
+    image_bytes = await compute_derivative(name, transformations, source_etag)
+    return await store_derivative(new_file_name, image_bytes, content_type_for(format_image))
+
+
+async def delete_derivatives(name: str) -> None:
+    """
+    Delete every stored derivative of a source image and drop it from the derivative
+    cache.
+
+    Args:
+        name (str): The object key of the source image.
+    """
+    storage = get_storage()
+    for key in await storage.list_objects(derivative_prefix(name)):
+        await storage.delete_object(key)
+        if derivative_cache.enabled:
+            await derivative_cache.discard(key)
+
+
+async def render_derivative(
+    name: str, key: str, transformations: Dict[str, Any], source_etag: Optional[str] = None
+) -> Tuple[bytes, bool]:
+    """
+    Return the bytes of a derivative, from the derivative cache if possible.
+
+    Args:
+        name (str): The object key of the source image.
+        key (str): The derivative key.
+        transformations (dict): The transformations to apply.
+        source_etag (Optional[str]): The source's ETag from `locate_derivative`.
+
+    Returns:
+        Tuple[bytes, bool]: The transformed image and whether it came from the cache.
+            Uncached results still need to be stored with `store_derivative`.
+    """
+    if derivative_cache.enabled:
+        image_bytes = await derivative_cache.get(key)
+        if image_bytes is not None:
+            return image_bytes, True
+    return await compute_derivative(name, transformations, source_etag), False
+
+
+async def explain_stored_image(name: str, transformations: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Report how a transformation of a stored image would be planned, without running it.
+
+    Args:
+        name (str): The object key of the source image.
+        transformations (dict): The transformations to apply.
+
+    Returns:
+        dict: The source size and mode, the requested operations and the chosen plan.
+
+    Raises:
+        BadRequestException: If the transformation is invalid.
+    """
+    transformations = await settle_opaque_format(name, transformations)
+    original_format = name.rsplit(".", 1)[-1].lower()
+    try:
+        format_image = resolve_format(transformations.get("format"), original_format)
+        pipeline = ImagePipeline.from_transformations(transformations)
+    except ValueError as e:
+        raise BadRequestException(str(e))
+
+    # Only the header is needed, so only the start of the file is downloaded
+    try:
+        image = await open_source_header(name)
+    except (UnidentifiedImageError, OSError, SyntaxError):
+        raise BadRequestException("Unsupported or corrupt image")
+    planned = pipeline.optimize(image.size, len(image.getbands()))
+
+    return {
+        "source": {"width": image.width, "height": image.height, "mode": image.mode},
+        "format": format_image,
+        "requested": describe_plan(pipeline.operations, image.size),
+        "plan": describe_plan(planned.operations, image.size),
+        "draft_size": planned.draft_size(),
+    }
@@ -0,0 +1,193 @@
+import asyncio
+from typing import Any, Dict, List, Sequence, Tuple
+
+from icecream import ic
+
+from app.crud.image_variant import ImageVariantCRUD
+from app.crud.transform_job import TransformJobCRUD
+from app.models.image_variant import ImageVariant
+from app.models.transform_job import JOB_KIND_VARIANTS
+from core.config import config
+from core.database.session import async_session_maker
+from core.exceptions import CustomException
+from core.utils.executor import variant_executor
+from core.utils.images import render_variants
+from core.utils.source_cache import source_cache
+from core.utils.storage import get_storage
+from core.utils.transform import content_type_for
+
+
+def parse_presets(spec: str) -> List[Tuple[str, int, str]]:
+    """
+    Parse variant presets of the form "name:max_edge:format,...".
+
+    Args:
+        spec (str): The preset specification, e.g. "thumb:256:webp,thumb:256:jpeg".
+
+    Returns:
+        List[Tuple[str, int, str]]: (name, max edge, format) per preset.
+
+    Raises:
+        ValueError: If a preset is malformed.
+    """
+    presets = []
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        try:
+            name, max_edge, format_image = item.split(":")
+            presets.append((name, int(max_edge), format_image.lower()))
+        except ValueError:
+            raise ValueError(f"Invalid image variant preset: {item}")
+    return presets
+
+
+VARIANT_PRESETS = parse_presets(config.IMAGE_VARIANT_PRESETS)
+
+
+def variant_key(name: str, preset: str, format_image: str) -> str:
+    """
+    Build the object key of a variant.
+
+    Args:
+        name (str): The object key of the source image.
+        preset (str): The preset name.
+        format_image (str): The variant format.
+
+    Returns:
+        str: The variant's object key.
+    """
+    return f"variants/{name.rsplit('.', 1)[0]}/{preset}.{format_image}"
+
+
+async def planned_variants(name: str) -> List[Dict[str, Any]]:
+    """
+    Describe the variants that will be generated for an image.
+
+    The variants are rendered in the background, so their URLs only resolve once
+    that has finished (or its retry job has); until then they are "pending".
+
+    Args:
+        name (str): The object key of the source image.
+
+    Returns:
+        List[dict]: The name, format, status and future presigned URL of every variant.
+    """
+    storage = get_storage()
+    return [
+        {
+            "name": preset,
+            "format": format_image,
+            "status": "pending",
+            "url": await storage.generate_presigned_url(
+                variant_key(name, preset, format_image)
+            ),
+        }
+        for preset, _, format_image in VARIANT_PRESETS
+    ]
+
+
+async def describe_variants(variants: Sequence[ImageVariant]) -> List[Dict[str, Any]]:
+    """
+    Describe recorded variants of an image with presigned URLs.
+
+    Only the keys are stored, so URLs are signed when the image is listed, like
+    those of the original.
+
+    Args:
+        variants (Sequence[ImageVariant]): The recorded variants.
+
+    Returns:
+        List[dict]: The name, format, size and presigned URL of every variant.
+    """
+    storage = get_storage()
+    return [
+        {
+            "name": variant.name,
+            "format": variant.format,
+            "width": variant.width,
+            "height": variant.height,
+            "url": await storage.generate_presigned_url(variant.key),
+        }
+        for variant in variants
+    ]
+
+
+async def store_variants(image_id: str, name: str) -> None:
+    """
+    Render, upload and record every configured variant of an image.
+
+    Variants that are already recorded (by an earlier, partly failed run) are not
+    recorded again, so the call can be retried.
+
+    Args:
+        image_id (str): The ID of the image row.
+        name (str): The object key of the source image.
+    """
+    if not VARIANT_PRESETS:
+        return
+
+    storage = get_storage()
+    async with source_cache.source_file(name) as path:
+        variants = await variant_executor.run(render_variants, path, VARIANT_PRESETS)
+
+    keys = [variant_key(name, v["name"], v["format"]) for v in variants]
+    await asyncio.gather(
+        *(
+            storage.upload_image(variant["data"], key, content_type_for(variant["format"]))
+            for variant, key in zip(variants, keys)
+        )
+    )
+
+    async with async_session_maker() as session:
+        variant_crud = ImageVariantCRUD(session)
+        recorded = {
+            variant.key
+            for variant in await variant_crud.get_all_by(
+                "image_id", image_id, limit=len(VARIANT_PRESETS)
+            )
+        }
+        for variant, key in zip(variants, keys):
+            if key in recorded:
+                continue
+            await variant_crud.create(
+                {
+                    "image_id": image_id,
+                    "name": variant["name"],
+                    "format": variant["format"],
+                    "width": variant["width"],
+                    "height": variant["height"],
+                    "key": key,
+                }
+            )
+
+
+async def generate_variants(image_id: str, name: str, user_id: str) -> None:
+    """
+    Generate the variants of an uploaded image.
+
+    Meant to run as a background task after the upload response is sent. A failure
+    does not affect the original image; it is recorded as a variants job, which the
+    job workers retry with backoff like any transform job.
+
+    Args:
+        image_id (str): The ID of the image row.
+        name (str): The object key of the source image.
+        user_id (str): The owner of the image.
+    """
+    try:
+        await store_variants(image_id, name)
+    except Exception as e:
+        error = e.message if isinstance(e, CustomException) else str(e)
+        ic(f"Variant generation failed for {name}: {error}")
+        try:
+            async with async_session_maker() as session:
+                await TransformJobCRUD(session).enqueue(
+                    image_id,
+                    user_id,
+                    {},
+                    config.JOB_MAX_ATTEMPTS,
+                    kind=JOB_KIND_VARIANTS,
+                    delay=config.JOB_RETRY_BASE_DELAY,
+                    error=error,
+                )
+        except Exception as e:
+            ic(f"Failed to queue variant generation for {name}: {e}")
@@ -0,0 +1,60 @@
+import os
+import sqlite3
+import tempfile
+import uuid
+
+import pytest
+
+# The settings are read when `core.config` is first imported, so the environment
+# has to be in place before any application module is.
+WORKDIR = tempfile.mkdtemp(prefix="image-processing-tests-")
+for name, value in {
+    "MYSQL_USER": "test",
+    "MYSQL_PASSWORD": "test",
+    "MYSQL_ROOT_PASSWORD": "test",
+    "MYSQL_DATABASE": "test",
+    "JWT_SECRET_KEY": "test-secret",
+    "JWT_ALGORITHM": "HS256",
+    "URL_SIGNING_KEY": "test-signing-key",
+    "AWS_ACCESS_KEY": "test",
+    "AWS_SECRET_KEY": "test",
+    "AWS_REGION": "us-east-1",
+    "AWS_S3_BUCKET_NAME": "test-bucket",
+}.items():
+    os.environ.setdefault(name, value)
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{os.path.join(WORKDIR, 'test.db')}"
+os.environ["STORAGE_BACKEND"] = "local"
+os.environ["LOCAL_STORAGE_DIR"] = os.path.join(WORKDIR, "storage")
+os.environ["SOURCE_CACHE_DIR"] = os.path.join(WORKDIR, "sources")
+os.environ["DERIVATIVE_CACHE_DIR"] = os.path.join(WORKDIR, "derivatives")
+os.environ["PROFILE_DIR"] = os.path.join(WORKDIR, "profiles")
+os.environ["IMAGE_WORKERS"] = "0"
+os.environ["VARIANT_WORKERS"] = "0"
+
+# aiosqlite hands the models' uuid4 primary keys to sqlite3 as they are
+sqlite3.register_adapter(uuid.UUID, str)
+
+# Load the application the way the server does; importing e.g. `app.crud` first
+# would run into the circular import through `core`.
+import core.server  # noqa: E402,F401
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+async def database():
+    """
+    Create the tables in the SQLite test database, and drop them afterwards.
+    """
+    import app.models  # noqa: F401
+    from core.database.session import Base, engine
+
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    yield
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+    await engine.dispose()
@@ -0,0 +1,33 @@
+import pytest
+
+from core.exceptions import BadRequestException
+from core.utils import batch
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_a_failing_image_only_fails_its_own_item(monkeypatch):
+    async def transform(name, transformations):
+        if name == "broken.png":
+            raise OSError("image file is truncated")
+        if name == "invalid.png":
+            raise BadRequestException("Unsupported format: gif")
+        return f"https://example.com/{name}"
+
+    monkeypatch.setattr(batch, "transform_stored_image", transform)
+    items = [
+        {"image_id": "1", "name": "good.png"},
+        {"image_id": "2", "name": "broken.png"},
+        {"image_id": "3", "name": "invalid.png"},
+        {"image_id": "4", "error": "Image not found"},
+    ]
+
+    results = await batch.run_batch(items, {"rotate": 90})
+
+    assert results == [
+        {"image_id": "1", "url": "https://example.com/good.png"},
+        {"image_id": "2", "error": "Image could not be transformed"},
+        {"image_id": "3", "error": "Unsupported format: gif"},
+        {"image_id": "4", "error": "Image not found"},
+    ]
+
@@ -0,0 +1,123 @@
+import io
+import os
+import threading
+
+import pytest
+from PIL import Image
+
+from core.config import config
+from core.exceptions import BadRequestException
+from core.utils import transform
+from core.utils.derivative_cache import (DerivativeCache, DiskDerivativeBackend,
+                                         derivative_key, derivative_prefix)
+from core.utils.disk_cache import DiskLRUCache
+from core.utils.storage import get_storage
+
+pytestmark = pytest.mark.anyio
+
+
+def png_bytes() -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", (64, 48), "teal").save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def test_concurrent_puts_keep_the_index_consistent(tmp_path):
+    disk = DiskLRUCache(str(tmp_path), max_bytes=4000)
+
+    def fill(worker: int) -> None:
+        for i in range(200):
+            disk.put(f"{worker}-{i}", b"x" * 100)
+            disk.contains(f"{worker}-{i // 2}")
+
+    threads = [threading.Thread(target=fill, args=(worker,)) for worker in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    files = [name for name in os.listdir(tmp_path) if not name.startswith(".")]
+    assert disk.size <= disk.max_bytes
+    assert disk.size == 100 * len(files)
+
+
+def test_discard_removes_the_entry(tmp_path):
+    disk = DiskLRUCache(str(tmp_path), max_bytes=4000)
+    disk.put("key", b"data")
+    disk.discard("key")
+    assert disk.get("key") is None
+    assert disk.size == 0
+
+
+@pytest.fixture
+def disk_cache(tmp_path, monkeypatch):
+    cache = DerivativeCache(DiskDerivativeBackend(str(tmp_path / "derivatives"), 10**7))
+    monkeypatch.setattr(transform, "derivative_cache", cache)
+    return cache
+
+
+async def test_disk_hit_restores_a_missing_stored_copy(disk_cache):
+    storage = get_storage()
+    await storage.upload_image(png_bytes(), "restore.png", content_type="image/png")
+    transformations = {"rotate": 90, "format": "webp"}
+
+    await transform.transform_stored_image("restore.png", transformations)
+    _, key, _ = await transform.locate_derivative("restore.png", transformations)
+    await storage.delete_object(key)
+
+    await transform.transform_stored_image("restore.png", transformations)
+
+    assert disk_cache.hits == 1
+    assert await storage.object_exists(key)
+
+
+async def test_delete_derivatives_removes_stored_and_cached_copies(disk_cache):
+    storage = get_storage()
+    await storage.upload_image(png_bytes(), "delete.png", content_type="image/png")
+    await storage.upload_image(png_bytes(), "other.png", content_type="image/png")
+    for name in ("delete.png", "other.png"):
+        for rotate in (90, 180):
+            await transform.transform_stored_image(name, {"rotate": rotate, "format": "webp"})
+    keys = await storage.list_objects(derivative_prefix("delete.png"))
+    assert len(keys) == 2
+
+    await transform.delete_derivatives("delete.png")
+
+    assert await storage.list_objects(derivative_prefix("delete.png")) == []
+    assert len(await storage.list_objects(derivative_prefix("other.png"))) == 2
+    for key in keys:
+        assert await disk_cache.get(key) is None
+
+
+@pytest.mark.parametrize("mode, expected", [("RGB", "jpeg"), ("RGBA", None)])
+async def test_auto_falls_back_to_jpeg_for_opaque_sources(mode, expected):
+    buffer = io.BytesIO()
+    Image.new(mode, (64, 48), "teal").save(buffer, format="PNG")
+    name = f"auto-{mode}.png"
+    await get_storage().upload_image(buffer.getvalue(), name, content_type="image/png")
+
+    settled = await transform.settle_opaque_format(
+        name, {"rotate": 90, "format": None, "opaque_format": "jpeg"}
+    )
+
+    assert settled == {"rotate": 90, "format": expected}
+
+
+async def test_conversions_pillow_cannot_do_are_bad_requests():
+    buffer = io.BytesIO()
+    Image.new("CMYK", (32, 32), (0, 50, 100, 0)).save(buffer, format="JPEG")
+    await get_storage().upload_image(buffer.getvalue(), "cmyk.jpg", content_type="image/jpeg")
+
+    with pytest.raises(BadRequestException):
+        await transform.compute_derivative("cmyk.jpg", {"format": "png"})
+
+
+def test_adaptive_search_settings_are_part_of_the_key(monkeypatch):
+    adaptive = {"max_bytes": 10_000}
+    before = derivative_key("photo.png", '"v1"', adaptive, "webp")
+    plain = derivative_key("photo.png", '"v1"', {"rotate": 90}, "webp")
+
+    monkeypatch.setattr(config, "ENCODE_MAX_ATTEMPTS", config.ENCODE_MAX_ATTEMPTS + 1)
+
+    assert derivative_key("photo.png", '"v1"', adaptive, "webp") != before
+    assert derivative_key("photo.png", '"v1"', {"rotate": 90}, "webp") == plain
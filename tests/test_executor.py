@@ -0,0 +1,91 @@
+import asyncio
+import os
+import time
+
+import pytest
+
+from core.config import config
+from core.exceptions import GatewayTimeoutException, ServiceUnavailableException
+from core.utils.executor import ImageExecutor
+from core.utils.metrics import time_stage, transform_stage_duration
+from core.utils.profiling import SamplingProfiler
+
+pytestmark = pytest.mark.anyio
+
+
+def slow(seconds: float) -> float:
+    time.sleep(seconds)
+    return seconds
+
+
+async def test_timed_out_jobs_keep_their_slot_until_they_finish():
+    executor = ImageExecutor(workers=0, queue_depth=1, timeout=0.05)
+    try:
+        with pytest.raises(GatewayTimeoutException):
+            await executor.run(slow, 0.3)
+
+        # The abandoned job is still running, so there is no room for another one
+        assert executor.pending == 1
+        with pytest.raises(ServiceUnavailableException):
+            await executor.run(slow, 0)
+
+        await asyncio.sleep(0.4)
+        assert executor.pending == 0
+        assert await executor.run(slow, 0) == 0
+        await asyncio.sleep(0.01)
+        assert executor.pending == 0
+    finally:
+        executor.shutdown()
+
+
+def timed(stage: str) -> None:
+    with time_stage(stage):
+        pass
+
+
+def spin(seconds: float) -> None:
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        pass
+
+
+async def test_cpu_profiles_include_pool_workers():
+    executor = ImageExecutor(name="image", workers=1, queue_depth=1, timeout=30)
+    profiler = SamplingProfiler(config.PROFILE_DIR)
+    try:
+        # The worker starts with the first job, and registers once it can be profiled
+        await executor.run(slow, 0)
+        assert len(executor.worker_pids()) == 1
+        job = asyncio.ensure_future(executor.run(spin, 1.5))
+        await asyncio.sleep(0.3)
+
+        stacks = await asyncio.to_thread(
+            profiler.profile, 0.5, 0.005, False, executor.worker_pids()
+        )
+        await job
+    finally:
+        executor.shutdown()
+
+    pool_stacks = [line for line in stacks.splitlines() if line.startswith("image-")]
+    assert any("spin (" in line for line in pool_stacks)
+    # Requests and results are handed over once
+    assert [entry for entry in os.listdir(config.PROFILE_DIR) if entry != "pools"] == []
+    assert executor.worker_pids() == []
+
+
+def stage_count(job: str, stage: str) -> int:
+    prefix = f'image_transform_stage_duration_seconds_count{{job="{job}",stage="{stage}"}} '
+    lines = [line for line in transform_stage_duration.render() if line.startswith(prefix)]
+    return int(lines[0].split()[-1]) if lines else 0
+
+
+async def test_stage_timings_are_labelled_with_the_job():
+    variants = ImageExecutor(name="variant", job="variants", workers=0)
+    before = {job: stage_count(job, "encode") for job in ("transform", "variants")}
+    try:
+        await variants.run(timed, "encode")
+    finally:
+        variants.shutdown()
+
+    assert stage_count("variants", "encode") == before["variants"] + 1
+    assert stage_count("transform", "encode") == before["transform"]
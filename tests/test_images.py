@@ -0,0 +1,65 @@
+import io
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from core.utils.images import (ImagePipeline, apply_image_transformations,
+                               negotiate_format, negotiate_opaque_format, resize)
+
+
+def png(width: int = 100, height: int = 80) -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", (width, height), (200, 100, 50)).save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+@pytest.mark.parametrize(
+    "transformations",
+    [
+        {"resize": {"width": 0, "height": 50}},
+        {"resize": {"width": 50, "height": 0}},
+        {"resize": {"width": -1, "height": None}},
+        {"crop": {"x": 0, "y": 0, "width": 0, "height": 10}},
+        {"crop": {"x": 0, "y": 0, "width": 10, "height": None}},
+    ],
+)
+def test_non_positive_sizes_are_rejected(transformations):
+    with pytest.raises(ValueError):
+        apply_image_transformations(png(), transformations, "png")
+
+
+def test_resize_rejects_non_positive_sizes():
+    with pytest.raises(ValueError):
+        resize(Image.new("RGB", (10, 10)), 0, 5)
+
+
+def test_crop_defaults_to_the_origin():
+    result = apply_image_transformations(
+        png(), {"crop": {"x": None, "y": None, "width": 10, "height": 5}}, "png"
+    )
+    assert Image.open(io.BytesIO(result)).size == (10, 5)
+
+
+def test_auto_prefers_the_smallest_accepted_format():
+    assert negotiate_format("image/webp,image/*;q=0.8") == "webp"
+    assert negotiate_format("image/png,image/*") is None
+    assert negotiate_opaque_format("image/png,image/*") == "jpeg"
+    assert negotiate_opaque_format("image/png") is None
+
+
+def test_grayscale_keeps_its_place_on_sources_with_alpha():
+    pixels = np.zeros((40, 60, 4), dtype=np.uint8)
+    pixels[..., 0] = np.linspace(0, 255, 60, dtype=np.uint8)
+    pixels[..., 1] = np.linspace(255, 0, 40, dtype=np.uint8)[:, None]
+    pixels[..., 3] = np.tile([0, 255, 12, 200], 15)
+    buffer = io.BytesIO()
+    Image.fromarray(pixels, "RGBA").save(buffer, "PNG")
+    pipeline = ImagePipeline.from_transformations(
+        {"resize": {"width": 180, "height": 120}, "filter": {"grayscale": True}}
+    )
+
+    assert pipeline.optimize((60, 40), 4).operations == pipeline.operations
+    planned = pipeline.process(buffer.getvalue(), "png")
+    requested = pipeline.process(buffer.getvalue(), "png", optimize=False)
+    assert planned == requested
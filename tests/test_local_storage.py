@@ -0,0 +1,35 @@
+from urllib.parse import parse_qs, urlsplit
+
+import pytest
+
+from api.v1.files.files import get_file
+from core.exceptions import ForbiddenException, UnauthorizedException
+from core.utils.storage import LocalStorage, get_storage
+
+pytestmark = pytest.mark.anyio
+
+
+def query(url: str):
+    params = parse_qs(urlsplit(url).query)
+    return int(params["expires"][0]), params["signature"][0]
+
+
+async def test_private_storage_hands_out_urls_the_files_route_serves():
+    storage = get_storage()
+    url = await storage.upload_image(b"image", "private.png", content_type="image/png")
+    assert url == await storage.create_image_url("private.png")
+
+    expires, signature = query(url)
+    response = await get_file("private.png", expires, signature)
+    assert response.path == storage.local_path("private.png")
+
+    with pytest.raises(UnauthorizedException):
+        await get_file("private.png")
+    with pytest.raises(ForbiddenException):
+        await get_file("private.png", expires, "0" * 64)
+
+
+async def test_public_storage_hands_out_plain_urls(tmp_path):
+    storage = LocalStorage(str(tmp_path), "http://files.test/v1/files", "key", public=True)
+    url = await storage.upload_image(b"image", "a b.png", content_type="image/png")
+    assert url == "http://files.test/v1/files/a%20b.png"
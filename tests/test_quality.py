@@ -0,0 +1,76 @@
+import io
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from core.config import config
+from core.utils.images import encode_adaptive
+from core.utils.quality import structural_similarity
+
+
+def noise(width: int = 160, height: int = 120) -> Image.Image:
+    # Noise compresses badly, so every quality step changes the size
+    pixels = np.random.default_rng(0).integers(0, 256, (height, width, 3), dtype=np.uint8)
+    return Image.fromarray(pixels, "RGB")
+
+
+@pytest.fixture
+def encodes(monkeypatch):
+    """
+    Record the size of every encode done with `Image.save`.
+    """
+    sizes = []
+    save = Image.Image.save
+
+    def recording_save(image, fp, *args, **kwargs):
+        save(image, fp, *args, **kwargs)
+        sizes.append(len(fp.getvalue()))
+
+    monkeypatch.setattr(Image.Image, "save", recording_save)
+    return sizes
+
+
+def jpeg_size(image: Image.Image, quality: int) -> int:
+    buffer = io.BytesIO()
+    image.save(buffer, "JPEG", quality=quality)
+    return len(buffer.getvalue())
+
+
+def test_identical_images_have_an_ssim_of_one():
+    luma = np.asarray(noise().convert("L"), dtype=np.float64)
+    assert structural_similarity(luma, luma) == pytest.approx(1.0)
+    assert structural_similarity(luma, 255 - luma) < 0.5
+
+
+def test_a_feasible_budget_is_met(encodes):
+    image = noise()
+    max_bytes = (jpeg_size(image, config.ENCODE_MIN_QUALITY) + jpeg_size(image, 90)) // 2
+    encodes.clear()
+
+    data = encode_adaptive(image, "jpeg", max_bytes=max_bytes)
+
+    assert len(data) <= max_bytes
+    assert len(encodes) <= config.ENCODE_MAX_ATTEMPTS
+
+
+@pytest.mark.parametrize("target_quality", [None, 0.99])
+def test_an_infeasible_budget_returns_the_smallest_attempt(encodes, target_quality):
+    data = encode_adaptive(noise(), "jpeg", max_bytes=100, target_quality=target_quality)
+    attempts = list(encodes)
+
+    assert len(attempts) <= config.ENCODE_MAX_ATTEMPTS
+    assert len(data) == min(attempts)
+    assert len(data) == jpeg_size(noise(), config.ENCODE_MIN_QUALITY)
+
+
+@pytest.mark.parametrize("max_attempts", [1, 2, 3, 6])
+def test_attempts_are_bounded(encodes, monkeypatch, max_attempts):
+    monkeypatch.setattr(config, "ENCODE_MAX_ATTEMPTS", max_attempts)
+
+    encode_adaptive(noise(), "jpeg", max_bytes=100, target_quality=0.999)
+    assert len(encodes) <= max_attempts
+
+    encodes.clear()
+    encode_adaptive(noise(), "webp", target_quality=0.9)
+    assert len(encodes) <= max_attempts
@@ -0,0 +1,45 @@
+import time
+from urllib.parse import parse_qs
+
+from core.utils.render_urls import (sign_render_query, signed_cache_control,
+                                    verify_render_signature)
+
+PARAMS = {"w": 320, "fmt": "webp", "h": None, "target_quality": 0.95}
+
+
+def parse(query: str):
+    values = {name: value[0] for name, value in parse_qs(query).items()}
+    return int(values.pop("expires")), values.pop("signature"), values
+
+
+def test_signed_query_verifies():
+    expires, signature, values = parse(sign_render_query("image-1", PARAMS, 600)["query"])
+
+    assert values == {"w": "320", "fmt": "webp", "target_quality": "0.95"}
+    assert expires > time.time()
+    # The route sees the parameters parsed back from the query string
+    parsed = {"w": int(values["w"]), "fmt": values["fmt"], "target_quality": 0.95}
+    assert verify_render_signature("image-1", parsed, expires, signature)
+
+
+def test_tampering_is_rejected():
+    expires, signature, _ = parse(sign_render_query("image-1", PARAMS, 600)["query"])
+
+    assert not verify_render_signature("image-2", PARAMS, expires, signature)
+    assert not verify_render_signature("image-1", {**PARAMS, "w": 321}, expires, signature)
+    assert not verify_render_signature("image-1", PARAMS, expires + 1, signature)
+    assert not verify_render_signature("image-1", PARAMS, None, signature)
+
+
+def test_expired_urls_are_rejected():
+    expired = int(time.time()) - 1
+    signature = parse(sign_render_query("image-1", PARAMS, 600)["query"])[1]
+    assert not verify_render_signature("image-1", PARAMS, expired, signature)
+
+
+def test_signed_responses_are_public_until_expiry():
+    assert signed_cache_control(int(time.time()) + 120) in (
+        "public, max-age=120",
+        "public, max-age=119",
+    )
+    assert signed_cache_control(int(time.time()) - 5) == "public, max-age=0"
@@ -0,0 +1,62 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+from core.utils import source_cache as source_cache_module
+from core.utils.source_cache import SourceCache
+
+pytestmark = pytest.mark.anyio
+
+
+class RemoteStorage:
+    """A storage whose objects are not local files, counting HEAD requests."""
+
+    def __init__(self) -> None:
+        self.heads = 0
+
+    def local_path(self, name):
+        return None
+
+    async def head_image(self, name):
+        self.heads += 1
+        return {"ETag": '"v1"', "ContentLength": 5}
+
+    async def download_image(self, name, file):
+        file.write(b"image")
+        return 5
+
+
+@pytest.fixture
+def storage(monkeypatch):
+    storage = RemoteStorage()
+    monkeypatch.setattr(source_cache_module, "get_storage", lambda: storage)
+    return storage
+
+
+async def test_a_known_etag_skips_the_head_request(tmp_path, storage):
+    cache = SourceCache(str(tmp_path), 1024)
+
+    async with cache.source_file("photo.jpg", '"v1"') as path:
+        with open(path, "rb") as file:
+            assert file.read() == b"image"
+    async with cache.source_file("photo.jpg") as path:
+        pass
+
+    assert storage.heads == 1
+    assert cache.stats()["hits"] == 1
+
+
+async def test_files_are_kept_per_process(tmp_path, storage):
+    # A directory left behind by a process that has exited
+    exited = subprocess.run([sys.executable, "-c", "import os; print(os.getpid())"],
+                            capture_output=True, text=True)
+    stale = tmp_path / exited.stdout.strip()
+    stale.mkdir()
+    cache = SourceCache(str(tmp_path), 1024)
+
+    async with cache.source_file("photo.jpg", '"v1"') as path:
+        assert os.path.dirname(path) == str(tmp_path / str(os.getpid()))
+
+    assert not stale.exists()
@@ -0,0 +1,31 @@
+from botocore.exceptions import (ClientError, EndpointConnectionError,
+                                 NoCredentialsError)
+
+from core.exceptions import BadRequestException, StorageException
+from core.utils.aws_utils import storage_error
+
+
+def client_error(code: str, status: int) -> ClientError:
+    return ClientError(
+        {
+            "Error": {"Code": code, "Message": code},
+            "ResponseMetadata": {"HTTPStatusCode": status},
+        },
+        "GetObject",
+    )
+
+
+def test_missing_object_is_a_bad_request():
+    assert isinstance(storage_error(client_error("NoSuchKey", 404), "get"), BadRequestException)
+
+
+def test_server_errors_and_throttling_are_storage_failures():
+    for code, status in (("InternalError", 500), ("SlowDown", 503), ("Throttling", 429)):
+        assert isinstance(storage_error(client_error(code, status), "get"), StorageException)
+
+
+def test_connection_errors_are_storage_failures():
+    error = EndpointConnectionError(endpoint_url="https://s3.example.com")
+    assert isinstance(storage_error(error, "get"), StorageException)
+    assert isinstance(storage_error(ConnectionResetError(), "get"), StorageException)
+    assert isinstance(storage_error(NoCredentialsError(), "get"), StorageException)
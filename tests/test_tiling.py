@@ -0,0 +1,17 @@
+import pytest
+
+from core.utils.tiling import pixel_size, strip_height
+
+
+@pytest.mark.parametrize(
+    "mode, size",
+    [("1", 1), ("L", 1), ("P", 1), ("I;16", 2), ("I", 4), ("F", 4),
+     ("LA", 4), ("RGB", 4), ("RGBA", 4), ("CMYK", 4)],
+)
+def test_pixel_size_matches_pillow_storage(mode, size):
+    assert pixel_size(mode) == size
+
+
+def test_strips_of_rgb_images_fit_the_budget():
+    assert strip_height(1000, pixel_size("RGB"), 400_000) == 100
+    assert strip_height(1000, pixel_size("L"), 400_000) == 400
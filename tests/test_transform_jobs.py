@@ -0,0 +1,163 @@
+import uuid
+
+import pytest
+
+from app.crud.transform_job import TransformJobCRUD, utcnow
+from app.models.image import Image
+from app.models.transform_job import (JOB_COMPLETED, JOB_FAILED, JOB_QUEUED,
+                                      JOB_RUNNING)
+from core.database.session import async_session_maker
+from core.exceptions import (BadRequestException, GatewayTimeoutException,
+                             StorageException)
+from core.utils import jobs
+
+pytestmark = [pytest.mark.anyio, pytest.mark.usefixtures("database")]
+
+
+async def enqueue(max_attempts: int = 3) -> str:
+    async with async_session_maker() as session:
+        image = Image(name="photo.jpg", user_id=str(uuid.uuid4()))
+        session.add(image)
+        await session.commit()
+        job = await TransformJobCRUD(session).enqueue(
+            str(image.id), str(uuid.uuid4()), {"rotate": 90}, max_attempts
+        )
+        return str(job.id)
+
+
+async def claim(worker_id: str, lease_seconds: float = 60):
+    async with async_session_maker() as session:
+        return await TransformJobCRUD(session).claim_next(worker_id, lease_seconds)
+
+
+async def load(job_id: str):
+    async with async_session_maker() as session:
+        return await TransformJobCRUD(session).get_by_id(job_id)
+
+
+async def test_claim_leases_the_job_to_one_worker():
+    job_id = await enqueue()
+
+    job = await claim("worker-1")
+
+    assert str(job.id) == job_id
+    assert job.status == JOB_RUNNING
+    assert job.attempts == 1
+    assert job.locked_by == "worker-1"
+    assert job.locked_until > utcnow()
+    assert await claim("worker-2") is None
+
+
+async def test_complete_requires_the_lease():
+    job_id = await enqueue()
+    await claim("worker-1")
+
+    async with async_session_maker() as session:
+        assert not await TransformJobCRUD(session).complete(job_id, "worker-2", "url")
+    async with async_session_maker() as session:
+        assert await TransformJobCRUD(session).complete(job_id, "worker-1", "url")
+
+    job = await load(job_id)
+    assert job.status == JOB_COMPLETED
+    assert job.result_url == "url"
+    assert job.locked_by is None
+
+
+async def test_fail_with_retry_requeues_after_the_delay():
+    job_id = await enqueue()
+    await claim("worker-1")
+
+    async with async_session_maker() as session:
+        assert await TransformJobCRUD(session).fail(job_id, "worker-1", "boom", 60)
+
+    job = await load(job_id)
+    assert job.status == JOB_QUEUED
+    assert job.error == "boom"
+    assert job.available_at > utcnow()
+    # Not due yet
+    assert await claim("worker-1") is None
+
+
+async def test_fail_without_retry_fails_the_job():
+    job_id = await enqueue()
+    await claim("worker-1")
+
+    async with async_session_maker() as session:
+        assert await TransformJobCRUD(session).fail(job_id, "worker-1", "bad", None)
+
+    job = await load(job_id)
+    assert job.status == JOB_FAILED
+    assert await claim("worker-1") is None
+
+
+async def test_expired_lease_is_reclaimed():
+    job_id = await enqueue()
+    await claim("worker-1", lease_seconds=-1)
+
+    job = await claim("worker-2")
+
+    assert str(job.id) == job_id
+    assert job.attempts == 2
+    assert job.locked_by == "worker-2"
+    # The first worker lost its lease and can no longer record an outcome
+    async with async_session_maker() as session:
+        assert not await TransformJobCRUD(session).complete(job_id, "worker-1", "url")
+
+
+@pytest.mark.parametrize(
+    "error",
+    [StorageException("Unexpected error: connection reset"), GatewayTimeoutException()],
+)
+async def test_run_job_retries_transient_errors(monkeypatch, error):
+    async def transform(name, transformations):
+        raise error
+
+    monkeypatch.setattr(jobs, "transform_stored_image", transform)
+    job_id = await enqueue()
+
+    await jobs.run_job(await claim("worker-1"), "worker-1")
+
+    job = await load(job_id)
+    assert job.status == JOB_QUEUED
+    assert job.error == error.message
+    assert job.available_at > utcnow()
+
+
+async def test_run_job_fails_invalid_transformations_for_good(monkeypatch):
+    async def transform(name, transformations):
+        raise BadRequestException("Unsupported format: gif")
+
+    monkeypatch.setattr(jobs, "transform_stored_image", transform)
+    job_id = await enqueue()
+
+    await jobs.run_job(await claim("worker-1"), "worker-1")
+
+    job = await load(job_id)
+    assert job.status == JOB_FAILED
+    assert job.error == "Unsupported format: gif"
+
+
+async def test_run_job_gives_up_after_max_attempts(monkeypatch):
+    async def transform(name, transformations):
+        raise StorageException()
+
+    monkeypatch.setattr(jobs, "transform_stored_image", transform)
+    job_id = await enqueue(max_attempts=1)
+
+    await jobs.run_job(await claim("worker-1"), "worker-1")
+
+    assert (await load(job_id)).status == JOB_FAILED
+
+
+async def test_run_job_completes(monkeypatch):
+    async def transform(name, transformations):
+        return f"https://example.com/{name}"
+
+    monkeypatch.setattr(jobs, "transform_stored_image", transform)
+    job_id = await enqueue()
+
+    await jobs.run_job(await claim("worker-1"), "worker-1")
+
+    job = await load(job_id)
+    assert job.status == JOB_COMPLETED
+    assert job.result_url == "https://example.com/photo.jpg"
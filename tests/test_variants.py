@@ -0,0 +1,83 @@
+import io
+import uuid
+
+import pytest
+from PIL import Image as PILImage
+from sqlalchemy import select
+
+from app.crud.transform_job import TransformJobCRUD, utcnow
+from app.models.image import Image
+from app.models.image_variant import ImageVariant
+from app.models.transform_job import (JOB_COMPLETED, JOB_KIND_VARIANTS,
+                                      JOB_QUEUED, TransformJob)
+from core.database.session import async_session_maker
+from core.utils import jobs, variants
+from core.utils.storage import get_storage
+
+pytestmark = [pytest.mark.anyio, pytest.mark.usefixtures("database")]
+
+
+async def create_image(name: str, upload: bool = True) -> Image:
+    if upload:
+        buffer = io.BytesIO()
+        PILImage.new("RGB", (300, 200), "orange").save(buffer, format="PNG")
+        await get_storage().upload_image(buffer.getvalue(), name, content_type="image/png")
+    async with async_session_maker() as session:
+        image = Image(name=name, user_id=str(uuid.uuid4()))
+        session.add(image)
+        await session.commit()
+        return image
+
+
+async def load_jobs():
+    async with async_session_maker() as session:
+        return (await session.scalars(select(TransformJob))).all()
+
+
+async def load_variants():
+    async with async_session_maker() as session:
+        return (await session.scalars(select(ImageVariant))).all()
+
+
+async def test_failed_generation_is_recorded_as_a_retryable_job():
+    image = await create_image("missing-variants.png", upload=False)
+
+    await variants.generate_variants(str(image.id), image.name, image.user_id)
+
+    [job] = await load_jobs()
+    assert job.kind == JOB_KIND_VARIANTS
+    assert job.status == JOB_QUEUED
+    assert "not found" in job.error
+    assert job.available_at > utcnow()
+    assert await load_variants() == []
+
+
+async def test_variants_job_renders_and_records_variants_once():
+    image = await create_image("variants.png")
+    await variants.store_variants(str(image.id), image.name)
+    async with async_session_maker() as session:
+        queued = await TransformJobCRUD(session).enqueue(
+            str(image.id), image.user_id, {}, 3, kind=JOB_KIND_VARIANTS
+        )
+        job_id = str(queued.id)
+        job = await TransformJobCRUD(session).claim_next("worker-1", 60)
+
+    await jobs.run_job(job, "worker-1")
+
+    async with async_session_maker() as session:
+        assert (await TransformJobCRUD(session).get_by_id(job_id)).status == JOB_COMPLETED
+    recorded = await load_variants()
+    assert len(recorded) == len(variants.VARIANT_PRESETS)
+    for variant in recorded:
+        assert await get_storage().object_exists(variant.key)
+
+
+async def test_variant_urls_are_presigned_when_listed():
+    image = await create_image("listed.png")
+    await variants.store_variants(str(image.id), image.name)
+
+    described = await variants.describe_variants(await load_variants())
+
+    assert len(described) == len(variants.VARIANT_PRESETS)
+    for variant in described:
+        assert "signature=" in variant["url"]
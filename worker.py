@@ -0,0 +1,42 @@
+import argparse
+import asyncio
+import signal
+
+from core.config import config
+from core.utils.aws_utils import shutdown_s3
+from core.utils.executor import image_executor, variant_executor
+from core.utils.jobs import run_workers
+
+
+def main():
+    CONCURRENCY = config.JOB_WORKER_CONCURRENCY
+
+    parser = argparse.ArgumentParser(description="Run a transform job worker.")
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=CONCURRENCY,
+        help=f"Jobs processed at once (default: {CONCURRENCY})",
+    )
+
+    args = parser.parse_args()
+
+    asyncio.run(run_worker(args.concurrency))
+
+
+async def run_worker(concurrency: int) -> None:
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    try:
+        await run_workers(concurrency, stop)
+    finally:
+        image_executor.shutdown()
+        variant_executor.shutdown()
+        shutdown_s3()
+
+
+if __name__ == "__main__":
+    main()